@@ -0,0 +1,142 @@
+# agg->count,sum:preco,avg:preco->categoria->preco>10
+FUNCTIONS = ("count", "sum", "min", "max", "avg")
+
+
+def parse_functions(specs):
+    """['count', 'sum:preco'] → [('count', None), ('sum', 'preco')]"""
+    functions = []
+    for spec in specs:
+        func, _, col = spec.partition(":")
+        func, col = func.strip().lower(), col.strip() or None
+        if func not in FUNCTIONS:
+            raise ValueError(f"Função de agregação desconhecida: '{func}' (opções: {', '.join(FUNCTIONS)}).")
+        if func != "count" and col is None:
+            raise ValueError(f"'{func}' precisa de uma coluna (ex: {func}:preco).")
+        functions.append((func, col))
+    if not functions:
+        raise ValueError("Nenhuma função de agregação indicada.")
+    return functions
+
+
+def label(func, col):
+    return func if col is None else f"{func}({col})"
+
+
+def _new_state(functions):
+    # count/sum/avg: [contagem, soma]; min/max: [valor]
+    return [[0, 0] if func in ("count", "sum", "avg") else [None] for func, _ in functions]
+
+
+def _update(states, functions, row):
+    for state, (func, col) in zip(states, functions):
+        if col is None:
+            state[0] += 1
+            continue
+        value = row.get(col)
+        if value is None:
+            continue
+        if func == "min":
+            if state[0] is None or value < state[0]:
+                state[0] = value
+        elif func == "max":
+            if state[0] is None or value > state[0]:
+                state[0] = value
+        else:
+            state[0] += 1
+            if func != "count":
+                state[1] += value
+
+
+def _final(states, functions):
+    out = {}
+    for state, (func, col) in zip(states, functions):
+        if func == "count":
+            out[label(func, col)] = state[0]
+        elif func == "sum":
+            # como em SQL: sem valores (todos None, ou nenhuma row) a soma é None, não 0
+            out[label(func, col)] = state[1] if state[0] else None
+        elif func == "avg":
+            out[label(func, col)] = state[1] / state[0] if state[0] else None
+        else:
+            out[label(func, col)] = state[0]
+    return out
+
+
+def aggregate_states(rows, functions, group_by):
+    """Estados por grupo numa só passagem sobre um iterável de rows: {chave do grupo: estados}"""
+    groups = {}
+    for row in rows:
+        key = tuple(row.get(col) for col in group_by)
+        states = groups.get(key)
+        if states is None:
+            states = groups[key] = _new_state(functions)
+        _update(states, functions, row)
+    return groups
+
+
+def merge_states(groups, other, functions):
+    """Junta em groups os estados parciais de outra partição (scan paralelo)"""
+    for key, states in other.items():
+        mine = groups.get(key)
+        if mine is None:
+            groups[key] = states
+            continue
+        for state, part, (func, _) in zip(mine, states, functions):
+            if func in ("min", "max"):
+                if part[0] is not None and (state[0] is None or
+                                            (part[0] < state[0] if func == "min" else part[0] > state[0])):
+                    state[0] = part[0]
+            else:
+                state[0] += part[0]
+                state[1] += part[1]
+
+
+def finish(groups, functions, group_by):
+    if not groups and not group_by:
+        groups[()] = _new_state(functions)  # sem grupos: uma linha com count 0
+    return [dict(zip(group_by, key), **_final(states, functions)) for key, states in groups.items()]
+
+
+def aggregate_rows(rows, functions, group_by):
+    """Agregação numa só passagem sobre um iterável de rows (memória por grupo, não por row)"""
+    return finish(aggregate_states(rows, functions, group_by), functions, group_by)
+
+
+def _reduce(func, values):
+    present = [v for v in values if v is not None]
+    if func == "count":
+        return len(present)
+    if func == "sum":
+        return sum(present) if present else None
+    if func == "avg":
+        return sum(present) / len(present) if present else None
+    if not present:
+        return None
+    return min(present) if func == "min" else max(present)
+
+
+def aggregate_columns(values, n, functions, group_by):
+    """
+    Agregação vetorizada para armazenamento colunar.
+    values(col) devolve a lista dos valores da coluna nas rows selecionadas; n é o número de rows.
+    """
+    if not group_by:
+        return [{label(func, col): n if col is None else _reduce(func, values(col))
+                 for func, col in functions}]
+
+    groups = {}
+    for pos, key in enumerate(zip(*[values(col) for col in group_by])):
+        groups.setdefault(key, []).append(pos)
+
+    columns = {col: values(col) for _, col in functions if col is not None}
+    result = []
+    for key, positions in groups.items():
+        out = dict(zip(group_by, key))
+        for func, col in functions:
+            if col is None:
+                out[label(func, col)] = len(positions)
+            else:
+                column = columns[col]
+                out[label(func, col)] = _reduce(func, [column[pos] for pos in positions])
+        result.append(out)
+    return result
@@ -0,0 +1,343 @@
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from scarlet_protocol import encode_frame, decode_frame, HEADER, MAX_FRAME, PROTOCOL_VERSION, ProtocolError
+from scarlet_client import PORT, READ_COMMANDS, next_selection
+
+# Cliente asyncio: vários pedidos em curso ao mesmo tempo sobre poucas ligações.
+#
+#   async with AsyncScarletClient("127.0.0.1", connections=2) as client:
+#       await client.execute("sd", ["loja"])
+#       await client.execute("st", ["Produtos"])
+#       a, b = await asyncio.gather(client.execute("agg", [["count"], [], "preco>10"]),
+#                                   client.execute("select", [["*"], "id=3"]))
+#       async for row in client.stream("select", [["*"], {}]):
+#           ...
+#
+# Cada pedido leva um "id" ({"cmd", "args", "id"}) e o servidor repete-o em todos os frames
+# da resposta; uma tarefa por ligação lê os frames e entrega-os ao pedido certo. O servidor
+# responde aos pedidos de uma ligação pela ordem de chegada, por isso um stream longo atrasa
+# os pedidos que foram para a mesma ligação: um pedido novo vai para a ligação com menos
+# pedidos em curso (e abre-se outra, até `connections`, se todas estiverem ocupadas).
+#
+# Timeout/cancelamento: o pedido deixa de esperar, mas o comando pode já ter corrido no
+# servidor; a resposta, quando chegar, é descartada. Nos streams o timeout conta entre frames.
+# Os frames de um stream ficam numa fila sem limite até serem lidos: a tarefa que lê a ligação
+# nunca espera por quem consome um stream (senão parava também os outros pedidos da ligação).
+# Como no ScarletClient, sd/st ficam no cliente e são repetidos em cada ligação que ainda
+# não os tenha; só contam quando a resposta chega e diz que o servidor os aceitou.
+# upload/download não passam por aqui.
+
+REQUEST_TIMEOUT = 30.0
+
+
+async def _read_frame(reader):
+    """Lê um frame; devolve None quando o servidor fecha a ligação entre frames"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("Ligação fechada a meio de um frame.")
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ProtocolError(f"Frame demasiado grande ({size} bytes).")
+    try:
+        payload = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("Ligação fechada a meio de um frame.")
+    return decode_frame(payload)
+
+
+class _Request:
+    """Um pedido em curso: o primeiro frame vai para `response`; os de um stream para `frames`"""
+
+    def __init__(self, request_id):
+        self.id = request_id
+        self.response = asyncio.get_running_loop().create_future()
+        self.frames = None
+        self.error = None
+        self.abandoned = False  # quem pediu desistiu: os frames que faltam são descartados
+
+    def feed(self, frame):
+        """Entrega um frame; devolve True quando a resposta chegou ao fim"""
+        if self.frames is None:
+            if not self.response.done():
+                self.response.set_result(frame)
+            if frame.get("stream") and frame.get("status") != "error":
+                self.frames = asyncio.Queue()
+                return False
+            return True
+        if not self.abandoned:
+            self.frames.put_nowait(frame)
+        return bool(frame.get("end"))
+
+    def fail(self, error):
+        """A ligação caiu antes do fim da resposta"""
+        self.error = error
+        if self.abandoned:
+            return
+        if not self.response.done():
+            self.response.set_exception(error)
+        elif self.frames is not None:
+            self.frames.put_nowait(None)  # acorda quem está à espera do próximo frame
+
+    async def next_frame(self, timeout):
+        if self.error is not None and self.frames.empty():
+            raise self.error
+        frame = await asyncio.wait_for(self.frames.get(), timeout)
+        if frame is None:
+            raise self.error
+        return frame
+
+    def abandon(self):
+        self.abandoned = True
+        if self.frames is not None:
+            while not self.frames.empty():
+                self.frames.get_nowait()
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}  # id → _Request, pela ordem de envio
+        self.db = None
+        self.table = None
+        self.closed = False
+        self._drain_lock = asyncio.Lock()
+        self._task = None
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(encode_frame({"cmd": "hello", "args": [PROTOCOL_VERSION]}))
+        await writer.drain()
+        response = await _read_frame(reader)
+        if response is None or response.get("status") != "ok":
+            writer.close()
+            raise ProtocolError(response["msg"] if response else "Servidor fechou a ligação.")
+        conn = cls(reader, writer)
+        conn._task = asyncio.create_task(conn._read_loop())
+        return conn
+
+    async def _read_loop(self):
+        error = ProtocolError("Servidor fechou a ligação.")
+        try:
+            while True:
+                frame = await _read_frame(self.reader)
+                if frame is None:
+                    break
+                request_id = frame.pop("id", None)
+                if request_id is None and self.pending:
+                    # resposta sem id (ex: JSON inválido): as respostas chegam pela ordem dos pedidos
+                    request_id = next(iter(self.pending))
+                request = self.pending.get(request_id)
+                if request is not None and request.feed(frame):
+                    del self.pending[request_id]
+        except (OSError, ProtocolError, ValueError) as e:
+            error = e if isinstance(e, ProtocolError) else ProtocolError(str(e))
+        except asyncio.CancelledError:
+            error = ProtocolError("Ligação fechada.")
+        finally:
+            self.closed = True
+            for request in self.pending.values():
+                request.fail(error)
+            self.pending.clear()
+            self.writer.close()
+
+    async def send(self, commands):
+        """Envia [(request_id, cmd, args), ...] de seguida; devolve os _Request pela mesma ordem"""
+        if self.closed:
+            raise ProtocolError("Ligação fechada.")
+        requests = []
+        data = []
+        for request_id, cmd, args in commands:
+            request = self.pending[request_id] = _Request(request_id)
+            requests.append(request)
+            data.append(encode_frame({"cmd": cmd, "args": args, "id": request_id}))
+        # um só write: os frames de vários pedidos simultâneos nunca se misturam
+        self.writer.write(b"".join(data))
+        async with self._drain_lock:
+            await self.writer.drain()
+        return requests
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class AsyncScarletClient:
+    """Cliente asyncio com pedidos multiplexados (ver o início do módulo)"""
+
+    def __init__(self, host="127.0.0.1", port=PORT, connections=2, timeout=REQUEST_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_connections = connections
+        self.timeout = timeout
+        self.db = None
+        self.table = None
+        self._conns = []
+        self._ids = itertools.count(1)
+        self._open_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connection(self):
+        """A ligação com menos pedidos em curso (abre uma nova se todas estiverem ocupadas)"""
+        async with self._open_lock:
+            self._conns = [conn for conn in self._conns if not conn.closed]
+            best = min(self._conns, key=lambda conn: len(conn.pending), default=None)
+            if best is None or (best.pending and len(self._conns) < self.max_connections):
+                best = await _Connection.open(self.host, self.port)
+                self._conns.append(best)
+            return best
+
+    async def _send(self, conn, command, args):
+        """Envia o comando (precedido dos sd/st que faltam nesta ligação); devolve o seu _Request"""
+        commands = []
+        if self.db is not None and conn.db != self.db:
+            commands.append((next(self._ids), "sd", [self.db]))
+        if self.table is not None and (conn.table != self.table or commands):
+            commands.append((next(self._ids), "st", [self.table]))
+        commands.append((next(self._ids), command, args))
+        requests = await conn.send(commands)
+        for (_, cmd, cmd_args), request in zip(commands, requests):
+            # corre quando a resposta chega, antes de acordar quem espera por ela
+            request.response.add_done_callback(
+                lambda future, cmd=cmd, cmd_args=cmd_args, own=request is requests[-1]:
+                    self._selected(conn, cmd, cmd_args, own, future))
+        for request in requests[:-1]:
+            request.abandon()  # as respostas dos sd/st de sincronização não interessam
+        return requests[-1]
+
+    def _selected(self, conn, command, args, own, future):
+        """Atualiza a seleção da ligação (e a do cliente, se o comando foi pedido) com a resposta"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        response = future.result()
+        conn.db, conn.table = next_selection(conn.db, conn.table, command, args, response)
+        if own:
+            self.db, self.table = next_selection(self.db, self.table, command, args, response)
+
+    async def _wait(self, request, timeout):
+        try:
+            return await asyncio.wait_for(asyncio.shield(request.response), timeout)
+        except BaseException:
+            request.abandon()
+            raise
+
+    async def execute(self, command, args=None, timeout=None):
+        """
+        Envia um comando e devolve a resposta (um stream é juntado numa lista em "msg").
+        Leituras são repetidas uma vez se a ligação caiu.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        attempts = 2 if command in READ_COMMANDS else 1
+        for attempt in range(attempts):
+            try:
+                return await self._execute(command, args or [], timeout)
+            except (OSError, ProtocolError):
+                if attempt == attempts - 1:
+                    raise
+
+    async def _execute(self, command, args, timeout):
+        conn = await self._connection()
+        request = await self._send(conn, command, args)
+        first = await self._wait(request, timeout)
+        if not first.get("stream"):
+            return first
+        end = {}
+        rows = []
+        try:
+            async for chunk in self._chunks(request, timeout, end):
+                rows.extend(chunk)
+        except ProtocolError as e:
+            return {"status": "error", "msg": str(e)}
+        response = {"status": "ok", "msg": rows}
+        if "cursor" in end:
+            response["cursor"] = end["cursor"]
+        return response
+
+    async def stream(self, command, args=None, timeout=None, end=None):
+        """
+        Percorre as rows de um select/join à medida que chegam:
+            async for row in client.stream("select", [["*"], {}]): ...
+        Se end for um dict, fica com o frame final (count e, num select ordenado, cursor).
+        Sair do ciclo a meio descarta o resto do stream.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        conn = await self._connection()
+        request = await self._send(conn, command, args or [])
+        first = await self._wait(request, timeout)
+        if first.get("status") == "error":
+            raise ProtocolError(first["msg"])
+        if not first.get("stream"):
+            raise ProtocolError("A resposta não é um stream.")
+        async for chunk in self._chunks(request, timeout, end):
+            for row in chunk:
+                yield row
+
+    async def _chunks(self, request, timeout, end=None):
+        """Rows de cada frame do stream; se quem lê parar antes do fim, o resto é descartado"""
+        finished = False
+        try:
+            while True:
+                frame = await request.next_frame(timeout)
+                if frame.get("status") == "error":
+                    finished = True
+                    raise ProtocolError(frame["msg"])
+                if frame.get("end"):
+                    finished = True
+                    if end is not None:
+                        end.update(frame)
+                    return
+                yield frame["rows"]
+        finally:
+            if not finished:
+                request.abandon()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        begin/commit numa ligação só para a transação (as transações pertencem à sessão da ligação):
+            async with client.transaction() as run:
+                await run("i", [1, "Ana"])
+        Uma exceção dentro do bloco faz rollback.
+        """
+        conn = await _Connection.open(self.host, self.port)
+
+        async def run(command, args=None):
+            return await self._wait(await self._send(conn, command, args or []), self.timeout)
+
+        try:
+            response = await run("begin")
+            if response["status"] != "ok" or not response["msg"].startswith("Transação iniciada"):
+                raise ProtocolError(response["msg"])
+            try:
+                yield run
+            except BaseException:
+                if not conn.closed:
+                    try:
+                        await run("rollback")
+                    except (OSError, ProtocolError, asyncio.TimeoutError):
+                        pass  # sem ligação o servidor já anulou a transação
+                raise
+            response = await run("commit")
+            if response["status"] != "ok":
+                raise ProtocolError(response["msg"])
+        finally:
+            await conn.close()
+
+    async def close(self):
+        conns, self._conns = self._conns, []
+        for conn in conns:
+            await conn.close()
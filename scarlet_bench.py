@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+import pickle
+
+import scarletdb
+import scarlet_parallel
+from scarletdb import ScarletDB
+from scarlet_server import handle_command
+from scarlet_client import ScarletClient, send_command
+from scarlet_query import compile_condition
+from scarlet_aggregate import parse_functions, aggregate_rows
+
+# Benchmarks da ScarletDB (em processo e ponta-a-ponta através de um servidor local).
+#
+#   python scarlet_bench.py --rows 50000 --out resultados.json
+#   python scarlet_bench.py --rows 50000 --storage columnar --mode inproc --compare resultados.json
+#   python scarlet_bench.py --rows 500000 --mode parallel --workers 4
+#
+# Cada corrida usa uma pasta temporária e uma seed fixa, para ser repetível.
+# Latências em milissegundos (p50/p99/média); débitos em rows/s.
+
+DEFAULT_SCHEMA = "id:int,name:str,price:float,qty:int"
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+
+
+def parse_schema(schema):
+    cols, types = [], []
+    for item in schema.split(","):
+        col, _, typ = item.partition(":")
+        cols.append(col.strip())
+        types.append(typ.strip() or "str")
+    if cols[0] != "id" or types[0] != "int":
+        raise SystemExit("O schema tem de começar por id:int.")
+    return cols, types
+
+
+def make_row(rng, row_id, types):
+    row = [row_id]
+    for typ in types[1:]:
+        if typ == "int":
+            row.append(rng.randint(0, 1000))
+        elif typ == "float":
+            row.append(round(rng.uniform(0, 1000), 2))
+        else:
+            row.append(f"{rng.choice(WORDS)}-{rng.randint(0, 99)}")
+    return row
+
+
+def summary(samples):
+    """Latências (segundos) → {p50, p99, mean} em ms"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"n": len(ordered), "p50_ms": round(pick(0.50), 4), "p99_ms": round(pick(0.99), 4),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4)}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summary(samples)
+
+
+def _check(response):
+    if response.get("status") != "ok":
+        raise RuntimeError(response.get("msg"))
+    return response
+
+
+# ---- Cenário comum (o mesmo conjunto de operações nos dois modos) ----
+def run_workload(run, args, cols, types):
+    """
+    run(cmd, args) executa um comando e devolve a resposta {"status", "msg"}.
+    Devolve o dicionário de resultados.
+    """
+    rng = random.Random(args.seed)
+    results = {}
+    n = args.rows
+    storage = [args.storage] if args.storage != "rows" else []
+    _check(run("wd", ["Bench"]))
+    _check(run("sd", ["Bench"]))
+    _check(run("wt", ["T", cols, types] + storage))
+    _check(run("st", ["T"]))
+
+    # inserção: uma row por comando e depois em lotes (ib)
+    single = min(n, args.single_inserts)
+    samples = []
+    for row_id in range(single):
+        row = make_row(rng, row_id, types)
+        start = time.perf_counter()
+        _check(run("i", row))
+        samples.append(time.perf_counter() - start)
+    results["insert_single"] = summary(samples)
+    results["insert_single"]["rows_per_s"] = round(single / sum(samples), 1) if samples else 0
+
+    start = time.perf_counter()
+    for first in range(single, n, args.batch):
+        batch = [make_row(rng, row_id, types) for row_id in range(first, min(n, first + args.batch))]
+        _check(run("ib", batch))
+    elapsed = time.perf_counter() - start
+    results["insert_batch"] = {"rows": n - single, "batch": args.batch, "seconds": round(elapsed, 4),
+                               "rows_per_s": round((n - single) / elapsed, 1) if elapsed else 0}
+
+    q = args.queries
+    point = lambda: _check(run("select", [["*"], f"id={rng.randrange(n)}"]))
+    span = max(1, n // 100)
+
+    def range_query():
+        low = rng.randrange(n)
+        return _check(run("select", [["id", "price" if "price" in cols else cols[-1]],
+                                     f"id>={low}&id<{low + span}"]))
+
+    results["select_point_scan"] = timed(point, q)
+    results["select_range_scan"] = timed(range_query, q)
+    _check(run("ci", ["id"]))
+    results["select_point_indexed"] = timed(point, q)
+    results["select_range_indexed"] = timed(range_query, q)
+    fixed = f"id>={n // 2}&id<{n // 2 + span}"
+    results["select_repeated"] = timed(lambda: _check(run("select", [["*"], fixed])), q)
+    results["select_full"] = timed(lambda: _check(run("select", [["*"], {}])), max(1, q // 20))
+    # top-K: heap sem índice na coluna de ordenação; offset aleatório para não vir da cache
+    sort_col = "price" if "price" in cols else cols[-1]
+    results["select_top_k"] = timed(lambda: _check(run("select", [["*"], {}, {
+        "order": [[sort_col, "desc"]], "limit": 10, "offset": rng.randrange(100)}])), max(1, q // 20))
+
+    upd_col, upd_type = cols[-1], types[-1]
+    new_value = 1 if upd_type in ("int", "float") else "updated"
+    results["update_point"] = timed(
+        lambda: _check(run("u", [f"id={rng.randrange(n)}", {upd_col: new_value}])), q)
+    ids = rng.sample(range(n), min(n, q))
+    results["delete_point"] = timed(lambda: _check(run("d", [f"id={ids.pop()}"])), len(ids))
+    return results
+
+
+# ---- Em processo ----
+def bench_inproc(args, cols, types, workdir):
+    scarletdb.DATA_DIR = os.path.join(workdir, "scarlet_data")
+    db = ScarletDB(wal=not args.no_wal)
+    run = lambda cmd, cmd_args: handle_command(db, {"cmd": cmd, "args": cmd_args})
+    results = run_workload(run, args, cols, types)
+
+    start = time.perf_counter()
+    db.close()
+    results["close_checkpoint"] = {"seconds": round(time.perf_counter() - start, 4)}
+
+    # arranque a frio: abrir a pasta e fazer a primeira leitura da tabela
+    start = time.perf_counter()
+    db = ScarletDB(wal=not args.no_wal)
+    opened = time.perf_counter() - start
+    run = lambda cmd, cmd_args: handle_command(db, {"cmd": cmd, "args": cmd_args})
+    _check(run("sd", ["Bench"]))
+    _check(run("st", ["T"]))
+    _check(run("select", [["id"], "id=0"]))
+    results["cold_start"] = {"open_s": round(opened, 4),
+                             "first_query_s": round(time.perf_counter() - start, 4)}
+    db.close()
+
+    # memória por row (tracemalloc, numa base de dados à parte)
+    tracemalloc.start()
+    db = ScarletDB(wal=not args.no_wal)
+    run = lambda cmd, cmd_args: handle_command(db, {"cmd": cmd, "args": cmd_args})
+    storage = [args.storage] if args.storage != "rows" else []
+    _check(run("wd", ["Mem"]))
+    _check(run("sd", ["Mem"]))
+    _check(run("wt", ["T", cols, types] + storage))
+    _check(run("st", ["T"]))
+    rng = random.Random(args.seed)
+    before = tracemalloc.get_traced_memory()[0]
+    for first in range(0, args.rows, args.batch):
+        db.insert_many([make_row(rng, row_id, types)
+                        for row_id in range(first, min(args.rows, first + args.batch))])
+    db.result_cache.invalidate("Mem")
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    results["memory"] = {"bytes_total": used, "bytes_per_row": round(used / max(1, args.rows), 1)}
+    db.close()
+    return results
+
+
+# ---- Scan paralelo (scarlet_parallel) vs um só processo ----
+def bench_parallel(args, cols, types, workdir):
+    """
+    O mesmo filtro (e a mesma agregação) sobre rows em memória: no processo atual e no pool,
+    que recebe as partições serializadas. "pickle_s" é só o custo de serializar as partições;
+    se o pool não ganha com mais processos é porque esse custo come o que se ganha no filtro.
+    """
+    rng = random.Random(args.seed)
+    rows = [dict(zip(cols, make_row(rng, row_id, types))) for row_id in range(args.rows)]
+    num = next((col for col, typ in zip(cols, types) if typ in ("int", "float") and col != "id"), "id")
+    predicate = compile_condition(f"{num}>=100&{num}<900&id>=0")
+    functions = parse_functions(["count", f"sum:{num}", f"avg:{num}"])
+    repeat = max(1, args.queries // 40)
+
+    sequential = lambda: [pos for pos, row in enumerate(rows) if predicate(row)]
+    expected = sequential()
+    results = {"matched": len(expected), "workers": args.workers,
+               "filter_single": timed(sequential, repeat),
+               "aggregate_single": timed(lambda: aggregate_rows(
+                   (row for row in rows if predicate(row)), functions, []), repeat)}
+
+    start = time.perf_counter()
+    if not scarlet_parallel.start(args.workers):
+        raise SystemExit("O modo parallel precisa de --workers > 1.")
+    results["pool_start"] = {"seconds": round(time.perf_counter() - start, 4)}
+    try:
+        if scarlet_parallel.parallel_filter(rows, predicate, args.workers) != expected:
+            raise RuntimeError("O scan paralelo não devolveu as mesmas posições.")
+        results["pickle_partitions"] = timed(lambda: pickle.dumps(
+            scarlet_parallel._partitions(rows, args.workers, predicate)), repeat)
+        results["filter_parallel"] = timed(
+            lambda: scarlet_parallel.parallel_filter(rows, predicate, args.workers), repeat)
+        results["aggregate_parallel"] = timed(
+            lambda: scarlet_parallel.parallel_aggregate(rows, predicate, functions, [], args.workers), repeat)
+    finally:
+        scarlet_parallel.stop()
+    for name in ("filter", "aggregate"):
+        single, parallel = results[f"{name}_single"]["p50_ms"], results[f"{name}_parallel"]["p50_ms"]
+        results[f"{name}_speedup"] = round(single / parallel, 2) if parallel else 0
+    return results
+
+
+# ---- Ponta-a-ponta ----
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_server(args, cols, types, workdir):
+    port = _free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = f"import scarlet_server as s; s.PORT = {port}; s.main()"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([here, os.environ.get("PYTHONPATH", "")]))
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("O servidor não arrancou.")
+                time.sleep(0.05)
+
+        client = ScarletClient("127.0.0.1", port, pool_size=1)
+        results = run_workload(client.execute, args, cols, types)
+
+        # uma ligação nova por comando (send_command) vs ligação persistente
+        results["roundtrip_persistent"] = timed(lambda: _check(client.execute("sd", ["Bench"])), args.queries)
+        results["roundtrip_new_connection"] = timed(
+            lambda: _check(send_command("sd", ["Bench"], "127.0.0.1", port)), args.queries)
+        start = time.perf_counter()
+        count = sum(1 for _ in client.stream("select", [["*"], {}]))
+        results["stream_full"] = {"rows": count, "seconds": round(time.perf_counter() - start, 4)}
+        client.close()
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(current, previous):
+    """Imprime a razão atual/anterior das métricas comuns (>1 → mais lento / mais memória)"""
+    for mode in ("inproc", "server", "parallel"):
+        for name, metrics in current.get(mode, {}).items():
+            old = previous.get(mode, {}).get(name, {})
+            for key in ("p50_ms", "p99_ms", "seconds", "bytes_per_row", "open_s", "first_query_s"):
+                if key in metrics and old.get(key):
+                    ratio = metrics[key] / old[key]
+                    print(f"{mode:7} {name:26} {key:14} {old[key]:>12} → {metrics[key]:>12}  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks da ScarletDB")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA, help="ex: id:int,name:str,price:float")
+    parser.add_argument("--storage", default="rows", choices=scarletdb.STORAGES)
+    parser.add_argument("--mode", default="both", choices=("inproc", "server", "both", "parallel"))
+    parser.add_argument("--workers", type=int, default=4, help="processos do modo parallel")
+    parser.add_argument("--queries", type=int, default=200, help="repetições por medição de latência")
+    parser.add_argument("--single-inserts", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-wal", action="store_true")
+    parser.add_argument("--out", help="ficheiro JSON com os resultados")
+    parser.add_argument("--compare", help="resultados anteriores (JSON) para comparar")
+    args = parser.parse_args()
+
+    cols, types = parse_schema(args.schema)
+    report = {"meta": {"rows": args.rows, "schema": args.schema, "storage": args.storage,
+                       "wal": not args.no_wal, "seed": args.seed, "queries": args.queries,
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S")}}
+    for mode, bench in (("inproc", bench_inproc), ("server", bench_server), ("parallel", bench_parallel)):
+        if args.mode not in (mode, "both") or (mode == "parallel" and args.mode != mode):
+            continue
+        workdir = tempfile.mkdtemp(prefix="scarlet_bench_")
+        try:
+            report[mode] = bench(args, cols, types, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+import time
+
+# Armazenamento dos valores das colunas `file`, endereçado pelo conteúdo:
+#   <db>/files/<2 primeiros hex>/<sha256>
+# O valor guardado na row é o caminho relativo à pasta da base de dados ("files/ab/ab12...").
+# Ficheiros iguais (em qualquer row ou tabela) ficam guardados uma única vez; as tabelas
+# contam as referências (table["blobs"]) e um blob sem referências é apagado.
+# Um blob enviado com upload só passa a ter referências quando a row chega (i/e), por isso
+# só se apagam blobs sem referências com mais de BLOB_MIN_AGE segundos (o upload renova a idade).
+# Uploads a meio (uploads/<digest>.part) podem ser retomados; os que não recebem bytes há mais
+# de UPLOAD_MAX_AGE segundos foram abandonados e o sweep apaga-os.
+
+CHUNK = 1 << 20  # leituras/cópias em blocos de 1 MiB (memória limitada para ficheiros grandes)
+BLOB_VALUE = re.compile(r"^files/([0-9a-f]{2})/([0-9a-f]{64})$")
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+BLOB_MIN_AGE = 3600
+UPLOAD_MAX_AGE = int(os.environ.get("SCARLET_UPLOAD_MAX_AGE", str(24 * 3600)))
+
+
+def blob_digest(value):
+    """Digest do blob referenciado por um valor de coluna `file` (None se não for um blob)"""
+    if isinstance(value, str):
+        m = BLOB_VALUE.match(value.replace(os.sep, "/"))
+        if m:
+            return m.group(2)
+    return None
+
+
+def blob_value(digest):
+    return f"files/{digest[:2]}/{digest}"
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def copy_file(src, dst):
+    """Cópia sem passar os dados pelo Python (copy_file_range, sendfile) quando o SO permite"""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for zero_copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+            if zero_copy is None:
+                continue
+            try:
+                copied = 0
+                while copied < size:
+                    if zero_copy is os.sendfile:
+                        n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, min(CHUNK, size - copied))
+                    else:
+                        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(CHUNK, size - copied),
+                                               copied, copied)
+                    if n == 0:
+                        break
+                    copied += n
+                if copied == size:
+                    return
+            except OSError:
+                pass
+            fdst.seek(0)
+            fdst.truncate()
+        fsrc.seek(0)
+        shutil.copyfileobj(fsrc, fdst, CHUNK)
+
+
+def _fsync(path):
+    """O conteúdo de um blob tem de estar no disco antes de uma row (no log) o referenciar"""
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put_file(self, src):
+        """Guarda o ficheiro (se ainda não houver um igual) e devolve o seu digest"""
+        digest = hash_file(src)
+        dest = self.path(digest)
+        if self.touch(digest):
+            return digest
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.tmp{threading.get_ident()}"
+        copy_file(src, tmp)
+        _fsync(tmp)
+        os.replace(tmp, dest)
+        return digest
+
+    def touch(self, digest):
+        """Renova a idade de um blob que vai voltar a ser referenciado; False se não existir"""
+        try:
+            os.utime(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def part_path(self, digest):
+        """Upload em curso (retomado a partir do tamanho que já tem)"""
+        folder = os.path.join(self.root, "uploads")
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"{digest}.part")
+
+    def commit_part(self, digest):
+        """Move um upload completo para o store, depois de confirmar que o conteúdo bate com o digest"""
+        part = self.part_path(digest)
+        if hash_file(part) != digest:
+            os.remove(part)
+            raise ValueError("Conteúdo recebido não corresponde ao digest indicado.")
+        dest = self.path(digest)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        _fsync(part)
+        os.replace(part, dest)
+
+    def resolve(self, value):
+        """Caminho no disco de um valor de coluna `file` (blob ou ficheiro antigo em files/)"""
+        digest = blob_digest(value)
+        if digest is not None:
+            return self.path(digest)
+        name = str(value).replace("\\", "/")
+        if name.startswith("files/"):
+            name = name[len("files/"):]
+        path = os.path.abspath(os.path.join(self.root, name))
+        if os.path.dirname(path) != os.path.abspath(self.root):
+            raise ValueError(f"Ficheiro inválido: '{value}'.")
+        return path
+
+    def remove(self, digest):
+        """Apaga um blob sem referências (um recente fica para um sweep posterior)"""
+        try:
+            if _old(self.path(digest)):
+                os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, live):
+        """Apaga os blobs antigos fora de `live` (e cópias temporárias e uploads abandonados)"""
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        uploads = os.path.join(self.root, "uploads")
+        if os.path.isdir(uploads):
+            for name in os.listdir(uploads):
+                path = os.path.join(uploads, name)
+                try:
+                    if time.time() - os.path.getmtime(path) >= UPLOAD_MAX_AGE:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass  # terminado (ou apagado) entretanto
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                try:
+                    if name not in live and _old(path):
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+def _old(path):
+    return time.time() - os.path.getmtime(path) >= BLOB_MIN_AGE
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+# Cache de resultados de select: (db, tabela, versão da tabela, colunas, condição normalizada,
+# order/limit/offset/after) → (rows, meta), com meta = {"cursor": ...} num select ordenado.
+# A versão muda a cada mutação da tabela (ScarletDB._apply), por isso uma entrada nunca é
+# servida depois de uma escrita; invalidate() liberta logo a memória das entradas antigas.
+
+MAX_ROWS = 200_000     # total de rows guardadas (limite de memória)
+MAX_ENTRIES = 1024
+MAX_RESULT_ROWS = 50_000  # resultados maiores não são guardados
+
+
+class ResultCache:
+    def __init__(self, max_rows=MAX_ROWS, max_entries=MAX_ENTRIES, max_result_rows=MAX_RESULT_ROWS):
+        self.max_rows = max_rows
+        self.max_entries = max_entries
+        self.max_result_rows = min(max_result_rows, max_rows)
+        self.hits = 0
+        self.misses = 0
+        self.rows = 0
+        self._entries = OrderedDict()
+        self._by_table = {}  # (db, tabela) → chaves em cache
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, rows, meta=None):
+        if len(rows) > self.max_result_rows:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (rows, meta or {})
+            self._by_table.setdefault(key[:2], set()).add(key)
+            self.rows += len(rows)
+            while self.rows > self.max_rows or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self.rows -= len(self._entries.pop(key)[0])
+        keys = self._by_table.get(key[:2])
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._by_table[key[:2]]
+
+    def invalidate(self, db_name, table_name=None):
+        """Descarta as entradas de uma tabela (ou de todas as tabelas da base de dados)"""
+        with self._lock:
+            tables = [k for k in self._by_table if k[0] == db_name and table_name in (None, k[1])]
+            for table in tables:
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+
+    def remember(self, key, rows, meta=None):
+        """
+        Passa as rows adiante e guarda-as quando o resultado chega ao fim (e não é grande demais).
+        meta é lido só no fim, depois de o gerador das rows o preencher.
+        """
+        kept = []
+        for row in rows:
+            if kept is not None:
+                kept.append(row)
+                if len(kept) > self.max_result_rows:
+                    kept = None
+            yield row
+        if kept is not None:
+            self.put(key, kept, meta)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "rows": self.rows, "hit_rate": self.hits / total if total else 0.0}
@@ -1,6 +1,11 @@
-import socket
 import json
+import socket
+import queue
+import threading
+from contextlib import contextmanager
 from scarlet_parser import parse_input
+from scarlet_protocol import send_frame, recv_frame, read_response, iter_stream, hello, ProtocolError
+from scarlet_transfer import upload_file, download_file
 
 PORT = 65432
 
@@ -13,6 +18,8 @@ dd->TestDB (delete database)
 # ---------------- TABELAS ----------------
 wt->Users->id:int,name:str,cv:file (create table)
 wt->Products->id:int,name:str,manual:file,price:float
+wt->Sales->id:int,product:str,qty:int,price:float->columnar (columnar storage)
+wt->Customers->id:int:pk,name:str (primary key: unique, O(1) lookup by id)
 st->Users (select table)
 st->Products
 dt->Users (delete table)
@@ -24,6 +31,7 @@ i->2,'Bernardo','/home/username/docs/bernardo_cv.pdf'
 i->3,'Carla','/home/username/docs/carla_cv.pdf'
 i->101,'Laptop','/home/username/docs/laptop_manual.pdf',1200.50
 i->102,'Mouse','/home/username/docs/mouse_manual.pdf',25,99
+ib->4,'Diana','/home/username/docs/diana_cv.pdf';5,'Eva','/home/username/docs/eva_cv.pdf' (batch insert)
 
 # ---------------- ATUALIZAÇÃO (UPDATE) ----------------
 # ---- Command 'u' is no longer maintained, use command 'e' ----
@@ -34,6 +42,7 @@ u->id:102->manual:'/home/username/docs/mouse_new_manual.pdf',price:30.50
 
 # ---------------- DELETE ----------------
 d->id=1
+d->price>1000&name='Laptop'
 
 # ---------------- SELEÇÃO (SELECT) ----------------
 select->*
@@ -44,6 +53,26 @@ select->id,name->id:1
 select->name,price->price>25.99
 select->*->id>5&age=19
 select->*->age>18||name="John"
+select->*->->order:price desc,id->limit:10 (top 10 by price, ties by id)
+select->id,name->age>18->order:name->limit:20->offset:40 (third page of 20)
+select->*->->order:price desc,id->limit:10->after:[25.5,102] (next page after the returned cursor)
+
+# ---------------- JOIN ----------------
+wt->Orders->id:int,user_id:int,total:float
+join->inner->Users.id=Orders.user_id->Users.name,Orders.total (users with their orders)
+join->left->Users.id=Orders.user_id->*->Users.id>5 (users with id>5, with None when they have no orders)
+join->inner->Users.id=Orders.user_id->Users.name,Orders.total->Users.name='Alice'&total>10
+ci->user_id (on Orders: index nested loop join instead of hash join)
+
+# ---------------- AGREGAÇÃO ----------------
+agg->count (count rows)
+agg->count,avg:price,max:price (several aggregates)
+agg->count,sum:price->name (group by name)
+agg->min:price,max:price->->price>25 (with a condition, no grouping)
+
+# ---------------- ÍNDICES ----------------
+ci->id (create index, speeds up =, <, >, <=, >= on that column)
+ci->price
 
 # ---------------- EDIÇÃO (EDIT) ----------------
 e->ac->email (add column)
@@ -52,24 +81,267 @@ e->id:3->set:cv='/home/username/docs/carla_updated_cv.pdf'
 e->id:101->set:price=1150.50
 e->id:100->set:name='laptop',price=200,99 (edit row (multiple columns))
 
+# ---------------- FICHEIROS ----------------
+upload->/home/username/docs/alice_cv.pdf (send a local file, returns the value to use in i/e)
+i->6,'Filipa','files/3c/3cdc92c3...' (value returned by upload)
+download->files/3c/3cdc92c3...->/tmp/alice_cv.pdf (resumes an interrupted download from /tmp/alice_cv.pdf.part)
+
+# ---------------- TRANSAÇÕES ----------------
+begin (start a transaction in the current database)
+i->7,'Gil','/home/username/docs/gil_cv.pdf'
+e->id:2->set:name='Bernardo'
+commit (write all changes at once) / rollback (undo them)
+
 # ---------------- OUTROS ----------------
 show (show full table)
+cache (select result cache hits/misses)
+stats (latency per command and phase, rows scanned/returned, bytes, saves, slow queries)
+repl (replication status: leader with its followers, or follower with the applied position)
+
+# ---------------- REPLICAÇÃO ----------------
+# leader:   SCARLET_REPL_PORT=65433 python scarlet_server.py
+# follower: SCARLET_FOLLOW=127.0.0.1:65433 SCARLET_PORT=65442 python scarlet_server.py (in another folder; read-only)
+
+# ---------------- SHARDING ----------------
+# router:   SCARLET_SHARDS=127.0.0.1:65441,127.0.0.1:65442 python scarlet_router.py (port 65430)
+# rows are partitioned by the table's primary key (or its first column)
+shards (list the shards behind the router)
+addshard->127.0.0.1:65443 (add a shard and move to it the rows it now owns)
 """
 
-def send_command(command, args=None, host=None):
-    host = host or "127.0.0.1"  # default se não for passado
+READ_COMMANDS = {"select", "join", "show", "sd", "st", "cache", "stats", "repl"}  # podem ser repetidos depois de uma falha de ligação
+
+def next_selection(db, table, command, args, response):
+    """
+    (base de dados, tabela) selecionadas depois da resposta a um comando: sd/st só contam se o
+    servidor os aceitou, e um dd/dt da seleção atual limpa-a.
+    """
+    if response.get("status") != "ok" or not args:
+        return db, table
+    msg = str(response.get("msg", ""))
+    if command == "sd" and msg.startswith("Base de dados atual"):
+        return args[0], None
+    if command == "st" and msg.startswith("Tabela atual"):
+        return db, args[0]
+    if command == "dd" and args[0] == db and msg.endswith("eliminada."):
+        return None, None
+    if command == "dt" and args[0] == table and " eliminada de " in msg:
+        return db, None
+    return db, table
+
+def _connect(host, port=PORT):
+    s = socket.create_connection((host or "127.0.0.1", port))  # default se não for passado
+    hello(s)
+    return s
+
+class Connection:
+    """Ligação persistente, com a base de dados/tabela que foram selecionadas nela"""
+
+    def __init__(self, host, port):
+        self.sock = _connect(host, port)
+        self.db = None
+        self.table = None
+        self.broken = False  # frames por ler ou erro de rede: não volta ao pool
+
+    def send(self, command, args=None):
+        send_frame(self.sock, {"cmd": command, "args": args or []})
+
+    def read(self):
+        return read_response(self.sock)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class ScarletClient:
+    """
+    Cliente com ligações persistentes e um pool thread-safe.
+    Cada ligação do servidor tem a sua sessão, por isso o cliente guarda a base de dados
+    e tabela escolhidas (sd/st) e repete-as numa ligação que ainda não as tenha.
+    """
+
+    def __init__(self, host="127.0.0.1", port=PORT, pool_size=4):
+        self.host = host
+        self.port = port
+        self.db = None
+        self.table = None
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma ligação do pool (cria uma nova se não houver nenhuma livre)"""
+        self._slots.acquire()
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = Connection(self.host, self.port)
+            yield conn
+        except (OSError, ProtocolError):
+            # ligação perdida: descartada, e as que estão paradas no pool provavelmente também
+            if conn:
+                conn.broken = True
+            self._drain()
+            raise
+        finally:
+            if conn and conn.broken:
+                conn.close()
+            elif conn:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def _track(self, conn, command, args, response):
+        """Atualiza a seleção da ligação e a do cliente com a resposta a um comando"""
+        conn.db, conn.table = next_selection(conn.db, conn.table, command, args, response)
+        with self._lock:
+            self.db, self.table = next_selection(self.db, self.table, command, args, response)
+
+    def _sync(self, conn):
+        """Envia os sd/st que faltam nesta ligação; devolve-os (as respostas lê-as _synced)"""
+        with self._lock:
+            db, table = self.db, self.table
+        sync = []
+        if db is not None and conn.db != db:
+            sync.append(("sd", [db]))
+        if table is not None and (conn.table != table or sync):
+            sync.append(("st", [table]))
+        for command, args in sync:
+            conn.send(command, args)
+        return sync
+
+    def _synced(self, conn, sync):
+        for command, args in sync:
+            conn.db, conn.table = next_selection(conn.db, conn.table, command, args, conn.read())
+
+    def pipeline(self, commands):
+        """
+        Envia vários comandos [(cmd, args), ...] de seguida numa só ligação
+        e só depois lê as respostas (uma por comando, pela mesma ordem).
+        """
+        with self.connection() as conn:
+            return self._pipeline(conn, commands)
+
+    def _pipeline(self, conn, commands):
+        sync = self._sync(conn)
+        for command, args in commands:
+            conn.send(command, args)
+        self._synced(conn, sync)
+        responses = []
+        for command, args in commands:
+            responses.append(conn.read())
+            self._track(conn, command, args, responses[-1])
+        return responses
+
+    @contextmanager
+    def transaction(self):
+        """
+        begin/commit numa só ligação (as transações pertencem à sessão da ligação):
+            with client.transaction() as run:
+                run("i", [1, "Ana"])
+                run("e", ["row_edit", 2, {"nome": "Rui"}])
+        Uma exceção dentro do bloco faz rollback.
+        """
+        with self.connection() as conn:
+            run = lambda command, args=None: self._pipeline(conn, [(command, args or [])])[0]
+            response = run("begin")
+            if response["status"] != "ok" or not response["msg"].startswith("Transação iniciada"):
+                raise ProtocolError(response["msg"])
+            try:
+                yield run
+            except Exception:
+                try:
+                    run("rollback")
+                except (OSError, ProtocolError):
+                    pass  # sem ligação o servidor já anulou a transação
+                raise
+            response = run("commit")
+            if response["status"] != "ok":
+                raise ProtocolError(response["msg"])
+
+    def execute(self, command, args=None):
+        """Envia um comando e devolve a resposta; leituras são repetidas se a ligação caiu"""
+        attempts = 2 if command in READ_COMMANDS else 1
+        for attempt in range(attempts):
+            try:
+                return self.pipeline([(command, args or [])])[0]
+            except (OSError, ProtocolError):
+                if attempt == attempts - 1:
+                    raise
+
+    def stream(self, command, args=None):
+        """Percorre as rows de um select à medida que chegam"""
+        with self.connection() as conn:
+            sync = self._sync(conn)
+            conn.send(command, args)
+            self._synced(conn, sync)
+            first = recv_frame(conn.sock)
+            if first is None:
+                raise ProtocolError("Servidor fechou a ligação.")
+            if first.get("status") == "error":
+                raise ProtocolError(first["msg"])
+            conn.broken = True  # até o stream ser lido até ao fim
+            yield from iter_stream(conn.sock, first)
+            conn.broken = False
+
+    def _transfer(self, fn, *args):
+        with self.connection() as conn:
+            self._synced(conn, self._sync(conn))
+            conn.broken = True  # até a transferência terminar
+            result = fn(conn.sock, *args)
+            conn.broken = False
+            return result
+
+    def upload(self, path):
+        """Envia um ficheiro local para a base de dados atual; devolve o valor para a coluna `file`"""
+        return self._transfer(upload_file, path)
+
+    def download(self, value, dest, resume=False):
+        """Descarrega o ficheiro de um valor `file` para dest; devolve o tamanho (resume: ver download_file)"""
+        return self._transfer(download_file, value, dest, resume)
+
+    def _drain(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def close(self):
+        self._drain()
+
+def send_command(command, args=None, host=None, port=PORT):
     msg = {"cmd": command, "args": args or []}
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((host, PORT))
-        s.sendall(json.dumps(msg).encode("utf-8"))
-        data = s.recv(4096)
-        return json.loads(data.decode("utf-8"))
+    with _connect(host, port) as s:
+        send_frame(s, msg)
+        return read_response(s)
+
+def iter_command(command, args=None, host=None):
+    """Como send_command, mas percorre as rows de um select à medida que chegam"""
+    msg = {"cmd": command, "args": args or []}
+    with _connect(host) as s:
+        send_frame(s, msg)
+        first = recv_frame(s)
+        if first is None:
+            raise ProtocolError("Servidor fechou a ligação.")
+        if first.get("status") == "error":
+            raise ProtocolError(first["msg"])
+        yield from iter_stream(s, first)
 
 def main():
     default_host = "127.0.0.1"  # ou outro IP que queiras como default
-    host_input = input("\033[93mConnect to (IP do servidor, vazio=default):\033[0m ").strip()
+    host_input = input("\033[93mConnect to (IP do servidor, ou IP:porta; vazio=default):\033[0m ").strip()
     HOST_TO_USE = host_input or default_host  # se vazio, usa default
+    port = PORT
+    if ":" in HOST_TO_USE:  # ex: 127.0.0.1:65430 (router)
+        HOST_TO_USE, _, port = HOST_TO_USE.rpartition(":")
+        port = int(port)
 
+    client = ScarletClient(HOST_TO_USE, port, pool_size=1)
     print(f"Ligado a {HOST_TO_USE}")
     print("Ligado à ScarletDB CLI (formato: cmd->args)")
     print("'-h' or 'help' for help")
@@ -86,12 +358,25 @@ def main():
                 break
 
             cmd, args = parse_input(user_input)
-            response = send_command(cmd, args, host=HOST_TO_USE)
+            if cmd == "upload" and args:
+                print(f"\033[93m[ok]\033[0m {client.upload(args[0])}")
+                continue
+            if cmd == "download" and len(args) == 2:
+                size = client.download(args[0], args[1], resume=True)
+                print(f"\033[93m[ok]\033[0m {size} bytes guardados em {args[1]}")
+                continue
+            response = client.execute(cmd, args)
             print(f"\033[93m[{response['status']}]\033[0m {response['msg']}")
+            if response.get("cursor") is not None:
+                print(f"cursor: after:{json.dumps(response['cursor'])}")
 
         except KeyboardInterrupt:
             print("\nCliente interrompido.")
             break
+        except (OSError, ProtocolError) as e:
+            print(f"\033[91m[erro de ligação]\033[0m {e}")
+
+    client.close()
 
 if __name__ == "__main__":
     main()
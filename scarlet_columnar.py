@@ -0,0 +1,327 @@
+import operator
+from array import array
+from functools import partial
+from itertools import compress
+
+from scarlet_query import comparator
+
+try:
+    import numpy as np  # opcional: filtros numéricos vetorizados
+except ImportError:
+    np = None
+
+# Armazenamento colunar (wt->Tabela->colunas->columnar):
+# - int / float: um array tipado por coluna + bitmap de validade para os None
+# - restantes tipos: dicionário de valores distintos + array de códigos (-1 = None)
+# As rows só são materializadas em dicts quando são devolvidas.
+
+# byte do bitmap → 8 bytes 0/1 (para expandir o bitmap numa máscara por row)
+_EXPAND = [bytes((b >> i) & 1 for i in range(8)) for b in range(256)]
+
+# valor <op> literal, escrito como função do literal (operator.gt(lit, v) ≡ v < lit)
+_REVERSED_OPS = {
+    "=": operator.eq, "==": operator.eq, "===": operator.eq, "!=": operator.ne,
+    "<": operator.gt, ">": operator.lt, "<=": operator.ge, ">=": operator.le,
+}
+_NUMPY_OPS = {
+    "=": operator.eq, "==": operator.eq, "===": operator.eq, "!=": operator.ne,
+    "<": operator.lt, ">": operator.gt, "<=": operator.le, ">=": operator.ge,
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class NumericColumn:
+    def __init__(self, typecode, cast):
+        self.typecode = typecode
+        self.cast = cast
+        self.data = array(typecode)
+        self.valid = bytearray()  # 1 bit por row
+        self.nulls = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def check(self, value):
+        """Converte o valor para o tipo da coluna (erro antes de alterar alguma coisa)"""
+        return None if value is None else self.cast(value)
+
+    def get(self, pos):
+        if self.nulls and not (self.valid[pos >> 3] >> (pos & 7)) & 1:
+            return None
+        return self.data[pos]
+
+    def append(self, value):
+        n = len(self.data)
+        if n & 7 == 0:
+            self.valid.append(0)
+        if value is None:
+            self.data.append(0)
+            self.nulls += 1
+        else:
+            self.data.append(value)
+            self.valid[n >> 3] |= 1 << (n & 7)
+
+    def set(self, pos, value):
+        was_null = self.get(pos) is None
+        if value is None:
+            self.data[pos] = 0
+            self.valid[pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+            self.nulls += 0 if was_null else 1
+        else:
+            self.data[pos] = value
+            self.valid[pos >> 3] |= 1 << (pos & 7)
+            self.nulls -= 1 if was_null else 0
+
+    def fill_nulls(self, n):
+        """Acrescenta n valores None (nova coluna numa tabela com n rows)"""
+        self.data = array(self.typecode, bytes(n * self.data.itemsize))
+        self.valid = bytearray((n + 7) >> 3)
+        self.nulls = n
+
+    def copy(self):
+        column = NumericColumn(self.typecode, self.cast)
+        column.data = array(self.typecode, self.data)
+        column.valid = bytearray(self.valid)
+        column.nulls = self.nulls
+        return column
+
+    def validity_mask(self):
+        n = len(self.data)
+        if not self.nulls:
+            return b"\x01" * n
+        return b"".join(_EXPAND[b] for b in self.valid)[:n]
+
+    def keep(self, mask):
+        """Fica só com as rows cuja máscara é 1"""
+        if self.nulls:
+            values = [self.get(pos) for pos in compress(range(len(self.data)), mask)]
+        else:
+            values = list(compress(self.data, mask))
+        self.data = array(self.typecode)
+        self.valid = bytearray()
+        self.nulls = 0
+        for value in values:
+            self.append(value)
+
+    def values(self):
+        if not self.nulls:
+            return list(self.data)
+        return [self.get(pos) for pos in range(len(self.data))]
+
+    def mask(self, op, literal):
+        """Máscara (1 byte por row) de `valor op literal`"""
+        n = len(self.data)
+        if not _is_number(literal):
+            # número contra texto: só != é verdadeiro (e nunca para None)
+            return self.validity_mask() if op == "!=" else bytes(n)
+        if op == "===" and type(literal) is not (int if self.typecode == "q" else float):
+            return bytes(n)
+        if np is not None and n:
+            values = np.frombuffer(self.data, dtype=np.int64 if self.typecode == "q" else np.float64)
+            mask = _NUMPY_OPS[op](values, literal).astype(np.uint8).tobytes()
+        else:
+            mask = bytes(map(partial(_REVERSED_OPS[op], literal), self.data))
+        if self.nulls:
+            mask = _and(mask, self.validity_mask())
+        return mask
+
+
+class DictColumn:
+    """Coluna codificada por dicionário (strings repetidas guardadas uma só vez)"""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.dictionary = []   # código → valor
+        self.lookup = {}       # valor → código
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _code(self, value):
+        if value is None:
+            return -1
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.dictionary)
+            self.dictionary.append(value)
+            self.lookup[value] = code
+        return code
+
+    def check(self, value):
+        return value
+
+    def get(self, pos):
+        code = self.codes[pos]
+        return None if code < 0 else self.dictionary[code]
+
+    def append(self, value):
+        self.codes.append(self._code(value))
+
+    def set(self, pos, value):
+        self.codes[pos] = self._code(value)
+
+    def fill_nulls(self, n):
+        self.codes = array("i", [-1]) * n
+
+    def keep(self, mask):
+        self.codes = array("i", compress(self.codes, mask))
+
+    def copy(self):
+        column = DictColumn()
+        column.codes = array("i", self.codes)
+        column.dictionary = list(self.dictionary)
+        column.lookup = dict(self.lookup)
+        return column
+
+    def values(self):
+        dictionary = self.dictionary
+        return [None if code < 0 else dictionary[code] for code in self.codes]
+
+    def mask(self, op, literal):
+        # avalia a condição uma vez por valor distinto e depois mapeia os códigos
+        compare = comparator(op, literal)
+        table = bytearray(map(compare, self.dictionary))
+        table.append(0)  # código -1 (None) → último elemento → 0
+        return bytes(map(table.__getitem__, self.codes))
+
+
+def _and(a, b):
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def _or(a, b):
+    return (int.from_bytes(a, "little") | int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def make_column(typ):
+    if typ == "int":
+        return NumericColumn("q", int)
+    if typ == "float":
+        return NumericColumn("d", float)
+    return DictColumn()
+
+
+class ColumnarRows:
+    """
+    Substitui a lista de dicts em table["rows"] numa tabela colunar.
+    Ler uma posição devolve um dict novo; as alterações passam por
+    append/extend/update_row/delete/add_column.
+    readers: streams a meio do envio destas rows. Enquanto houver algum, quem altera ou
+    apaga rows existentes trabalha numa cópia (copy) e os streams ficam com o original.
+    """
+
+    def __init__(self, columns, types):
+        self.names = list(columns)
+        self.columns = {col: make_column(typ) for col, typ in zip(columns, types)}
+        self.length = 0
+        self.readers = set()
+
+    @classmethod
+    def from_json(cls, columns, types, data):
+        rows = cls(columns, types)
+        values = [data.get(col, []) for col in columns]
+        for row_values in zip(*values):
+            rows.append(dict(zip(columns, row_values)))
+        return rows
+
+    def copy(self):
+        """Cópia independente (sem readers)"""
+        rows = ColumnarRows([], [])
+        rows.names = list(self.names)
+        rows.columns = {col: column.copy() for col, column in self.columns.items()}
+        rows.length = self.length
+        return rows
+
+    def to_json(self):
+        return {col: self.columns[col].values() for col in self.names}
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self.length
+        if not 0 <= pos < self.length:
+            raise IndexError(pos)
+        return self.row(pos)
+
+    def __iter__(self):
+        for pos in range(self.length):
+            yield self.row(pos)
+
+    def row(self, pos, cols=None):
+        """Materializa a row `pos` (só com `cols`, se indicadas)"""
+        columns = self.columns
+        return {col: columns[col].get(pos) if col in columns else None
+                for col in (cols or self.names)}
+
+    def append(self, row):
+        columns = [self.columns[col] for col in self.names]
+        values = [column.check(row.get(col)) for col, column in zip(self.names, columns)]
+        for column, value in zip(columns, values):
+            column.append(value)
+        self.length += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def update_row(self, pos, changes):
+        changes = {col: self.columns[col].check(value) for col, value in changes.items() if col in self.columns}
+        for col, value in changes.items():
+            self.columns[col].set(pos, value)
+
+    def delete(self, gone):
+        keep = bytearray(b"\x01") * self.length
+        for pos in gone:
+            keep[pos] = 0
+        for column in self.columns.values():
+            column.keep(keep)
+        self.length -= len(set(gone))
+
+    def add_column(self, name, typ):
+        column = make_column(typ)
+        column.fill_nulls(self.length)
+        self.names.append(name)
+        self.columns[name] = column
+
+    def values(self, col, positions=None):
+        """Valores de uma coluna (None onde não há valor), por posição ou só nas `positions`"""
+        if col not in self.columns:
+            return [None] * (self.length if positions is None else len(positions))
+        column = self.columns[col]
+        if positions is None:
+            return column.values()
+        if isinstance(column, NumericColumn) and not column.nulls:
+            data = column.data
+            return [data[pos] for pos in positions]
+        return [column.get(pos) for pos in positions]
+
+    # ---- Filtros vetorizados ----
+    def _mask(self, tree):
+        if tree is None:
+            return b"\x01" * self.length
+        kind = tree[0]
+        if kind == "cmp":
+            _, col, op, literal = tree
+            if col not in self.columns:
+                return bytes(self.length)
+            return self.columns[col].mask(op, literal)
+        if kind == "false":
+            return bytes(self.length)
+        masks = [self._mask(child) for child in tree[1]]
+        combine = _and if kind == "and" else _or
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = combine(mask, other)
+        return mask
+
+    def filter(self, predicate, candidates=None):
+        """Posições (ordenadas) que satisfazem o predicado compilado"""
+        if candidates is not None:
+            # poucos candidatos (vindos de um índice): avaliar row a row
+            return [pos for pos in candidates if predicate(self.row(pos))]
+        return list(compress(range(self.length), self._mask(predicate.tree)))
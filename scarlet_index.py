@@ -0,0 +1,139 @@
+from bisect import bisect_left, bisect_right
+from scarlet_query import to_literal
+
+
+def normalize(value):
+    """Chave de índice: o valor convertido como um literal de condição (aspas, int/float)"""
+    if isinstance(value, (dict, list)):
+        return None  # não indexável
+    return to_literal(value)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ColumnIndex:
+    """
+    Índice de uma coluna:
+    - hash:   valor → posições (predicados de igualdade)
+    - sorted: valores numéricos ordenados + posições (intervalos com bisect)
+    As posições são os índices das rows em table["rows"].
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.hash = {}
+        self.keys = []        # valores numéricos ordenados
+        self.positions = []   # posição correspondente a cada chave
+
+    @classmethod
+    def build(cls, column, values):
+        """Constrói o índice a partir dos valores da coluna, por posição"""
+        index = cls(column)
+        pairs = []
+        for pos, value in enumerate(values):
+            key = normalize(value)
+            if key is None:
+                continue
+            index.hash.setdefault(key, []).append(pos)
+            if _is_number(key):
+                pairs.append((key, pos))
+        pairs.sort()
+        index.keys = [k for k, _ in pairs]
+        index.positions = [p for _, p in pairs]
+        return index
+
+    # ---- Manutenção incremental ----
+    def add(self, pos, value):
+        self.add_many(pos, [value])
+
+    def add_many(self, start, values):
+        """Indexa um lote de rows inseridas a partir da posição `start`"""
+        pairs = []
+        for pos, value in enumerate(values, start):
+            key = normalize(value)
+            if key is None:
+                continue
+            self.hash.setdefault(key, []).append(pos)
+            if _is_number(key):
+                pairs.append((key, pos))
+        if len(pairs) < 64:
+            for key, pos in pairs:
+                # por (valor, posição): os empates ficam pela ordem de armazenamento
+                i = bisect_left(self.positions, pos, bisect_left(self.keys, key), bisect_right(self.keys, key))
+                self.keys.insert(i, key)
+                self.positions.insert(i, pos)
+            return
+        # lote grande: juntar duas sequências ordenadas (timsort faz isto em tempo linear)
+        pairs.sort()
+        merged = sorted(list(zip(self.keys, self.positions)) + pairs)
+        self.keys = [k for k, _ in merged]
+        self.positions = [p for _, p in merged]
+
+    def remove(self, pos, value):
+        key = normalize(value)
+        if key is None:
+            return
+        bucket = self.hash.get(key)
+        if bucket:
+            bucket.remove(pos)
+            if not bucket:
+                del self.hash[key]
+        if _is_number(key):
+            i = bisect_left(self.keys, key)
+            while i < len(self.keys) and self.keys[i] == key:
+                if self.positions[i] == pos:
+                    del self.keys[i]
+                    del self.positions[i]
+                    break
+                i += 1
+
+    def update(self, pos, old, new):
+        if normalize(old) != normalize(new):
+            self.remove(pos, old)
+            self.add(pos, new)
+
+    def compact(self, gone):
+        """Remove as posições apagadas e desloca as restantes (gone: lista ordenada)"""
+        gone_set = set(gone)
+
+        def shift(pos):
+            return pos - bisect_left(gone, pos)
+
+        for key in list(self.hash):
+            bucket = [shift(p) for p in self.hash[key] if p not in gone_set]
+            if bucket:
+                self.hash[key] = bucket
+            else:
+                del self.hash[key]
+
+        keys = []
+        positions = []
+        for key, pos in zip(self.keys, self.positions):
+            if pos not in gone_set:
+                keys.append(key)
+                positions.append(shift(pos))
+        self.keys = keys
+        self.positions = positions
+
+    # ---- Pesquisa ----
+    def lookup(self, op, value):
+        """
+        Devolve as posições candidatas para `coluna op valor`, ou None se o índice não serve.
+        Os candidatos são sempre reverificados com o predicado original.
+        """
+        key = normalize(value)
+        if op in ("=", "==", "==="):
+            return list(self.hash.get(key, []))
+        if not _is_number(key):
+            return None
+        if op == "<":
+            return self.positions[:bisect_left(self.keys, key)]
+        if op == "<=":
+            return self.positions[:bisect_right(self.keys, key)]
+        if op == ">":
+            return self.positions[bisect_right(self.keys, key):]
+        if op == ">=":
+            return self.positions[bisect_left(self.keys, key):]
+        return None
@@ -0,0 +1,164 @@
+from scarlet_index import normalize
+from scarlet_query import Predicate
+
+# Joins por igualdade entre duas tabelas da mesma base de dados:
+#   join->inner->Users.id=Products.owner_id->Users.name,Products.name->Products.price>10
+#   join->left->Users.id=Products.owner_id->*->Users.age>18
+#
+# As colunas do resultado (e da condição) têm o nome da tabela: "Users.name".
+# Na condição, um nome sem tabela é aceite se só uma das tabelas tiver essa coluna.
+#
+# Plano:
+# - a condição é partida nos seus termos AND; os que só usam uma tabela são avaliados nessa
+#   tabela antes do join (com índices, se houver). Num left join os termos da tabela da direita
+#   ficam para depois do join (senão as rows sem par deixavam de aparecer com None).
+# - index nested loop quando a tabela da direita tem índice na coluna do join e a esquerda tem
+#   menos rows selecionadas do que ela (a direita nem chega a ser percorrida). Num inner join
+#   serve também o índice da esquerda, com os lados trocados (num left join não: as rows da
+#   esquerda sem par não apareciam). Senão hash join, com a tabela de hash sobre o lado mais pequeno.
+# - o resultado sai pela ordem das rows da tabela da esquerda (e da direita, nos empates).
+# - None nunca faz par; as chaves comparam como nas condições ("5" = 5).
+
+JOIN_KINDS = ("inner", "left")
+
+
+def parse_on(on):
+    """'Users.id=Products.owner_id' → ((Users, id), (Products, owner_id))"""
+    if isinstance(on, (list, tuple)) and len(on) == 2:
+        sides = list(on)
+    else:
+        sides = str(on).replace("==", "=").split("=")
+    if len(sides) != 2:
+        raise ValueError("Condição de join inválida (esperado: Tabela.coluna=Tabela.coluna).")
+    parsed = []
+    for side in sides:
+        table, dot, col = side.strip().partition(".")
+        if not dot or not table or not col:
+            raise ValueError(f"Coluna de join sem tabela: '{side.strip()}' (esperado: Tabela.coluna).")
+        parsed.append((table, col))
+    if parsed[0][0] == parsed[1][0]:
+        raise ValueError("O join precisa de duas tabelas diferentes.")
+    return parsed[0], parsed[1]
+
+
+def qualify(col, tables):
+    """Nome qualificado (Tabela.coluna) de uma coluna da condição ou da projeção"""
+    table, dot, name = col.partition(".")
+    if dot:
+        if table not in tables:
+            raise ValueError(f"Tabela '{table}' não faz parte do join.")
+        return col
+    owners = [t for t, columns in tables.items() if col in columns]
+    if len(owners) != 1:
+        raise ValueError(f"Coluna '{col}' ambígua ou inexistente (use Tabela.coluna).")
+    return f"{owners[0]}.{col}"
+
+
+def _qualify_tree(tree, tables):
+    if tree is None or tree[0] == "false":
+        return tree
+    if tree[0] == "cmp":
+        _, col, op, literal = tree
+        return ("cmp", qualify(col, tables), op, literal)
+    return (tree[0], [_qualify_tree(child, tables) for child in tree[1]])
+
+
+def _tables_of(tree):
+    if tree[0] == "false":
+        return set()
+    if tree[0] == "cmp":
+        return {tree[1].partition(".")[0]}
+    return set().union(*(_tables_of(child) for child in tree[1]))
+
+
+def _strip(tree):
+    """Tira o nome da tabela às colunas (para avaliar o termo na própria tabela)"""
+    if tree[0] == "cmp":
+        _, col, op, literal = tree
+        return ("cmp", col.partition(".")[2], op, literal)
+    if tree[0] == "false":
+        return tree
+    return (tree[0], [_strip(child) for child in tree[1]])
+
+
+def _combine(terms):
+    if not terms:
+        return None
+    return ("and", terms) if len(terms) > 1 else terms[0]
+
+
+def split_condition(predicate, tables, left, right, kind):
+    """
+    Divide a condição compilada em (predicado da esquerda, predicado da direita, resto),
+    o resto avaliado sobre a row já juntada (com colunas qualificadas).
+    """
+    tree = _qualify_tree(predicate.tree, tables)
+    terms = [] if tree is None else (tree[1] if tree[0] == "and" else [tree])
+    pushed = {left: [], right: []}
+    residual = []
+    for term in terms:
+        used = _tables_of(term)
+        if len(used) == 1:
+            table = used.pop()
+            if table == left or kind == "inner":
+                pushed[table].append(_strip(term))
+                continue
+        residual.append(term)
+    return (Predicate(_combine(pushed[left])), Predicate(_combine(pushed[right])),
+            Predicate(_combine(residual)) if residual else None)
+
+
+def hash_join(left_positions, left_keys, right_positions, right_keys, kind):
+    """
+    Pares (posição esquerda, posição direita ou None) ordenados pela esquerda.
+    A tabela de hash é construída sobre o lado com menos rows.
+    """
+    pairs = []
+    if len(right_positions) <= len(left_positions):
+        table = {}
+        for pos, key in zip(right_positions, right_keys):
+            key = normalize(key)
+            if key is not None:
+                table.setdefault(key, []).append(pos)
+        for pos, key in zip(left_positions, left_keys):
+            matches = table.get(normalize(key)) if key is not None else None
+            if matches:
+                pairs.extend((pos, other) for other in matches)
+            elif kind == "left":
+                pairs.append((pos, None))
+        return pairs
+
+    table = {}
+    for pos, key in zip(left_positions, left_keys):
+        key = normalize(key)
+        if key is not None:
+            table.setdefault(key, []).append(pos)
+    matched = set()
+    for pos, key in zip(right_positions, right_keys):
+        matches = table.get(normalize(key)) if key is not None else None
+        if matches:
+            pairs.extend((other, pos) for other in matches)
+            matched.update(matches)
+    if kind == "left":
+        pairs.extend((pos, None) for pos in left_positions if pos not in matched)
+    pairs.sort(key=lambda pair: (pair[0], -1 if pair[1] is None else pair[1]))
+    return pairs
+
+
+def index_join(outer_positions, outer_keys, index, inner_accepts, kind):
+    """
+    Index nested loop: para cada row da esquerda, procura as da direita no índice (hash) da
+    coluna do join. inner_accepts(pos) aplica à row da direita os termos da condição dessa tabela.
+    Devolve (pares (esquerda, direita ou None), número de rows da direita verificadas).
+    """
+    pairs = []
+    checked = 0
+    for pos, key in zip(outer_positions, outer_keys):
+        found = index.hash.get(normalize(key), ()) if key is not None else ()
+        checked += len(found)
+        matches = sorted(other for other in found if inner_accepts(other))
+        if matches:
+            pairs.extend((pos, other) for other in matches)
+        elif kind == "left":
+            pairs.append((pos, None))
+    return pairs, checked
@@ -0,0 +1,109 @@
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+
+# Métricas do servidor (comando `stats`):
+# - latência por comando e por fase: parse (JSON do pedido), execute, serialize (JSON das
+#   respostas), send (escrita no socket), total
+# - rows analisadas vs devolvidas/afetadas em select/d/u
+# - bytes recebidos/enviados
+# - duração e tamanho de cada _save_db (snapshot)
+# - slow-query log: comandos acima de slow_ms ficam registados (e vão para o log como warning)
+
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PHASES = ("parse", "execute", "serialize", "send", "total")
+SLOW_LOG_SIZE = 100
+SLOW_DETAIL_CHARS = 200  # o pedido fica no slow-query log truncado a este tamanho
+
+
+class Histogram:
+    """Histograma de latências com buckets fixos (percentis aproximados pelo limite do bucket)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        target = q * self.count
+        seen = 0
+        for pos, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(BUCKETS_MS[pos], round(self.max, 4)) if pos < len(BUCKETS_MS) else round(self.max, 4)
+        return 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+                "p50_ms": self.percentile(0.5), "p99_ms": self.percentile(0.99),
+                "max_ms": round(self.max, 4)}
+
+
+class Metrics:
+    def __init__(self, slow_ms=100.0):
+        self.slow_ms = slow_ms
+        self.started = time.time()
+        self.commands = {}  # comando → {fase: Histogram, "rows_scanned": n, "rows_returned": n, "errors": n}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.saves = {"count": 0, "seconds": 0.0, "last_bytes": 0, "duration": Histogram()}
+        self.slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def record(self, cmd, phases, bytes_in=0, bytes_out=0, scanned=0, returned=0, error=False, detail=None):
+        """Regista um comando; phases: {fase: segundos}. Devolve True se foi lento."""
+        total_ms = phases.get("total", 0.0) * 1000
+        with self._lock:
+            entry = self.commands.get(cmd)
+            if entry is None:
+                entry = self.commands[cmd] = {"phases": {phase: Histogram() for phase in PHASES},
+                                              "rows_scanned": 0, "rows_returned": 0, "errors": 0}
+            for phase, seconds in phases.items():
+                entry["phases"][phase].add(seconds * 1000)
+            entry["rows_scanned"] += scanned
+            entry["rows_returned"] += returned
+            entry["errors"] += int(error)
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            slow = total_ms >= self.slow_ms
+            if slow:
+                self.slow.append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "cmd": cmd,
+                                  "request": str(detail)[:SLOW_DETAIL_CHARS] if detail else None,
+                                  "ms": round(total_ms, 3), "rows_scanned": scanned,
+                                  "rows_returned": returned})
+        return slow
+
+    def record_save(self, seconds, size):
+        with self._lock:
+            self.saves["count"] += 1
+            self.saves["seconds"] += seconds
+            self.saves["last_bytes"] = size
+            self.saves["duration"].add(seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "commands": {
+                    cmd: {"rows_scanned": entry["rows_scanned"], "rows_returned": entry["rows_returned"],
+                          "errors": entry["errors"],
+                          **{phase: hist.to_dict() for phase, hist in entry["phases"].items() if hist.count}}
+                    for cmd, entry in sorted(self.commands.items())
+                },
+                "saves": {"count": self.saves["count"], "seconds": round(self.saves["seconds"], 4),
+                          "last_bytes": self.saves["last_bytes"],
+                          "duration": self.saves["duration"].to_dict()},
+                "slow_ms": self.slow_ms,
+                "slow_queries": list(self.slow),
+            }
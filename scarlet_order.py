@@ -0,0 +1,147 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+# ORDER BY / LIMIT / OFFSET / keyset do select:
+#   select->*->preco>10->order:preco desc,id->limit:20->offset:40
+#   select->*->->order:preco desc,id->limit:20->after:[19.5,1203,87]   (página seguinte, sem offset)
+#
+# Com limit só as offset+limit melhores rows são mantidas (heap top-K), em vez de ordenar tudo.
+# Os empates mantêm a ordem de armazenamento, tanto em asc como em desc, por isso as páginas
+# são determinísticas. None fica no fim em asc e no início em desc (é o "maior" valor).
+# O cursor (after) são os valores das colunas de ordenação da última row da página anterior
+# seguidos da sua posição, que desempata: as rows com os mesmos valores que ficaram para a
+# página seguinte não são saltadas. Sem a posição (só os valores) o cursor salta os empates;
+# é o que acontece através do router, onde as posições de cada shard não servem.
+
+DIRECTIONS = ("asc", "desc")
+
+
+def parse_options(options):
+    """Valida {"order": [[col, dir], ...], "limit": n, "offset": n, "after": [...]}"""
+    options = options or {}
+    if not isinstance(options, dict):
+        raise ValueError("Opções do select inválidas.")
+    order = []
+    for item in options.get("order") or []:
+        if isinstance(item, str):
+            item = item.split()
+        col = item[0]
+        direction = str(item[1]).lower() if len(item) > 1 else "asc"
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Direção inválida em order: '{item[1]}' (asc ou desc).")
+        order.append((col, direction))
+
+    def count(name):
+        value = options.get(name)
+        if value is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name} tem de ser um inteiro >= 0.")
+        return value
+
+    limit, offset = count("limit"), count("offset") or 0
+    after = options.get("after")
+    if after is not None:
+        if not order:
+            raise ValueError("after (paginação por cursor) requer order.")
+        if not isinstance(after, list) or len(after) not in (len(order), len(order) + 1):
+            raise ValueError(f"after tem de ter um valor por coluna de order ({len(order)}) e a posição.")
+        if len(after) > len(order) and (isinstance(after[-1], bool) or not isinstance(after[-1], int)):
+            raise ValueError("A posição no fim de after tem de ser um inteiro.")
+    return order, limit, offset, after
+
+
+def sort_key(value):
+    """Valores de tipos diferentes comparáveis: números < strings < outros < None"""
+    if value is None:
+        return (1,)
+    if isinstance(value, (int, float)):
+        return (0, 0, value)
+    if isinstance(value, str):
+        return (0, 1, value)
+    return (0, 2, str(value))
+
+
+class _Desc:
+    """Inverte a comparação de uma componente (ordenação mista asc/desc)"""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def make_key(order):
+    """
+    Devolve (key, reverse): key(valores) → chave comparável.
+    Com direções iguais usa tuplos simples (e reverse em desc); com mistura, _Desc nas desc.
+    """
+    directions = {direction for _, direction in order}
+    if len(directions) == 1:
+        return (lambda values: tuple(map(sort_key, values))), directions == {"desc"}
+    flags = [direction == "desc" for _, direction in order]
+    return (lambda values: tuple(_Desc(sort_key(v)) if desc else sort_key(v)
+                                 for v, desc in zip(values, flags))), False
+
+
+def split_cursor(order, after):
+    """(valores, posição) do cursor; a posição é None num cursor só com os valores"""
+    if after is None or len(after) == len(order):
+        return after, None
+    return after[:len(order)], after[-1]
+
+
+def order_positions(entries, order, limit, offset, after):
+    """
+    Ordena entries — (posição, valores das colunas de order), por ordem de armazenamento —
+    e aplica after/offset/limit. entries pode ser um gerador: com limit só as offset+limit
+    melhores ficam em memória (heap).
+    """
+    key, reverse = make_key(order)
+    keyed = ((key(values), pos) for pos, values in entries)
+    if after is not None:
+        values, tie = split_cursor(order, after)
+        cursor = key(values)
+        keyed = ((k, pos) for k, pos in keyed
+                 if (k < cursor if reverse else cursor < k) or (tie is not None and pos > tie and k == cursor))
+    if limit is None:
+        picked = sorted(keyed, key=itemgetter(0), reverse=reverse)
+    else:
+        # nsmallest/nlargest são estáveis, como sorted(...)[:n]
+        top = heapq.nlargest if reverse else heapq.nsmallest
+        picked = top(offset + limit, keyed, key=itemgetter(0))
+    return [pos for _, pos in picked[offset:]]
+
+
+def index_positions(index, descending, after=None, tie=None):
+    """
+    Posições pela ordem do índice ordenado, a partir do cursor (exclusive; tie é a posição
+    da row do cursor). O índice está ordenado por (valor, posição): os empates seguem a
+    ordem de armazenamento, em asc e em desc, como no heap.
+    """
+    keys, positions = index.keys, index.positions
+    if not descending:
+        if after is None:
+            start = 0
+        elif tie is None:
+            start = bisect_right(keys, after)
+        else:
+            start = bisect_right(positions, tie, bisect_left(keys, after), bisect_right(keys, after))
+        for i in range(start, len(positions)):
+            yield positions[i]
+        return
+    end = len(keys) if after is None else bisect_left(keys, after)
+    if after is not None and tie is not None:
+        # o resto dos empates com a row do cursor
+        ties = bisect_right(keys, after)
+        yield from positions[bisect_right(positions, tie, end, ties):ties]
+    while end > 0:
+        start = bisect_left(keys, keys[end - 1], 0, end)
+        yield from positions[start:end]
+        end = start
@@ -0,0 +1,88 @@
+import os
+import multiprocessing
+from scarlet_aggregate import aggregate_states, merge_states, finish
+
+# Scan em paralelo (vários processos) para tabelas grandes em armazenamento por rows.
+# O filtro row a row corre em Python puro e ocupa um só core; acima de PARALLEL_MIN_ROWS
+# as rows são divididas em partições avaliadas por um pool de processos.
+#
+# Desligado por omissão: liga-se com SCARLET_WORKERS=n (n > 1) e o servidor cria o pool uma
+# única vez no arranque (start), antes das threads dos clientes. Os processos do pool vêm de
+# um forkserver (ou spawn), nunca de um fork do servidor já com threads. Cada partição segue
+# para o pool serializada (as rows e a condição, que é recompilada no processo); de volta vêm
+# só as posições (ou os estados parciais de uma agregação). A serialização é feita com o lock
+# de leitura da base de dados, portanto as partições formam uma cópia consistente.
+#
+# Quando compensa: serializar as partições (e desserializá-las em cada processo) custa tempo
+# do mesmo tamanho que o próprio filtro. Numa medição com 200k rows e uma condição de três
+# termos, só o pickle das partições levou cerca de metade do filtro num só processo. O pool só
+# ganha com cores livres (3 ou mais por pedido) e condições ou agregações pesadas, e nunca em
+# máquinas com um só core. Antes de ligar, medir no próprio hardware:
+#   python scarlet_bench.py --rows 500000 --mode parallel --workers 4
+# (filter_speedup/aggregate_speedup > 1 → compensa; pickle_partitions mostra o custo da cópia)
+#
+# Tabelas colunares não passam por aqui: as máscaras já são vetorizadas (array/numpy).
+
+PARALLEL_MIN_ROWS = int(os.environ.get("SCARLET_PARALLEL_ROWS", "200000"))
+WORKERS = int(os.environ.get("SCARLET_WORKERS", "1")) or 1
+
+_pool = None
+
+
+def start(workers=WORKERS):
+    """Cria o pool (uma vez, no arranque do processo); com workers <= 1 fica desligado"""
+    global _pool
+    if _pool is None and workers > 1:
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        _pool = multiprocessing.get_context(method).Pool(workers)
+    return _pool is not None
+
+
+def stop():
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
+
+
+def available():
+    return _pool is not None
+
+
+def _partitions(rows, workers, *extra):
+    # mais partições do que processos: uma partição lenta não atrasa o resto
+    n = len(rows)
+    parts = min(n, workers * 4) or 1
+    step = -(-n // parts)
+    return [(start, rows[start:start + step]) + extra for start in range(0, n, step)]
+
+
+def _filter_part(task):
+    start, rows, predicate = task
+    return [start + pos for pos, row in enumerate(rows) if predicate(row)]
+
+
+def parallel_filter(rows, predicate, workers=WORKERS):
+    """Posições (ordenadas) das rows que satisfazem o predicado, avaliadas em `workers` processos"""
+    parts = _pool.map(_filter_part, _partitions(rows, workers, predicate))
+    return [pos for part in parts for pos in part]
+
+
+def _aggregate_part(task):
+    _, rows, predicate, functions, group_by = task
+    matched = [row for row in rows if predicate(row)]
+    return len(matched), aggregate_states(matched, functions, group_by)
+
+
+def parallel_aggregate(rows, predicate, functions, group_by, workers=WORKERS):
+    """
+    Filtra e agrega cada partição num processo e junta os estados parciais.
+    Devolve (resultado, número de rows que satisfazem o predicado).
+    """
+    parts = _pool.map(_aggregate_part, _partitions(rows, workers, predicate, functions, group_by))
+    groups = {}
+    for _, part in parts:
+        merge_states(groups, part, functions)
+    return finish(groups, functions, group_by), sum(matched for matched, _ in parts)
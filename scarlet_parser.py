@@ -1,4 +1,5 @@
 import re
+import json
 
 def parse_value(val):
     """Converte strings em tipos Python sempre que possível"""
@@ -49,8 +50,12 @@ def parse_list(s):
 def parse_values(s):
     return [parse_value(v) for v in s.split(",")]
 
+def parse_rows(s):
+    """Converte '1,'Alice',23;2,'Bob',30' numa lista de rows"""
+    return [parse_values(row) for row in s.split(";") if row.strip()]
+
 def parse_columns_with_type(s):
-    """Converte 'id:int,name:string,file:file' em (colunas, tipos)"""
+    """Converte 'id:int:pk,name:string,file:file' em (colunas, tipos); o tipo fica com ':pk'"""
     cols = []
     types = []
     for item in s.split(","):
@@ -63,19 +68,52 @@ def parse_columns_with_type(s):
             types.append("string")  # default
     return cols, types
 
+def parse_select_options(parts):
+    """Converte ['order:preco desc,id', 'limit:10', 'offset:20', 'after:[9.5,3]'] nas opções do select"""
+    options = {}
+    for part in parts:
+        name, _, value = part.partition(":")
+        name, value = name.strip().lower(), value.strip()
+        if name == "order":
+            options["order"] = [item.split() for item in value.split(",") if item.strip()]
+        elif name in ("limit", "offset"):
+            options[name] = parse_value(value)
+        elif name == "after":
+            try:
+                options["after"] = json.loads(value)  # after:[19.5,"Ana"]
+            except ValueError:
+                options["after"] = parse_values(value)  # after:19.5,'Ana'
+            if not isinstance(options["after"], list):
+                options["after"] = [options["after"]]
+    return options
+
 # Definição da gramática
 COMMANDS = {
     "wd":   {"args": ["string"]},             # wd->DBNAME
     "sd":   {"args": ["string"]},             # sd->DBNAME
-    "wt":   {"args": ["string", "list"]},     # wt->TABLE->col1:type1,col2:type2
+    "wt":   {"args": ["string", "list"]},     # wt->TABLE->id:int:pk,col2:type2(->columnar)
     "st":   {"args": ["string"]},             # st->TABLE
     "i":    {"args": ["values"]},             # i->1,'Alice',23
+    "ib":   {"args": ["rows"]},               # ib->1,'Alice',23;2,'Bob',30
     "u":    {"args": ["dict", "dict"]},       # u->id:2->idade:26
-    "d":    {"args": ["dict"]},               # d->id:2
+    "d":    {"args": ["dict"]},               # d->id:2  ou  d->id=2&idade>18
     "dt":   {"args": ["string"]},             # dt->TABLE
+    "ci":   {"args": ["string"]},             # ci->COLUNA (criar índice)
     "dd":   {"args": ["string"]},             # dd->DB
     "show": {"args": []},                     # show
-    "select": {"args": ["list", "dict?"]},    # select->col1,col2->condições (opcional)
+    "cache": {"args": []},                    # cache (estatísticas da cache de resultados)
+    "stats": {"args": []},                    # stats (métricas do servidor e slow queries)
+    "repl": {"args": []},                     # repl (estado da replicação: líder ou réplica)
+    "shards": {"args": []},                   # shards (router: lista das shards)
+    "addshard": {"args": ["string"]},         # addshard->host:porta (router: junta uma shard e rebalanceia)
+    "begin": {"args": []},                    # begin (inicia uma transação na sessão)
+    "commit": {"args": []},                   # commit
+    "rollback": {"args": []},                 # rollback
+    "select": {"args": ["list", "dict?"]},    # select->col1,col2->condições->order:c desc->limit:n->offset:n->after:[...]
+    "join": {"args": ["custom"]},             # join->inner|left->T1.col=T2.col->T1.a,T2.b->condições
+    "agg":  {"args": ["custom"]},             # agg->count,sum:preco->grupo1,grupo2->condições
+    "upload": {"args": ["string"]},          # upload->/caminho/local (envia o ficheiro para o servidor)
+    "download": {"args": ["string", "string"]},  # download->files/ab/ab12...->/caminho/destino
     "e": {"args": ["custom"]}
 }
 
@@ -121,6 +159,21 @@ def parse_input(user_input: str):
 
         return cmd, []
 
+    if cmd == "join":
+        kind = parts[1].strip() if len(parts) > 1 and parts[1].strip() else "inner"
+        on = parts[2].strip() if len(parts) > 2 else ""
+        cols = parse_list(parts[3]) if len(parts) > 3 and parts[3].strip() else ["*"]
+        cond_token = parts[4].strip() if len(parts) > 4 else ""
+        conds = parse_dict(cond_token) if ":" in cond_token else cond_token
+        return cmd, [kind, on, cols, conds]
+
+    if cmd == "agg":
+        funcs = parse_list(parts[1]) if len(parts) > 1 and parts[1].strip() else []
+        group_by = parse_list(parts[2]) if len(parts) > 2 and parts[2].strip() else []
+        cond_token = parts[3].strip() if len(parts) > 3 else ""
+        conds = parse_dict(cond_token) if ":" in cond_token else cond_token
+        return cmd, [funcs, group_by, conds]
+
     for i, typ in enumerate(expected):
         if cmd == "wt":
             # colunas com tipo
@@ -128,6 +181,9 @@ def parse_input(user_input: str):
                 return cmd, []
             table_name = parts[1].strip()
             cols, types = parse_columns_with_type(parts[2])
+            if len(parts) > 3 and parts[3].strip():
+                # armazenamento opcional: wt->T->cols->columnar
+                return cmd, [table_name, cols, types, parts[3].strip()]
             return cmd, [table_name, cols, types]
         elif typ == "string":
             args.append(parts[i+1].strip())
@@ -137,6 +193,8 @@ def parse_input(user_input: str):
             args.append(parse_dict(parts[i+1]))
         elif typ == "values":
             args.extend(parse_values(parts[i+1]))
+        elif typ == "rows":
+            args.extend(parse_rows(parts[i+1]))
         elif typ == "dict?":
             if len(parts) > i+1:
                 args.append(parse_dict(parts[i+1]))
@@ -155,14 +213,21 @@ def parse_input(user_input: str):
         if len(parts) > 2 and parts[2].strip():
             cond_token = parts[2].strip()
             if ":" in cond_token:
-                return cmd, [cols, parse_dict(cond_token)]   # modo antigo (dict)
+                conds = parse_dict(cond_token)   # modo antigo (dict)
             else:
-                return cmd, [cols, cond_token]               # modo novo (string)
+                conds = cond_token               # modo novo (string)
         else:
-            return cmd, [cols, {}]                           # sem condições
+            conds = {}                           # sem condições
+
+        # a seguir à condição (que pode ficar vazia): order, limit, offset, after
+        options = parse_select_options(parts[3:])
+        return cmd, [cols, conds, options] if options else [cols, conds]
 
-    # mapear comando del → del_ (interno)
+    # d aceita o modo antigo (dict "id:2") e o novo (string "idade>18&nome='Ana'")
     if cmd == "d":
-        return "d", args
+        cond_token = parts[1].strip() if len(parts) > 1 else ""
+        if ":" in cond_token:
+            return cmd, [parse_dict(cond_token)]
+        return cmd, [cond_token]
 
     return cmd, args
@@ -0,0 +1,118 @@
+import json
+import struct
+
+# Cada mensagem é um frame: 4 bytes (tamanho, big-endian) + JSON em UTF-8
+PROTOCOL_VERSION = 1
+MIN_PROTOCOL_VERSION = 1
+HEADER = struct.Struct("!I")
+MAX_FRAME = 64 * 1024 * 1024  # protege contra tamanhos absurdos / lixo na ligação
+CHUNK_ROWS = 500              # rows por frame quando um resultado é enviado em stream
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(obj):
+    payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def send_frame(sock, obj):
+    sock.sendall(encode_frame(obj))
+
+
+def recv_exact(sock, n):
+    """Lê exatamente n bytes; devolve None se a ligação fechar antes do primeiro byte"""
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 65536))
+        if not chunk:
+            if not buf:
+                return None
+            raise ProtocolError("Ligação fechada a meio de um frame.")
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_payload(sock):
+    """Lê os bytes de um frame (sem descodificar); None quando o outro lado fecha a ligação"""
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ProtocolError(f"Frame demasiado grande ({size} bytes).")
+    payload = recv_exact(sock, size) if size else b""
+    if payload is None:
+        raise ProtocolError("Ligação fechada a meio de um frame.")
+    return payload
+
+
+def decode_frame(payload):
+    return json.loads(payload.decode("utf-8"))
+
+
+def recv_frame(sock):
+    """Lê um frame; devolve None quando o outro lado fecha a ligação"""
+    payload = recv_payload(sock)
+    return None if payload is None else decode_frame(payload)
+
+
+def hello(sock):
+    """Negocia a versão do protocolo (primeiro frame de cada ligação)"""
+    send_frame(sock, {"cmd": "hello", "args": [PROTOCOL_VERSION]})
+    response = recv_frame(sock)
+    if response is None or response.get("status") != "ok":
+        raise ProtocolError(response["msg"] if response else "Servidor fechou a ligação.")
+    return response["version"]
+
+
+def negotiate(requested):
+    """Lado do servidor: escolhe a versão a usar ou devolve None se não for suportada"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return None
+    if requested < MIN_PROTOCOL_VERSION:
+        return None
+    return min(requested, PROTOCOL_VERSION)
+
+
+def iter_stream(sock, first, end=None):
+    """
+    Percorre as rows de uma resposta em stream, a partir do frame de cabeçalho:
+    {"status": "ok", "stream": true} → {"rows": [...]}* → {"end": true, "count": n}
+    Se end for um dict, fica com o frame final (count e, num select ordenado, cursor).
+    """
+    if not first.get("stream"):
+        raise ProtocolError("A resposta não é um stream.")
+    while True:
+        frame = recv_frame(sock)
+        if frame is None:
+            raise ProtocolError("Ligação fechada a meio de um stream.")
+        if frame.get("status") == "error":
+            raise ProtocolError(frame["msg"])
+        if frame.get("end"):
+            if end is not None:
+                end.update(frame)
+            return
+        yield from frame["rows"]
+
+
+def read_response(sock):
+    """Lê uma resposta completa; um stream é juntado numa lista em "msg" """
+    first = recv_frame(sock)
+    if first is None:
+        raise ProtocolError("Servidor fechou a ligação.")
+    if not first.get("stream"):
+        return first
+    end = {}
+    try:
+        rows = list(iter_stream(sock, first, end))
+    except ProtocolError as e:
+        return {"status": "error", "msg": str(e)}
+    response = {"status": "ok", "msg": rows}
+    if "cursor" in end:
+        response["cursor"] = end["cursor"]
+    return response
@@ -0,0 +1,180 @@
+import re
+from functools import lru_cache
+
+# Condições aceites (select, d e u usam todas esta mesma compilação):
+# - dict do parser: {"idade": {"op": ">", "val": 18}, "nome": {"op": "=", "val": "Ana"}}  (AND)
+# - string:         "idade>18&nome='Ana' || preco>=10"  (|| por fora, & por dentro)
+#   (no join as colunas podem ter o nome da tabela: "Users.idade>18")
+#
+# Semântica da comparação:
+# - o literal é convertido uma única vez (remove aspas, int/float quando possível)
+# - valores None (colunas novas, valores em falta) nunca satisfazem a condição
+# - se o literal é numérico e o valor da row é uma string numérica, compara como número
+# - comparações entre tipos incompatíveis (ex: 'a' < 3) são falsas
+# - "===" (só no dict): igualdade exata, sem conversão do literal ("7" não apanha "007" nem 7)
+
+SIMPLE_CONDITION = re.compile(r'\s*([A-Za-z_][\w.]*)\s*(==|=|!=|<=|>=|<|>)\s*(.+?)\s*$')
+OPS = ("=", "==", "===", "!=", "<", ">", "<=", ">=")
+
+
+def to_literal(value):
+    """Converte o literal da condição: remove aspas e tenta int/float"""
+    if not isinstance(value, str):
+        return value
+    txt = value.strip()
+    if len(txt) >= 2 and ((txt[0] == txt[-1] == "'") or (txt[0] == txt[-1] == '"')):
+        txt = txt[1:-1]
+    try:
+        return int(txt)
+    except ValueError:
+        try:
+            return float(txt)
+        except ValueError:
+            return txt
+
+
+def _number(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def comparator(op, literal):
+    """Função valor → bool para `valor op literal`, com o literal já convertido"""
+    if op == "===":
+        return lambda value: type(value) is type(literal) and value == literal
+
+    numeric = isinstance(literal, (int, float)) and not isinstance(literal, bool)
+
+    if op in ("=", "=="):
+        test = lambda v: v == literal
+    elif op == "!=":
+        test = lambda v: v != literal
+    elif op == "<":
+        test = lambda v: v < literal
+    elif op == ">":
+        test = lambda v: v > literal
+    elif op == "<=":
+        test = lambda v: v <= literal
+    else:
+        test = lambda v: v >= literal
+
+    def compare(value):
+        if value is None:
+            return False
+        if numeric and isinstance(value, str):
+            value = _number(value)
+        try:
+            result = test(value)
+        except TypeError:
+            return False
+        return result is True
+    return compare
+
+
+class Predicate:
+    """
+    Condição compilada: chamar com uma row devolve True/False.
+    - tree:      AST ("and"|"or", [filhos]) ou ("cmp", coluna, op, literal)
+    - conjuncts: [(coluna, op, literal)] quando a condição é só uma conjunção
+                 (é o que o planeador de índices consegue usar), senão []
+    - valid:     False se alguma parte da condição não foi reconhecida
+    """
+
+    def __init__(self, tree, valid=True):
+        self.tree = tree
+        self.valid = valid
+        self.conjuncts = _conjuncts(tree)
+        self._fn = _build(tree)
+
+    def __call__(self, row):
+        return self._fn(row)
+
+    def __reduce__(self):
+        # a função compilada não é serializável: o scan paralelo recompila a partir da árvore
+        return Predicate, (self.tree, self.valid)
+
+
+def _conjuncts(tree):
+    if tree is None:
+        return []
+    if tree[0] == "cmp":
+        return [tree[1:]]
+    if tree[0] == "and" and all(child[0] == "cmp" for child in tree[1]):
+        return [child[1:] for child in tree[1]]
+    return []
+
+
+def _build(tree):
+    if tree is None:
+        return lambda row: True
+    kind = tree[0]
+    if kind == "cmp":
+        _, col, op, literal = tree
+        compare = comparator(op, literal)
+        return lambda row: compare(row.get(col))
+    if kind == "false":
+        return lambda row: False
+
+    children = [_build(child) for child in tree[1]]
+    if len(children) == 1:
+        return children[0]
+    if kind == "and":
+        return lambda row: all(fn(row) for fn in children)
+    return lambda row: any(fn(row) for fn in children)
+
+
+@lru_cache(maxsize=512)
+def _compile_text(text):
+    valid = True
+    alternatives = []
+    for alternative in text.split("||"):
+        terms = []
+        for part in alternative.split("&"):
+            m = SIMPLE_CONDITION.match(part)
+            if not m:
+                valid = False
+                terms.append(("false",))
+                continue
+            col, op, raw = m.groups()
+            terms.append(("cmp", col, "=" if op == "==" else op, to_literal(raw)))
+        alternatives.append(("and", terms) if len(terms) > 1 else terms[0])
+    tree = ("or", alternatives) if len(alternatives) > 1 else alternatives[0]
+    return Predicate(tree, valid)
+
+
+@lru_cache(maxsize=512)
+def _compile_items(items):
+    terms = [("cmp", col, "=" if op == "==" else op, val if op == "===" else to_literal(val))
+             for col, op, val in items]
+    valid = all(op in OPS for _, op, _ in items)
+    if not terms:
+        return Predicate(None)
+    return Predicate(("and", terms) if len(terms) > 1 else terms[0], valid)
+
+
+def compile_condition(cond):
+    """
+    Compila uma condição (dict do parser, string, ou vazia) num Predicate.
+    O resultado fica numa cache LRU, indexada pelo texto/itens da condição.
+    """
+    if isinstance(cond, str):
+        text = cond.strip()
+        return _compile_text(text) if text else _compile_items(())
+
+    items = []
+    for col, c in (cond or {}).items():
+        if isinstance(c, dict):
+            items.append((col, c.get("op", "="), c.get("val")))
+        else:
+            items.append((col, "=", c))  # {coluna: valor} é igualdade
+    items = tuple(items)
+    try:
+        return _compile_items(items)
+    except TypeError:
+        # literal não hashable: compila sem passar pela cache
+        return _compile_items.__wrapped__(items)
@@ -0,0 +1,224 @@
+import os
+import uuid
+import time
+import shutil
+import socket
+import logging
+import threading
+import scarletdb
+from collections import deque
+from itertools import islice
+from scarlet_protocol import send_frame, recv_frame, ProtocolError
+from scarlet_transfer import _recv_into_file
+from scarlet_snapshot import TABLES_DIR
+
+log = logging.getLogger("scarletdb.replication")
+
+# Replicação líder → réplicas (só de leitura), assíncrona:
+#
+# - no líder, cada mutação confirmada (o mesmo registo que vai para o log: insert, update,
+#   delete, create_table, ..., batch de uma transação) e a criação/remoção de bases de dados
+#   recebem um número de sequência e ficam num buffer circular em memória (ReplicationHub)
+# - a réplica liga-se à porta de replicação e envia {"cmd": "follow", "args": [líder, seq]}
+# - se o líder ainda tiver no buffer tudo o que vem depois de seq, envia só isso; senão
+#   (réplica nova, líder reiniciado, réplica demasiado atrasada) envia primeiro uma cópia:
+#   {"snapshot": true, "leader": id, "seq": n, "files": [[caminho, tamanho], ...]} + bytes
+#   com os snapshots (diretório e blocos das tabelas) e logs de todas as bases de dados,
+#   tal como estão no disco no número n
+# - depois: {"records": [[seq, db, registo], ...]} à medida que há commits, ou {"ping": seq}
+#   a cada HEARTBEAT_SECONDS sem escritas
+#
+# O disco do líder só tem mutações confirmadas (as transações só escrevem no commit e os
+# checkpoints não correm com transações abertas), por isso a cópia nunca leva dados por
+# confirmar. Os ficheiros das colunas `file` não são replicados: ficam no líder.
+
+REPL_BUFFER = 100_000        # registos guardados no líder para réplicas que voltam a ligar
+HEARTBEAT_SECONDS = 5
+RECONNECT_SECONDS = 1
+FRAME_RECORDS = 1000         # registos por frame
+
+
+class ReplicationHub:
+    """Lado do líder: numera as mutações e serve-as às réplicas"""
+
+    def __init__(self, db, buffer_size=REPL_BUFFER):
+        self.db = db
+        self.leader_id = uuid.uuid4().hex
+        self.seq = 0
+        self._entries = deque(maxlen=buffer_size)  # (seq, db, registo)
+        self._cond = threading.Condition()
+        self.followers = {}  # endereço → último seq enviado
+
+    def publish(self, db_name, record):
+        """Chamado com o lock de escrita da base de dados: a ordem dos seq é a ordem dos commits"""
+        with self._cond:
+            self.seq += 1
+            self._entries.append((self.seq, db_name, record))
+            self._cond.notify_all()
+
+    def _since(self, seq):
+        """Registos depois de seq, ou None se já saíram do buffer"""
+        with self._cond:
+            if seq == self.seq:
+                return []
+            if not self._entries or self._entries[0][0] > seq + 1 or seq > self.seq:
+                return None
+            return list(islice(self._entries, seq + 1 - self._entries[0][0], None))
+
+    def serve(self, host, port):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((host, port))
+            s.listen()
+            log.info("Replicação à escuta em %s:%s.", host, port)
+            while True:
+                conn, addr = s.accept()
+                threading.Thread(target=self._serve_follower, args=(conn, addr), daemon=True).start()
+
+    def _serve_follower(self, conn, addr):
+        key = f"{addr[0]}:{addr[1]}"
+        with conn:
+            try:
+                request = recv_frame(conn)
+                if not request or request.get("cmd") != "follow":
+                    send_frame(conn, {"status": "error", "msg": "Esperado: follow."})
+                    return
+                leader_id, seq = (list(request.get("args") or []) + [None, None])[:2]
+                log.info("Réplica ligada: %s (seq %s).", key, seq)
+                entries = self._since(seq) if leader_id == self.leader_id and isinstance(seq, int) else None
+                while True:
+                    if entries is None:
+                        seq = self._send_copy(conn)
+                    elif entries:
+                        for start in range(0, len(entries), FRAME_RECORDS):
+                            send_frame(conn, {"records": [list(e) for e in entries[start:start + FRAME_RECORDS]]})
+                        seq = entries[-1][0]
+                    else:
+                        send_frame(conn, {"ping": seq})
+                    self.followers[key] = seq
+                    with self._cond:
+                        self._cond.wait_for(lambda: self.seq > seq, timeout=HEARTBEAT_SECONDS)
+                    entries = self._since(seq)
+            except (OSError, ProtocolError) as e:
+                log.info("Réplica desligada: %s (%s).", key, e)
+            finally:
+                self.followers.pop(key, None)
+
+    def _send_copy(self, conn):
+        """Envia os snapshots e logs de todas as bases de dados; devolve o seq a que correspondem"""
+        db = self.db
+        files = []
+        with db.lock.write():
+            # sem escritas nem checkpoints a meio: o disco corresponde exatamente a self.seq
+            seq = self.seq
+            for name in list(db.databases):
+                for path in (db._db_path(name), db._json_path(name)):
+                    if os.path.isfile(path):
+                        # o ficheiro aberto continua legível mesmo se um checkpoint o substituir
+                        files.append((path, open(path, "rb"), None))
+                folder = os.path.join(os.path.dirname(db._db_path(name)), TABLES_DIR)
+                if os.path.isdir(folder):
+                    for block in sorted(os.listdir(folder)):
+                        files.append((os.path.join(folder, block), open(os.path.join(folder, block), "rb"), None))
+                path = db._log_path(name)
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        files.append((path, None, f.read()))  # o log é truncado nos checkpoints
+        try:
+            listing = []
+            for path, f, data in files:
+                size = os.fstat(f.fileno()).st_size if f else len(data)
+                listing.append([os.path.relpath(path, scarletdb.DATA_DIR).replace(os.sep, "/"), size])
+            send_frame(conn, {"snapshot": True, "leader": self.leader_id, "seq": seq, "files": listing})
+            for (path, f, data), (_, size) in zip(files, listing):
+                if f:
+                    if size:
+                        conn.sendfile(f, 0, size)
+                else:
+                    conn.sendall(data)
+        finally:
+            for _, f, _ in files:
+                if f:
+                    f.close()
+        log.info("Cópia enviada a uma réplica (seq %d, %d ficheiro(s)).", seq, len(files))
+        return seq
+
+    def status(self):
+        return {"role": "leader", "leader": self.leader_id, "seq": self.seq,
+                "buffered": len(self._entries), "followers": dict(self.followers)}
+
+
+class Follower:
+    """Lado da réplica: segue o líder e aplica as mutações pela mesma ordem"""
+
+    def __init__(self, db, host, port):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.leader_id = None
+        self.seq = None  # None → pede uma cópia completa
+        self.connected = False
+        self.last_contact = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self, db_name, record):
+        pass  # numa réplica as mutações vêm do líder; não há nada a reenviar
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._follow()
+            except (OSError, ProtocolError, ValueError) as e:
+                if self.connected:
+                    log.warning("Ligação ao líder perdida: %s", e)
+            self.connected = False
+            self._stop.wait(RECONNECT_SECONDS)
+
+    def _follow(self):
+        with socket.create_connection((self.host, self.port), timeout=HEARTBEAT_SECONDS * 3) as sock:
+            send_frame(sock, {"cmd": "follow", "args": [self.leader_id, self.seq]})
+            self.connected = True
+            while not self._stop.is_set():
+                frame = recv_frame(sock)
+                if frame is None:
+                    raise ProtocolError("O líder fechou a ligação.")
+                self.last_contact = time.time()
+                if frame.get("status") == "error":
+                    raise ProtocolError(frame["msg"])
+                if frame.get("snapshot"):
+                    self._load_copy(sock, frame)
+                elif "records" in frame:
+                    with self.db.lock.write():
+                        for seq, db_name, record in frame["records"]:
+                            self.db.replicate(db_name, record)
+                            self.seq = seq
+
+    def _load_copy(self, sock, frame):
+        # recebe para uma pasta ao lado e só troca no fim (as leituras continuam entretanto)
+        incoming = scarletdb.DATA_DIR.rstrip("/\\") + ".incoming"
+        shutil.rmtree(incoming, ignore_errors=True)
+        os.makedirs(incoming)
+        for rel, size in frame["files"]:
+            path = os.path.abspath(os.path.join(incoming, rel))
+            if not path.startswith(os.path.abspath(incoming) + os.sep):
+                raise ProtocolError(f"Caminho inválido na cópia: '{rel}'.")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                _recv_into_file(sock, f, size)
+        with self.db.lock.write():
+            self.db.load_copy(incoming)
+            self.leader_id, self.seq = frame["leader"], frame["seq"]
+        shutil.rmtree(incoming, ignore_errors=True)
+        log.info("Cópia do líder carregada (seq %d).", self.seq)
+
+    def status(self):
+        return {"role": "follower", "leader": f"{self.host}:{self.port}", "connected": self.connected,
+                "seq": self.seq, "last_contact": self.last_contact}
@@ -0,0 +1,645 @@
+import os
+import re
+import json
+import heapq
+import bisect
+import socket
+import hashlib
+import logging
+import threading
+from itertools import islice, chain
+from concurrent.futures import ThreadPoolExecutor
+from scarletdb import RWLock
+from scarlet_client import ScarletClient
+from scarlet_query import compile_condition
+from scarlet_order import parse_options, make_key
+from scarlet_aggregate import parse_functions, label
+from scarlet_join import parse_on
+from scarlet_protocol import (send_frame, recv_payload, decode_frame, negotiate,
+                              ProtocolError, PROTOCOL_VERSION, CHUNK_ROWS)
+
+log = logging.getLogger("scarletdb.router")
+
+# Router: fala o mesmo protocolo que o scarlet_server e reparte as rows de cada tabela por
+# várias instâncias (shards), pela chave de partição da tabela (a chave primária, se houver,
+# senão a primeira coluna):
+#
+#   SCARLET_SHARDS=127.0.0.1:65441,127.0.0.1:65442 python scarlet_router.py
+#
+# - i / ib: cada row vai para a shard dona da sua chave (hashing consistente, com nós virtuais)
+# - d / u / e / select com "chave = valor" vão só para essa shard; os restantes vão para todas
+# - select: as shards respondem em stream e o router junta-as (merge ordenado com order,
+#   limit/offset aplicados no fim); agg: cada shard agrega e o router junta os parciais
+#   (avg é pedido às shards como sum + count)
+# - wd/wt/ci/e->ac/dt/dd: enviados a todas as shards
+# - addshard->host:porta: junta uma shard e move para ela as rows que passam a ser suas
+#   (só essas: é a vantagem do hashing consistente); o router fica parado durante a mudança
+#
+# O router guarda em SCARLET_ROUTER_CONFIG as shards e o esquema de cada tabela.
+# Sem transações, uploads nem joins entre tabelas que não estejam particionadas pelas
+# colunas do join (e a chave de partição de uma row não pode ser alterada).
+
+HOST = "0.0.0.0"
+PORT = int(os.environ.get("SCARLET_ROUTER_PORT", "65430"))
+SHARDS = os.environ.get("SCARLET_SHARDS", "")
+CONFIG = os.environ.get("SCARLET_ROUTER_CONFIG", "scarlet_router.json")
+LOG_LEVEL = os.environ.get("SCARLET_LOG_LEVEL", "INFO")
+VNODES = 64        # pontos de cada shard no anel (distribuição mais uniforme)
+MOVE_BATCH = 1000  # rows por lote ao rebalancear
+MAX_CLIENTS = int(os.environ.get("SCARLET_MAX_CLIENTS", "1024"))  # ligações abertas (uma thread cada)
+COUNT = re.compile(r"^(\d+) linha")
+UNSUPPORTED = {"begin", "commit", "rollback", "upload", "download"}
+SCHEMA_COMMANDS = {"wd", "dd", "wt", "dt", "ci"}  # alteram router.meta (com e->ac): lock de escrita
+
+_fanout = ThreadPoolExecutor(max_workers=32)  # pedidos em paralelo às várias shards
+
+
+def key_hash(value):
+    return int.from_bytes(hashlib.md5(repr(value).encode("utf-8")).digest()[:8], "big")
+
+
+def routing_key(value, typ):
+    """A chave como a shard a vai guardar (a mesma conversão do i): "5" e 5 vão para o mesmo sítio"""
+    if value is None:
+        return None
+    try:
+        if typ == "int":
+            return int(value)
+        if typ == "float":
+            return float(str(value).replace(",", "."))
+    except ValueError:
+        pass
+    return str(value)
+
+
+class HashRing:
+    """Hashing consistente: cada shard ocupa VNODES pontos; uma chave pertence ao ponto seguinte"""
+
+    def __init__(self, shards=(), vnodes=VNODES):
+        self.vnodes = vnodes
+        self.shards = []
+        self._points = []
+        self._owners = []
+        for shard in shards:
+            self.add(shard)
+
+    def add(self, shard):
+        self.shards.append(shard)
+        points = list(zip(self._points, self._owners))
+        points += [(key_hash(f"{shard}#{i}"), shard) for i in range(self.vnodes)]
+        points.sort()
+        self._points = [p for p, _ in points]
+        self._owners = [o for _, o in points]
+
+    def owner(self, key):
+        return self._owners[bisect.bisect(self._points, key_hash(key)) % len(self._points)]
+
+
+def _client(shard):
+    host, _, port = shard.rpartition(":")
+    return ScarletClient(host or "127.0.0.1", int(port), pool_size=1)
+
+
+def _ok(response):
+    if response.get("status") != "ok":
+        raise ValueError(response.get("msg"))
+    return response["msg"]
+
+
+class Router:
+    """Shards, anel e esquema das tabelas (partilhado por todas as ligações)"""
+
+    def __init__(self, shards=(), config=CONFIG):
+        self.config = config
+        self.lock = RWLock()  # comandos: leitura; addshard e alterações de esquema: escrita
+        self.meta = {"shards": [], "databases": {}}
+        if config and os.path.isfile(config):
+            with open(config, encoding="utf-8") as f:
+                self.meta = json.load(f)
+        for shard in shards:
+            if shard not in self.meta["shards"]:
+                self.meta["shards"].append(shard)
+        if not self.meta["shards"]:
+            raise ValueError("O router precisa de pelo menos uma shard (SCARLET_SHARDS).")
+        self.ring = HashRing(self.meta["shards"])
+        self.save()
+
+    def save(self):
+        if not self.config:
+            return
+        tmp = f"{self.config}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.config)
+
+    def table(self, db, name):
+        return self.meta["databases"].get(db, {}).get(name)
+
+    def add_shard(self, shard):
+        """Junta uma shard ao anel e move para ela as rows de que passa a ser dona"""
+        with self.lock.write():
+            if shard in self.ring.shards:
+                return f"A shard '{shard}' já faz parte do router."
+            ring = HashRing(self.ring.shards + [shard])
+            target = _client(shard)
+            sources = {old: _client(old) for old in self.ring.shards}
+            moved = 0
+            try:
+                for db, tables in self.meta["databases"].items():
+                    target.execute("wd", [db])
+                    _ok(target.execute("sd", [db]))
+                    for name, info in tables.items():
+                        target.execute("wt", [name, info["columns"], info["spec"], info["storage"]])
+                        _ok(target.execute("st", [name]))
+                        for col in info["indexes"]:
+                            target.execute("ci", [col])
+                        moved += self._move(db, name, info, ring, shard, target, sources)
+            finally:
+                target.close()
+                for client in sources.values():
+                    client.close()
+            self.ring = ring
+            self.meta["shards"].append(shard)
+            self.save()
+            return f"Shard '{shard}' adicionada ({len(ring.shards)} shard(s)); {moved} row(s) movida(s)."
+
+    def _move(self, db, name, info, ring, shard, target, sources):
+        key = info["key"]
+        typ = info["types"][info["columns"].index(key)]
+        moved = 0
+        for client in sources.values():
+            _ok(client.execute("sd", [db]))
+            _ok(client.execute("st", [name]))
+            # rows sem chave ficam onde estão (nenhuma condição as apagaria na origem)
+            rows = [row for row in client.stream("select", [["*"], {}])
+                    if row.get(key) is not None and ring.owner(routing_key(row.get(key), typ)) == shard]
+            for start in range(0, len(rows), MOVE_BATCH):
+                batch = rows[start:start + MOVE_BATCH]
+                # primeiro a cópia, depois o apagar: uma falha a meio deixa rows repetidas, não perdidas
+                msg = _ok(target.execute("ib", [[row.get(col) for col in info["columns"]] for row in batch]))
+                if "erro(s)" in msg:
+                    raise ValueError(f"Falha ao mover rows de '{db}.{name}': {msg.split('; ')[0]}")
+                # "===": só a chave exata ("7" não apaga "007", que pode não ter mudado de shard)
+                for response in client.pipeline([("d", [{key: {"op": "===", "val": row.get(key)}}])
+                                                  for row in batch]):
+                    _ok(response)
+                moved += len(batch)
+        return moved
+
+
+class RouterSession:
+    """Uma ligação de cliente: base de dados/tabela atuais e um ScarletClient por shard"""
+
+    def __init__(self, router):
+        self.router = router
+        self.db = None
+        self.table = None
+        self.clients = {}
+
+    def client(self, shard):
+        client = self.clients.get(shard)
+        if client is None:
+            client = self.clients[shard] = _client(shard)
+        # o ScarletClient repete sd/st numa ligação que ainda não os tenha
+        client.db, client.table = self.db, self.table
+        return client
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+
+    def _all(self, cmd, args, shards=None):
+        shards = self.router.ring.shards if shards is None else shards
+        return list(_fanout.map(lambda shard: self.client(shard).execute(cmd, args), shards))
+
+    def _broadcast(self, cmd, args):
+        """Envia a todas as shards; erro se alguma falhar, senão a resposta da primeira"""
+        responses = self._all(cmd, args)
+        for response in responses:
+            if response.get("status") != "ok":
+                return response
+        return responses[0]
+
+    def _info(self):
+        if self.db is None or self.table is None:
+            raise ValueError("Nenhuma base de dados ou tabela selecionada")
+        return self.router.table(self.db, self.table)
+
+    def _owner(self, info, value):
+        typ = info["types"][info["columns"].index(info["key"])]
+        return self.router.ring.owner(routing_key(value, typ))
+
+    def _targets(self, info, conds):
+        """Só a shard da chave, se a condição fixar a chave de partição; senão todas"""
+        typ = info["types"][info["columns"].index(info["key"])]
+        for col, op, literal in compile_condition(conds or {}).conjuncts:
+            # numa chave de texto, um literal numérico ("id=7") também apanha "007" na shard
+            if col == info["key"] and op == "=" and (typ in ("int", "float") or isinstance(literal, str)):
+                return [self._owner(info, literal)]
+        return list(self.router.ring.shards)
+
+    def _sum_counts(self, responses):
+        """'N linha(s) ...' de cada shard → a primeira mensagem com a soma"""
+        for response in responses:
+            if response.get("status") != "ok":
+                return response
+        total = 0
+        for response in responses:
+            m = COUNT.match(response["msg"])
+            total += int(m.group(1)) if m else 0
+        return {"status": "ok", "msg": COUNT.sub(f"{total} linha", responses[0]["msg"], count=1)}
+
+    # ---- Comandos ----
+    def frames(self, command):
+        """
+        Frames da resposta a um comando (select e join em stream, como no servidor).
+        As rows vêm das shards bloco a bloco: cada bloco é lido com o lock de leitura do router
+        (um addshard espera pelo fim do bloco, não do stream) e enviado já sem ele.
+        """
+        cmd = command.get("cmd")
+        args = command.get("args") or []
+        schema = cmd in SCHEMA_COMMANDS or (cmd == "e" and args[:1] == ["ac"])
+        rows = None
+        with self.router.lock.write() if schema else self.router.lock.read():
+            if cmd not in ("select", "join"):
+                response = self.execute(cmd, args)
+            else:
+                try:
+                    rows, meta = self._select(*args) if cmd == "select" else self._join(*args)
+                    chunk = list(islice(rows, CHUNK_ROWS))
+                    response = None
+                except Exception as e:
+                    response = {"status": "error", "msg": str(e)}
+        if response is not None:
+            if rows is not None:
+                rows.close()
+            yield response
+            return
+        count = 0
+        try:
+            yield {"status": "ok", "stream": True}
+            while chunk:
+                count += len(chunk)
+                yield {"rows": chunk}
+                with self.router.lock.read():
+                    chunk = list(islice(rows, CHUNK_ROWS))
+        except Exception as e:
+            yield {"status": "error", "msg": str(e), "end": True}
+            return
+        finally:
+            rows.close()
+        yield {"end": True, "count": count, **meta}
+
+    def execute(self, cmd, args):
+        try:
+            if cmd in UNSUPPORTED:
+                return {"status": "error", "msg": f"'{cmd}' não é suportado através do router."}
+            if cmd == "shards":
+                return {"status": "ok", "msg": list(self.router.ring.shards)}
+            handler = getattr(self, f"_cmd_{cmd}", None)
+            if handler is None:
+                return {"status": "error", "msg": f"Comando desconhecido: {cmd}"}
+            return handler(*args)
+        except ProtocolError as e:
+            return {"status": "error", "msg": f"Shard indisponível: {e}"}
+        except Exception as e:
+            return {"status": "error", "msg": str(e)}
+
+    def _cmd_wd(self, db_name):
+        if db_name in self.router.meta["databases"]:
+            return {"status": "ok", "msg": f"Base de dados '{db_name}' já existe."}
+        response = self._broadcast("wd", [db_name])
+        if response.get("status") == "ok":
+            self.router.meta["databases"][db_name] = {}
+            self.router.save()
+        return response
+
+    def _cmd_dd(self, db_name):
+        if db_name not in self.router.meta["databases"]:
+            return {"status": "ok", "msg": f"Base de dados '{db_name}' não existe."}
+        response = self._broadcast("dd", [db_name])
+        if response.get("status") == "ok":
+            del self.router.meta["databases"][db_name]
+            self.router.save()
+            if self.db == db_name:
+                self.db = self.table = None
+        return response
+
+    def _cmd_sd(self, db_name):
+        if db_name not in self.router.meta["databases"]:
+            return {"status": "ok", "msg": f"Base de dados '{db_name}' não existe."}
+        self.db, self.table = db_name, None
+        return {"status": "ok", "msg": f"Base de dados atual: '{db_name}'."}
+
+    def _cmd_st(self, table_name):
+        if self.db is None:
+            return {"status": "ok", "msg": "Nenhuma base de dados selecionada."}
+        if self.router.table(self.db, table_name) is None:
+            return {"status": "ok", "msg": f"Tabela '{table_name}' não existe em '{self.db}'."}
+        self.table = table_name
+        return {"status": "ok", "msg": f"Tabela atual: '{table_name}'."}
+
+    def _cmd_wt(self, table_name, columns, types, storage="rows"):
+        if self.db is None:
+            return {"status": "ok", "msg": "Nenhuma base de dados selecionada."}
+        if self.router.table(self.db, table_name) is not None:
+            return {"status": "ok", "msg": f"Tabela '{table_name}' já existe em '{self.db}'."}
+        responses = self._all("wt", [table_name, columns, types, storage])
+        for response in responses:
+            if response.get("status") != "ok" or "criada" not in response["msg"]:
+                return response
+        plain = [typ.partition(":")[0].strip() for typ in types]
+        pk = [col for col, typ in zip(columns, types) if typ.partition(":")[2].strip().lower() == "pk"]
+        self.router.meta["databases"][self.db][table_name] = {
+            "columns": list(columns), "types": plain, "spec": list(types), "storage": storage,
+            "key": pk[0] if pk else columns[0], "pk": bool(pk), "indexes": pk[:1]}
+        self.router.save()
+        msg = responses[0]["msg"]
+        return {"status": "ok", "msg": f"{msg} Partição por '{pk[0] if pk else columns[0]}'."}
+
+    def _cmd_dt(self, table_name):
+        response = self._broadcast("dt", [table_name])
+        if response.get("status") == "ok" and self.router.table(self.db, table_name) is not None:
+            del self.router.meta["databases"][self.db][table_name]
+            self.router.save()
+            if self.table == table_name:
+                self.table = None
+        return response
+
+    def _cmd_ci(self, column):
+        info = self._info()
+        response = self._broadcast("ci", [column])
+        if response.get("status") == "ok" and column in info["columns"] and column not in info["indexes"]:
+            info["indexes"].append(column)
+            self.router.save()
+        return response
+
+    def _cmd_i(self, *values):
+        info = self._info()
+        if len(values) != len(info["columns"]):
+            return {"status": "ok", "msg": "Número incorreto de valores."}
+        key = values[info["columns"].index(info["key"])]
+        return self.client(self._owner(info, key)).execute("i", list(values))
+
+    def _cmd_ib(self, *rows):
+        info = self._info()
+        position = info["columns"].index(info["key"])
+        groups = {}
+        for n, row in enumerate(rows):
+            owner = self._owner(info, row[position] if len(row) > position else None)
+            groups.setdefault(owner, []).append((n, row))
+        shards = list(groups)
+        responses = list(_fanout.map(
+            lambda shard: self.client(shard).execute("ib", [row for _, row in groups[shard]]), shards))
+        inserted = 0
+        errors = []
+        for shard, response in zip(shards, responses):
+            if response.get("status") != "ok":
+                return response
+            msg = response["msg"]
+            m = COUNT.match(msg)
+            inserted += int(m.group(1)) if m else 0
+            if "erro(s): " in msg:
+                # os índices dos erros são os do lote de cada shard: voltar aos do lote original
+                numbers = [n for n, _ in groups[shard]]
+                detail = msg.split("erro(s): ", 1)[1]
+                errors.append(re.sub(r"#(\d+):", lambda e: f"#{numbers[int(e.group(1))]}:", detail))
+        msg = f"{inserted} linha(s) inserida(s) em '{self.table}'."
+        if errors:
+            msg += f" {len(rows) - inserted} erro(s): {'; '.join(errors)}"
+        return {"status": "ok", "msg": msg}
+
+    def _cmd_u(self, condition, updates):
+        info = self._info()
+        if info["key"] in updates:
+            return {"status": "error", "msg": f"A chave de partição '{info['key']}' não pode ser alterada."}
+        return self._sum_counts(self._all("u", [condition, updates], self._targets(info, condition)))
+
+    def _cmd_d(self, condition):
+        info = self._info()
+        return self._sum_counts(self._all("d", [condition], self._targets(info, condition)))
+
+    def _cmd_e(self, *args):
+        info = self._info()
+        if args and args[0] == "ac":
+            response = self._broadcast("e", list(args))
+            if response.get("status") == "ok" and "adicionada" in response["msg"]:
+                col, _, typ = str(args[1]).partition(":")
+                info["columns"].append(col.strip())
+                info["types"].append(typ.strip() or "string")
+                info["spec"].append(typ.strip() or "string")
+                self.router.save()
+            return response
+        if args and args[0] == "row_edit":
+            _, row_id, assignments = args
+            if info["key"] in assignments:
+                return {"status": "error", "msg": f"A chave de partição '{info['key']}' não pode ser alterada."}
+            # e->id:N procura pela chave primária da tabela (ou pela coluna id)
+            ident = info["key"] if info["pk"] else "id"
+            shards = [self._owner(info, row_id)] if ident == info["key"] else self.router.ring.shards
+            responses = self._all("e", list(args), shards)
+            for response in responses:
+                if response.get("status") != "ok" or not response["msg"].startswith("Nenhuma"):
+                    return response
+            return responses[0]
+        return self._broadcast("e", list(args))
+
+    def _cmd_show(self):
+        info = self._info()
+        rows = []
+        for response in self._all("show", []):
+            rows += json.loads(_ok(response))["rows"]
+        return {"status": "ok", "msg": json.dumps({"columns": info["columns"], "rows": rows},
+                                                   indent=2, ensure_ascii=False)}
+
+    def _cmd_agg(self, funcs, group_by=None, conds=None):
+        info = self._info()
+        group_by = group_by or []
+        functions = parse_functions(funcs)
+        # o que se pede às shards: avg → sum + count (parciais que se podem somar)
+        needed = []
+        for func, col in functions:
+            for part in ([("sum", col), ("count", col)] if func == "avg" else [(func, col)]):
+                if part not in needed:
+                    needed.append(part)
+        specs = [func if col is None else f"{func}:{col}" for func, col in needed]
+        groups = {}
+        for response in self._all("agg", [specs, group_by, conds or {}], self._targets(info, conds)):
+            for row in _ok(response):
+                key = tuple(row.get(col) for col in group_by)
+                acc = groups.get(key)
+                if acc is None:
+                    groups[key] = {label(f, c): row.get(label(f, c)) for f, c in needed}
+                    continue
+                for func, col in needed:
+                    name = label(func, col)
+                    mine, other = acc[name], row.get(name)
+                    if func in ("count", "sum"):
+                        acc[name] = (mine or 0) + (other or 0)
+                    elif other is not None and (mine is None or (other < mine if func == "min" else other > mine)):
+                        acc[name] = other
+        result = []
+        for key, acc in groups.items():
+            out = dict(zip(group_by, key))
+            for func, col in functions:
+                if func == "avg":
+                    n = acc[label("count", col)]
+                    out[label(func, col)] = acc[label("sum", col)] / n if n else None
+                else:
+                    out[label(func, col)] = acc[label(func, col)]
+            result.append(out)
+        return {"status": "ok", "msg": result}
+
+    def _per_shard(self, cmd):
+        return {"status": "ok", "msg": {shard: r.get("msg") for shard, r in
+                                        zip(self.router.ring.shards, self._all(cmd, []))}}
+
+    def _cmd_cache(self):
+        return self._per_shard("cache")
+
+    def _cmd_stats(self):
+        return self._per_shard("stats")
+
+    def _cmd_repl(self):
+        return self._per_shard("repl")
+
+    def _select(self, cols, conds=None, options=None):
+        info = self._info()
+        order, limit, offset, after = parse_options(options)
+        shard_options = {}
+        if order:
+            shard_options["order"] = [[col, direction] for col, direction in order]
+        if after is not None:
+            # a posição que desempata (ver scarlet_order) é de uma shard: às outras não serve
+            shard_options["after"] = after[:len(order)]
+        if limit is not None:
+            shard_options["limit"] = offset + limit  # cada shard devolve as suas melhores offset+limit
+        # as colunas de ordenação fazem falta para o merge, mesmo que não tenham sido pedidas
+        extra = [col for col, _ in order if cols != ["*"] and col not in cols]
+        args = [list(cols) + extra, conds or {}] + ([shard_options] if shard_options else [])
+        streams = [self.client(shard).stream("select", args) for shard in self._targets(info, conds)]
+        if order:
+            key, reverse = make_key(order)
+            rows = heapq.merge(*streams, key=lambda row: key([row.get(col) for col, _ in order]), reverse=reverse)
+        else:
+            rows = chain(*streams)
+        if offset or limit is not None:
+            rows = islice(rows, offset, None if limit is None else offset + limit)
+        meta = {}
+
+        def result():
+            last = None
+            try:
+                for row in rows:
+                    last = row
+                    yield {col: row.get(col) for col in cols} if extra else row
+            finally:
+                # com limit as shards podem ficar a meio: a ligação de cada uma tem de ser libertada
+                for stream in streams:
+                    stream.close()
+            if order and last is not None:
+                meta["cursor"] = [last.get(col) for col, _ in order]
+
+        return result(), meta
+
+    def _join(self, kind, on, cols=None, conds=None):
+        """Só entre tabelas particionadas pelas colunas do join (as rows que fazem par estão na mesma shard)"""
+        (left, left_col), (right, right_col) = parse_on(on)
+        infos = [self.router.table(self.db, left), self.router.table(self.db, right)]
+        if None in infos:
+            raise ValueError("Tabela do join não existe.")
+        if (infos[0]["key"], infos[1]["key"]) != (left_col, right_col):
+            raise ValueError("Join através do router só entre colunas que são as chaves de partição das duas tabelas.")
+        args = [kind, on, cols or ["*"], conds or {}]
+        streams = [self.client(shard).stream("join", args) for shard in self.router.ring.shards]
+
+        def result():
+            try:
+                yield from chain(*streams)
+            finally:
+                for stream in streams:
+                    stream.close()
+
+        return result(), {}
+
+
+def serve_client(router, conn, addr):
+    session = RouterSession(router)
+    log.info("Cliente ligado: %s", addr)
+    with conn:
+        while True:
+            try:
+                payload = recv_payload(conn)
+                if payload is None:
+                    break
+                command = decode_frame(payload)
+            except ValueError as e:
+                send_frame(conn, {"status": "error", "msg": str(e)})
+                continue
+            except (OSError, ProtocolError):
+                break
+            try:
+                if command.get("cmd") == "hello":
+                    version = negotiate((command.get("args") or [None])[0])
+                    if version is None:
+                        send_frame(conn, {"status": "error",
+                                          "msg": f"Versão de protocolo não suportada (router: {PROTOCOL_VERSION})."})
+                        break
+                    send_frame(conn, {"status": "ok", "msg": "hello", "version": version})
+                elif command.get("cmd") == "addshard":
+                    try:
+                        response = {"status": "ok", "msg": router.add_shard(str((command.get("args") or [""])[0]).strip())}
+                    except Exception as e:
+                        response = {"status": "error", "msg": str(e)}
+                    if command.get("id") is not None:
+                        response["id"] = command["id"]
+                    send_frame(conn, response)
+                else:
+                    frames = session.frames(command)
+                    try:
+                        for frame in frames:
+                            if command.get("id") is not None:
+                                frame["id"] = command["id"]
+                            send_frame(conn, frame)
+                    finally:
+                        frames.close()
+            except OSError:
+                break
+    session.close()
+    log.info("Cliente desligado: %s", addr)
+
+
+def main():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    router = Router([s.strip() for s in SHARDS.split(",") if s.strip()])
+    slots = threading.BoundedSemaphore(MAX_CLIENTS)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((HOST, PORT))
+        s.listen()
+        log.info("Router ScarletDB em %s:%s com %d shard(s).", HOST, PORT, len(router.ring.shards))
+        while True:
+            conn, addr = s.accept()
+            if not slots.acquire(blocking=False):
+                log.warning("Ligação de %s recusada: %d ligações abertas.", addr, MAX_CLIENTS)
+                with conn:
+                    try:
+                        send_frame(conn, {"status": "error", "msg": f"Router cheio ({MAX_CLIENTS} ligações abertas)."})
+                    except OSError:
+                        pass
+                continue
+            threading.Thread(target=_serve_slot, args=(slots, router, conn, addr), daemon=True).start()
+
+
+def _serve_slot(slots, router, conn, addr):
+    try:
+        serve_client(router, conn, addr)
+    finally:
+        slots.release()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        log.info("Router interrompido.")
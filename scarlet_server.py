@@ -1,134 +1,383 @@
+import os
 import socket
-import json
-import re
-from scarletdb import ScarletDB  # importa a classe
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from scarletdb import ScarletDB, Session  # importa a classe
+from scarlet_query import compile_condition
+from scarlet_columnar import ColumnarRows
+from scarlet_order import parse_options, order_positions, index_positions, split_cursor
+from scarlet_aggregate import parse_functions, aggregate_rows, aggregate_columns
+import scarlet_parallel
+from scarlet_parallel import parallel_aggregate
+from scarlet_replication import ReplicationHub, Follower
+from scarlet_join import JOIN_KINDS, parse_on, qualify, split_condition, hash_join, index_join
+from scarlet_metrics import SLOW_DETAIL_CHARS
+from scarlet_transfer import TRANSFER_COMMANDS, receive_upload, send_file
+from scarlet_protocol import (send_frame, encode_frame, recv_payload, decode_frame, negotiate,
+                              ProtocolError, PROTOCOL_VERSION, CHUNK_ROWS, HEADER)
+
+log = logging.getLogger("scarletdb.server")
 
 HOST = "0.0.0.0"
-PORT = 65432
+PORT = int(os.environ.get("SCARLET_PORT", "65432"))
+# ligações abertas ao mesmo tempo (uma thread cada, enquanto a ligação durar); acima disto
+# uma ligação nova recebe um erro e é fechada, em vez de ficar à espera sem resposta
+MAX_CLIENTS = int(os.environ.get("SCARLET_MAX_CLIENTS", "1024"))
+IDLE_EVICT_SECONDS = 600  # tabelas/bases de dados sem acessos há mais tempo saem da memória
+MAINTENANCE_INTERVAL = 60
+LOG_LEVEL = os.environ.get("SCARLET_LOG_LEVEL", "INFO")         # DEBUG mostra cada comando recebido
+SLOW_QUERY_MS = float(os.environ.get("SCARLET_SLOW_MS", "100"))  # limite do slow-query log
+# always: fsync do log antes de responder; interval: fsync a cada SCARLET_SYNC_MS; os: fica para o SO
+DURABILITY = os.environ.get("SCARLET_DURABILITY", "interval")
+SYNC_INTERVAL_MS = float(os.environ.get("SCARLET_SYNC_MS", "100"))
+# replicação: o líder aceita réplicas em SCARLET_REPL_PORT; uma réplica arranca com
+# SCARLET_FOLLOW=host:porta (porta de replicação do líder) e fica só de leitura
+REPL_PORT = int(os.environ.get("SCARLET_REPL_PORT", "0"))
+FOLLOW = os.environ.get("SCARLET_FOLLOW", "")
 
-def _to_number_if_possible(s):
-    txt = str(s).strip()
-    if len(txt) >= 2 and ((txt[0] == txt[-1] == "'") or (txt[0] == txt[-1] == '"')):
-        txt = txt[1:-1]
-    try:
-        return int(txt)
-    except ValueError:
+# comandos que só leem dados ou mudam o estado da sessão → lock partilhado
+READ_COMMANDS = {"select", "join", "agg", "show", "sd", "st", "cache", "stats", "repl"}
+
+def _select(db, cols, conds, options=None):
+    """
+    Devolve (gerador das rows projetadas da tabela atual que satisfazem a condição, meta).
+    options: order/limit/offset/after (ver scarlet_order); com order, meta["cursor"] fica
+    com os valores de ordenação da última row quando o gerador chega ao fim.
+    """
+    if not db.current_db or not db.current_table:
+        raise ValueError("Nenhuma base de dados ou tabela selecionada")
+
+    # conds pode ser dict (antigo) OU string (novo) OU {}
+    table = db.databases[db.current_db][db.current_table]
+    predicate = compile_condition(conds)
+    order, limit, offset, after = parse_options(options)
+
+    # a condição compilada é a forma normalizada: "id:2" e "id=2" dão a mesma chave
+    version = db._table_version(db.current_db, db.current_table)
+    key = (db.current_db, db.current_table, version, tuple(cols), repr(predicate.tree),
+           repr((order, limit, offset, after)))
+    cached = db.result_cache.get(key)
+    if cached is not None:
+        rows, meta = cached
+        return iter(rows), meta
+
+    rows = table["rows"]
+    if order:
+        positions = _ordered(db, table, predicate, order, limit, offset, after)
+    else:
+        positions = db._match(db.current_table, predicate)
+        if offset or limit is not None:
+            positions = positions[offset:None if limit is None else offset + limit]
+
+    # tabelas colunares só materializam as colunas pedidas
+    columnar = isinstance(rows, ColumnarRows)
+    if columnar:
+        wanted = None if cols == ["*"] else cols
+        project = lambda view, pos: view.row(pos, wanted)
+    elif cols == ["*"]:
+        columns = table["columns"]
+
+        def project(view, pos):
+            row = view[pos]
+            if len(row) == len(columns):
+                return row
+            # row anterior a um e->ac: as colunas novas valem None até receberem um valor
+            return {col: row.get(col) for col in columns}
+    else:
+        project = lambda view, pos: {c: view[pos].get(c) for c in cols}
+
+    meta = {}
+
+    def result():
+        with _frozen(rows, positions) as view:
+            last = None
+            for pos in positions:
+                last = pos
+                yield project(view, pos)
+            if order and last is not None:
+                values = view.row(last, [col for col, _ in order]) if columnar else view[last]
+                meta["cursor"] = [values.get(col) for col, _ in order] + [last]
+
+    return db.result_cache.remember(key, result(), meta), meta
+
+@contextmanager
+def _frozen(rows, positions):
+    """
+    As rows nas posições dadas tal como estão agora, lidas como `rows` (view[pos], view.row).
+    Entra-se com o lock, no primeiro bloco do stream; os blocos seguintes leem a mesma versão
+    mesmo que entretanto haja escritas. As rows em dicts nunca são alteradas (uma update
+    troca a row por outra), por isso bastam as referências; numa tabela colunar o stream
+    regista-se em readers e as escritas passam a ser feitas numa cópia.
+    """
+    if isinstance(rows, ColumnarRows):
+        token = object()
+        rows.readers.add(token)
         try:
-            return float(txt)
-        except ValueError:
-            return txt
-
-def _eval_simple_condition(row, cond):
-    # aceita: coluna (==|=|!=|<=|>=|<|>) valor
-    m = re.match(r'\s*([A-Za-z_]\w*)\s*(==|=|!=|<=|>=|<|>)\s*(.+)\s*$', cond)
-    if not m:
-        return False
-    col, op, raw = m.groups()
-    if col not in row:
-        return False
-    val = row.get(col)
-    target = _to_number_if_possible(raw)
-    if val is None:
-        return False
-    if op == '==':
-        op = '='
-    try:
-        if op == '=':  return val == target
-        if op == '!=': return val != target
-        if op == '<':  return val <  target
-        if op == '>':  return val >  target
-        if op == '<=': return val <= target
-        if op == '>=': return val >= target
-    except Exception:
-        return False
-    return False
-
-def _eval_condition(row, cond_str):
-    # prioridade: || por fora (OR), & por dentro (AND)
-    if '||' in cond_str:
-        return any(_eval_condition(row, part) for part in cond_str.split('||'))
-    if '&' in cond_str:
-        return all(_eval_condition(row, part) for part in cond_str.split('&'))
-    return _eval_simple_condition(row, cond_str)
-
-def _match_condition(value, cond):
+            yield rows
+        finally:
+            rows.readers.discard(token)
+    else:
+        yield {pos: rows[pos] for pos in positions}
+
+def _ordered(db, table, predicate, order, limit, offset, after):
+    """Posições das rows que satisfazem o predicado, já ordenadas e paginadas"""
+    rows = table["rows"]
+    found = db._candidates(db.current_db, db.current_table, predicate.conjuncts)
+    if limit is not None and found is None and len(order) == 1:
+        # índice ordenado na coluna de ordenação: percorre-o por ordem e pára nas K rows
+        col, direction = order[0]
+        values, tie = split_cursor(order, after)
+        cursor = None if values is None else values[0]
+        index = None
+        if col in table["columns"] and table["types"][table["columns"].index(col)] in ("int", "float") \
+                and (cursor is None or isinstance(cursor, (int, float))):
+            index = db._index(db.current_db, db.current_table, col)
+        # só serve se todas as rows estiverem no índice ordenado (sem None)
+        if index is not None and len(index.positions) == len(rows):
+            return list(islice(_walk(db, rows, predicate, index_positions(index, direction == "desc", cursor, tie)),
+                               offset, offset + limit))
+
+    positions = db._match(db.current_table, predicate)
+    cols = [col for col, _ in order]
+    # gerador: com limit o heap só guarda as chaves das offset+limit melhores rows
+    read = (lambda pos: rows.row(pos, cols)) if isinstance(rows, ColumnarRows) else rows.__getitem__
+    entries = ((pos, [row.get(col) for col in cols]) for pos, row in zip(positions, map(read, positions)))
+    return order_positions(entries, order, limit, offset, after)
+
+def _walk(db, rows, predicate, positions):
+    session = db.session
+    for pos in positions:
+        session.rows_scanned += 1
+        if predicate(rows[pos]):
+            session.rows_matched += 1
+            yield pos
+
+def _join(db, kind, on, cols, conds=None):
     """
-    Avalia uma condição do parser no formato dict: {"op": "<", "val": 10}
-    - value: valor actual da row (int/float/str/...)
-    - cond:  dict com keys "op" e "val"
-    Retorna True/False sem lançar exceções.
+    Inner/left join por igualdade entre duas tabelas da base de dados atual (ver scarlet_join).
+    Devolve (gerador das rows juntadas, meta), como _select.
     """
-    if not isinstance(cond, dict):
-        return False
-    op = cond.get("op", "=")
-    target = cond.get("val")
-
-    # Se value está ausente, falha
-    if value is None:
-        return False
-
-    def _coerce(v):
-        # tenta preservar números; remove aspas de strings
-        if isinstance(v, (int, float)):
-            return v
-        if isinstance(v, str):
-            s = v.strip()
-            # remover aspas se existirem
-            if len(s) >= 2 and ((s[0] == s[-1] == "'") or (s[0] == s[-1] == '"')):
-                s = s[1:-1]
-            # tentar converter para int/float
-            try:
-                return int(s)
-            except Exception:
-                try:
-                    return float(s)
-                except Exception:
-                    return s
-        return v
+    if not db.current_db:
+        raise ValueError("Nenhuma base de dados selecionada")
+    kind = str(kind).lower()
+    if kind not in JOIN_KINDS:
+        raise ValueError(f"Tipo de join desconhecido: '{kind}' (opções: {', '.join(JOIN_KINDS)}).")
+    (left, left_col), (right, right_col) = parse_on(on)
+    database = db.databases[db.current_db]
+    tables = {}
+    for name, col in ((left, left_col), (right, right_col)):
+        if name not in database:
+            raise ValueError(f"Tabela '{name}' não existe em '{db.current_db}'.")
+        tables[name] = database[name]["columns"]
+        if col not in tables[name]:
+            raise ValueError(f"Coluna '{col}' não existe em '{name}'.")
 
-    v1 = _coerce(value)
-    v2 = _coerce(target)
+    left_pred, right_pred, residual = split_condition(compile_condition(conds), tables, left, right, kind)
+    left_rows, right_rows = database[left]["rows"], database[right]["rows"]
 
-    try:
-        if op in ("=", "=="):
-            return v1 == v2
-        if op == "!=":
-            return v1 != v2
-        if op == "<":
-            return v1 < v2
-        if op == ">":
-            return v1 > v2
-        if op == "<=":
-            return v1 <= v2
-        if op == ">=":
-            return v1 >= v2
-    except Exception:
-        # comparações com tipos incompatíveis (ex: 'a' < 3) devolvem False
-        return False
-
-    return False
+    def keys(rows, positions, col):
+        if isinstance(rows, ColumnarRows):
+            return rows.values(col, positions)
+        return [rows[pos].get(col) for pos in positions]
+
+    def accepts(rows, predicate):
+        return lambda pos: predicate(rows[pos])
+
+    session = db.session
+    pairs = left_positions = right_positions = None
+    right_index = db._index(db.current_db, right, right_col)
+    if right_index is not None:
+        left_positions = db._match(left, left_pred)
+        if len(left_positions) < len(right_rows):
+            pairs, checked = index_join(left_positions, keys(left_rows, left_positions, left_col), right_index,
+                                        accepts(right_rows, right_pred), kind)
+            session.rows_scanned += checked
+    # num inner join os lados trocam: o índice da esquerda também serve
+    left_index = db._index(db.current_db, left, left_col) if kind == "inner" and pairs is None else None
+    if left_index is not None:
+        right_positions = db._match(right, right_pred)
+        if len(right_positions) < len(left_rows):
+            swapped, checked = index_join(right_positions, keys(right_rows, right_positions, right_col), left_index,
+                                          accepts(left_rows, left_pred), kind)
+            session.rows_scanned += checked
+            pairs = sorted((left_pos, right_pos) for right_pos, left_pos in swapped)
+    if pairs is None:
+        if left_positions is None:
+            left_positions = db._match(left, left_pred)
+        if right_positions is None:
+            right_positions = db._match(right, right_pred)
+        pairs = hash_join(left_positions, keys(left_rows, left_positions, left_col),
+                          right_positions, keys(right_rows, right_positions, right_col), kind)
+
+    # projeção: só se materializam as colunas pedidas (e as que o resto da condição usa)
+    if cols in (["*"], "*", None):
+        wanted = [f"{name}.{col}" for name in (left, right) for col in tables[name]]
+    else:
+        wanted = [qualify(col, tables) for col in cols]
+    needed = list(wanted)
+    if residual is not None:
+        needed += [col for col in (f"{name}.{c}" for name in (left, right) for c in tables[name])
+                   if col not in needed]
+    sides = [[col.partition(".")[2] for col in needed if col.partition(".")[0] == name] for name in (left, right)]
+
+    def fetch(rows, pos, columns, name):
+        if pos is None:
+            return {f"{name}.{col}": None for col in columns}
+        if isinstance(rows, ColumnarRows):
+            row = rows.row(pos, columns)
+        else:
+            row = rows[pos]
+        return {f"{name}.{col}": row.get(col) for col in columns}
+
+    def result():
+        with _frozen(left_rows, [pos for pos, _ in pairs]) as left_view, \
+                _frozen(right_rows, [pos for _, pos in pairs if pos is not None]) as right_view:
+            yield from joined(left_view, right_view)
+
+    def joined(left_view, right_view):
+        for left_pos, right_pos in pairs:
+            row = fetch(left_view, left_pos, sides[0], left)
+            row.update(fetch(right_view, right_pos, sides[1], right))
+            if residual is not None:
+                if not residual(row):
+                    continue
+                row = {col: row[col] for col in wanted}
+            session.rows_matched += 1
+            yield row
+
+    return result(), {}
+
+def _aggregate(db, funcs, group_by, conds):
+    """count/sum/min/max/avg (opcionalmente por grupos) calculados no servidor"""
+    if not db.current_db or not db.current_table:
+        raise ValueError("Nenhuma base de dados ou tabela selecionada")
+
+    functions = parse_functions(funcs)
+    rows = db.databases[db.current_db][db.current_table]["rows"]
+    predicate = compile_condition(conds)
+    if db._parallel(rows) and db._candidates(db.current_db, db.current_table, predicate.conjuncts) is None:
+        # tabela grande sem índice que ajude: cada processo filtra e agrega a sua partição
+        result, matched = parallel_aggregate(rows, predicate, functions, group_by, db.workers)
+        db.session.rows_scanned += len(rows)
+        db.session.rows_matched += matched
+        return result
+    positions = db._match(db.current_table, predicate)
+    if isinstance(rows, ColumnarRows):
+        return aggregate_columns(lambda col: rows.values(col, positions), len(positions), functions, group_by)
+    return aggregate_rows((rows[pos] for pos in positions), functions, group_by)
+
+# comandos cujo resultado (rows) é enviado em stream
+STREAM_COMMANDS = {"select": _select, "join": _join}
+
+@contextmanager
+def _lock_for(db, cmd):
+    tx = db.session.tx
+    if cmd not in READ_COMMANDS:
+        with db.lock.write():
+            yield
+    elif tx is not None and tx.ops:
+        # a sessão lê as alterações da sua transação, aplicadas só enquanto dura o comando
+        with db.lock.write(), db.tx_view():
+            yield
+    else:
+        with db.lock.read():
+            yield
 
 def handle_command(db, command):
+    """Executa um comando e devolve a resposta completa"""
+    with _lock_for(db, command.get("cmd")):
+        response = _dispatch(db, command)
+    db.wait_durable()
+    return response
+
+def stream_command(db, command):
+    """
+    Gera os frames da resposta a um comando.
+    O select (e o join) é enviado em blocos de CHUNK_ROWS rows:
+    {"status": "ok", "stream": true} → {"rows": [...]}* → {"end": true, "count": n(, "cursor": [...])}
+    As posições são escolhidas com o lock e cada bloco é lido com o lock de leitura (o primeiro
+    ainda com o lock do comando) e enviado já sem ele: um cliente lento a ler o socket não
+    prende os escritores, e o resultado nunca fica todo em memória. Entre blocos as escritas
+    continuam; as rows enviadas são as do momento do comando (ver _frozen).
+    """
+    cmd = command.get("cmd")
+    if cmd not in STREAM_COMMANDS:
+        with _lock_for(db, cmd):
+            response = _dispatch(db, command)
+        # commit: o fsync é feito já sem o lock, para que commits simultâneos partilhem o mesmo
+        db.wait_durable()
+        yield response
+        return
+
+    error = None
+    rows = None
+    with _lock_for(db, cmd):
+        try:
+            rows, meta = STREAM_COMMANDS[cmd](db, *command.get("args", []))
+            chunk = list(islice(rows, CHUNK_ROWS))
+        except Exception as e:
+            error = str(e)
+    if error is not None:
+        _close(rows)
+        yield {"status": "error", "msg": error}
+        return
+
+    count = 0
+    try:
+        yield {"status": "ok", "stream": True}
+        while chunk:
+            count += len(chunk)
+            yield {"rows": chunk}
+            with db.lock.read():
+                chunk = list(islice(rows, CHUNK_ROWS))
+    except Exception as e:
+        yield {"status": "error", "msg": str(e), "end": True}
+        return
+    finally:
+        _close(rows)
+    yield {"end": True, "count": count, **meta}
+
+def _close(rows):
+    """Fecha o gerador das rows (liberta o que _frozen reservou); as da cache são uma lista"""
+    close = getattr(rows, "close", None)
+    if close is not None:
+        close()
+
+def transfer(db, conn, command):
+    """upload/download: os bytes passam diretamente na ligação, sem o lock da base de dados"""
+    with db.lock.read():
+        db_name = db.current_db
+    if db_name is None:
+        send_frame(conn, {"status": "error", "msg": "Nenhuma base de dados selecionada."})
+        return
+    store = db._blobs(db_name)
+    args = command.get("args", [])
+    if db.read_only and command["cmd"] == "upload":
+        send_frame(conn, {"status": "error", "msg": "Réplica só de leitura: as escritas vão para o líder."})
+        return
+    try:
+        if command["cmd"] == "upload":
+            receive_upload(conn, store, *args)
+        else:
+            send_file(conn, store, *args)
+    except (TypeError, ValueError) as e:
+        send_frame(conn, {"status": "error", "msg": str(e)})
+
+def _dispatch(db, command):
     try:
         cmd = command.get("cmd")
         args = command.get("args", [])
 
-        if cmd == "select":
-            if not db.current_db or not db.current_table:
-                return {"status": "error", "msg": "Nenhuma base de dados ou tabela selecionada"}
-
-            cols, conds = args  # conds pode ser dict (antigo) OU string (novo) OU {}
-            table = db.databases[db.current_db][db.current_table]
-            rows = []
-            for row in table["rows"]:
-                ok = True
-                if isinstance(conds, dict) and conds:
-                    ok = all(_match_condition(row.get(k), conds[k]) for k in conds)
-                elif isinstance(conds, str) and conds.strip():
-                    ok = _eval_condition(row, conds)
-                if ok:
-                    rows.append(row if cols == ["*"] else {c: row.get(c) for c in cols})
-            return {"status": "ok", "msg": rows}
+        if db.read_only and cmd not in READ_COMMANDS:
+            return {"status": "error", "msg": "Réplica só de leitura: as escritas vão para o líder."}
+        if cmd in STREAM_COMMANDS:
+            rows, meta = STREAM_COMMANDS[cmd](db, *args)
+            return {"status": "ok", "msg": list(rows), **meta}
+        if cmd == "agg":
+            return {"status": "ok", "msg": _aggregate(db, *args)}
 
         if not hasattr(db, cmd):
             return {"status": "error", "msg": f"Comando desconhecido: {cmd}"}
@@ -141,28 +390,157 @@ def handle_command(db, command):
         return {"status": "error", "msg": str(e)}
 
 def main():
-    scarlet = ScarletDB()
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    scarlet = ScarletDB(durability=DURABILITY, sync_interval_ms=SYNC_INTERVAL_MS)
+    scarlet.metrics.slow_ms = SLOW_QUERY_MS
+    scarlet.defer_sync = True
+    if scarlet_parallel.start(scarlet.workers):  # antes de qualquer thread
+        log.info("Scan paralelo ligado: %d processos.", scarlet.workers)
+    if FOLLOW:
+        host, _, port = FOLLOW.rpartition(":")
+        scarlet.replication = Follower(scarlet, host or "127.0.0.1", int(port))
+        scarlet.read_only = True
+        scarlet.replication.start()
+    elif REPL_PORT:
+        scarlet.replication = ReplicationHub(scarlet)
+        threading.Thread(target=scarlet.replication.serve, args=(HOST, REPL_PORT), daemon=True).start()
+    try:
+        serve(scarlet)
+    except KeyboardInterrupt:
+        log.info("Servidor interrompido.")
+    finally:
+        if FOLLOW:
+            scarlet.replication.stop()
+        scarlet.close()
+        scarlet_parallel.stop()
+
+def maintenance(scarlet):
+    """Thread de fundo: descarrega periodicamente o que não é usado há algum tempo"""
+    while True:
+        time.sleep(MAINTENANCE_INTERVAL)
+        with scarlet.lock.write():
+            evicted = scarlet.evict_idle(IDLE_EVICT_SECONDS)
+        if evicted:
+            log.info("%d tabela(s) sem acessos descarregada(s) da memória.", evicted)
+
+def serve(scarlet):
+    threading.Thread(target=maintenance, args=(scarlet,), daemon=True).start()
+    scarlet.start_background()
+    slots = threading.BoundedSemaphore(MAX_CLIENTS)
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         s.bind((HOST, PORT))
         s.listen()
-        print(f"ScarletDB a correr em {HOST}:{PORT}...")
+        log.info("ScarletDB a correr em %s:%s...", HOST, PORT)
         while True:
             conn, addr = s.accept()
-            print(f"\033[92m[+]\033[0m Cliente ligado: {addr}")
-            with conn:
-                while True:
-                    data = conn.recv(4096)
-                    if not data:
-                        break
-                    try:
-                        command = json.loads(data.decode("utf-8"))
-                        print(f"\033[93m[{addr}] comando recebido:\033[0m {command}")
-                        response = handle_command(scarlet, command)
-                    except Exception as e:
-                        response = {"status": "error", "msg": str(e)}
-
-                    conn.sendall(json.dumps(response).encode("utf-8"))
-            print(f"\033[91m[-]\033[0m Cliente desligado: {addr}")
+            if not slots.acquire(blocking=False):
+                reject(conn, addr)
+                continue
+            threading.Thread(target=_serve_slot, args=(slots, scarlet, conn, addr), daemon=True).start()
+
+def reject(conn, addr):
+    """Servidor cheio: a resposta ao hello do cliente é logo um erro"""
+    log.warning("Ligação de %s recusada: %d ligações abertas.", addr, MAX_CLIENTS)
+    with conn:
+        try:
+            send_frame(conn, {"status": "error", "msg": f"Servidor cheio ({MAX_CLIENTS} ligações abertas)."})
+        except OSError:
+            pass
+
+def _serve_slot(slots, scarlet, conn, addr):
+    try:
+        serve_client(scarlet, conn, addr)
+    finally:
+        slots.release()
+
+def run_command(scarlet, conn, command, parse_s, bytes_in):
+    """Executa um comando, envia os frames da resposta e regista as métricas por fase"""
+    cmd = str(command.get("cmd"))
+    session = scarlet.session
+    scanned, matched = session.rows_scanned, session.rows_matched
+    phases = {"parse": parse_s, "execute": 0.0, "serialize": 0.0, "send": 0.0}
+    bytes_out = returned = 0
+    error = False
+    start = time.perf_counter()
+    request_id = command.get("id")  # clientes com vários pedidos em curso (scarlet_async)
+    frames = stream_command(scarlet, command)
+    try:
+        while True:
+            t0 = time.perf_counter()
+            frame = next(frames, None)
+            t1 = time.perf_counter()
+            phases["execute"] += t1 - t0
+            if frame is None:
+                break
+            if request_id is not None:
+                frame["id"] = request_id
+            data = encode_frame(frame)
+            t2 = time.perf_counter()
+            conn.sendall(data)
+            phases["serialize"] += t2 - t1
+            phases["send"] += time.perf_counter() - t2
+            bytes_out += len(data)
+            returned += len(frame.get("rows", ()))
+            error = error or frame.get("status") == "error"
+    finally:
+        frames.close()  # ligação perdida a meio de um stream: liberta já o lock
+        phases["total"] = parse_s + time.perf_counter() - start
+        if cmd not in STREAM_COMMANDS:
+            returned = session.rows_matched - matched
+        slow = scarlet.metrics.record(cmd, phases, bytes_in, bytes_out,
+                                      session.rows_scanned - scanned, returned, error, command)
+        if slow:
+            log.warning("Comando lento (%.1f ms): %s", phases["total"] * 1000,
+                        str(command)[:SLOW_DETAIL_CHARS])
+
+def serve_client(scarlet, conn, addr):
+    """Serve uma ligação até o cliente desligar, com a sua própria sessão"""
+    scarlet.use_session(Session())
+    log.info("Cliente ligado: %s", addr)
+    with conn:
+        while True:
+            try:
+                payload = recv_payload(conn)
+                if payload is None:
+                    break
+                t0 = time.perf_counter()
+                command = decode_frame(payload)
+                parse_s = time.perf_counter() - t0
+            except ValueError as e:
+                # JSON inválido: o frame foi consumido, a ligação continua utilizável
+                send_frame(conn, {"status": "error", "msg": str(e)})
+                continue
+            except (OSError, ProtocolError):
+                break
+
+            if command.get("cmd") == "hello":
+                version = negotiate((command.get("args") or [None])[0])
+                if version is None:
+                    send_frame(conn, {"status": "error",
+                                      "msg": f"Versão de protocolo não suportada (servidor: {PROTOCOL_VERSION})."})
+                    break
+                send_frame(conn, {"status": "ok", "msg": "hello", "version": version})
+                continue
+
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("[%s] comando recebido: %s", addr, command)
+            if command.get("cmd") in TRANSFER_COMMANDS:
+                try:
+                    transfer(scarlet, conn, command)
+                except (OSError, ProtocolError):
+                    break
+                continue
+            try:
+                run_command(scarlet, conn, command, parse_s, len(payload) + HEADER.size)
+            except OSError:
+                break
+    if scarlet.session.tx is not None:
+        # ligação perdida a meio de uma transação: nada do que ela fez fica
+        with scarlet.lock.write():
+            scarlet.rollback()
+        log.info("Transação de %s anulada (cliente desligou).", addr)
+    log.info("Cliente desligado: %s", addr)
 
 if __name__ == "__main__":
     main()
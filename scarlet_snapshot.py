@@ -0,0 +1,355 @@
+import os
+import json
+import uuid
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+from scarlet_columnar import ColumnarRows, NumericColumn, DictColumn
+
+# Formato binário de snapshot (<db>.sdb):
+#
+#   cabeçalho | diretório (JSON)            e, por tabela, tables/<id>.sdt com o bloco
+#
+# - cabeçalho: magic, versão, LSN incluído, offset/tamanho/crc32 do diretório
+# - diretório: {tabela: {"file", "offset", "length", "crc", "rows", "meta"}}, onde "meta" é o
+#   dict da tabela sem as rows (columns, types, storage, indexes, ...)
+# - um checkpoint só escreve os blocos das tabelas cujas rows mudaram (LazyTables.dirty): as
+#   outras continuam no ficheiro que já tinham, e o diretório novo aponta para ele. Mudanças só
+#   de esquema (índice, coluna nova) também não reescrevem o bloco: uma coluna que não está no
+#   bloco é lida como None.
+# - bloco: nº de rows + uma secção por coluna (tag + tamanho + payload), com encodings tipados:
+#     q  int64:   bitmap de validade + array('q')
+#     d  float64: bitmap de validade + array('d')
+#     s  strings: dicionário (valores distintos) + array('i') de códigos (-1 = None)
+#     j  JSON:    lista de valores (colunas com tipos misturados)
+# Cada bloco tem crc32 próprio, por isso uma tabela pode ser lida sozinha, quando é precisa.
+
+MAGIC = b"SCDB"
+VERSION = 1
+TABLES_DIR = "tables"
+HEADER = struct.Struct("<4sHQQQI")  # magic, versão, lsn, dir_offset, dir_length, dir_crc
+U32 = struct.Struct("<I")
+SECTION = struct.Struct("<cQ")      # tag, tamanho do payload
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# ---- Encoding ----
+def _bitmap(values):
+    bits = bytearray((len(values) + 7) >> 3)
+    for pos, value in enumerate(values):
+        if value is not None:
+            bits[pos >> 3] |= 1 << (pos & 7)
+    return bytes(bits)
+
+
+def _encode_strings(dictionary, codes):
+    parts = [U32.pack(len(dictionary))]
+    for value in dictionary:
+        raw = value.encode("utf-8")
+        parts.append(U32.pack(len(raw)))
+        parts.append(raw)
+    parts.append(codes.tobytes())
+    return b"".join(parts)
+
+
+def _encode_values(typ, values):
+    """Escolhe o encoding mais compacto que preserva os valores exatamente"""
+    present = [v for v in values if v is not None]
+    if typ == "int" and all(type(v) is int and INT64_MIN <= v <= INT64_MAX for v in present):
+        data = array("q", (0 if v is None else v for v in values))
+        return b"q", _bitmap(values) + data.tobytes()
+    if typ == "float" and all(type(v) is float for v in present):
+        data = array("d", (0.0 if v is None else v for v in values))
+        return b"d", _bitmap(values) + data.tobytes()
+    if all(type(v) is str for v in present):
+        column = DictColumn()
+        for value in values:
+            column.append(value)
+        return b"s", _encode_strings(column.dictionary, column.codes)
+    return b"j", json.dumps(values, ensure_ascii=False).encode("utf-8")
+
+
+def _encode_column(column):
+    """Colunas de uma tabela colunar já estão no formato final"""
+    if isinstance(column, NumericColumn):
+        return column.typecode.encode(), bytes(column.valid) + column.data.tobytes()
+    return b"s", _encode_strings(column.dictionary, column.codes)
+
+
+def encode_table(table):
+    rows = table["rows"]
+    parts = [U32.pack(len(rows))]
+    for col, typ in zip(table["columns"], table["types"]):
+        if isinstance(rows, ColumnarRows):
+            tag, payload = _encode_column(rows.columns[col])
+        else:
+            tag, payload = _encode_values(typ, [row.get(col) for row in rows])
+        parts.append(SECTION.pack(tag, len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+# ---- Decoding ----
+def _decode_numeric(tag, payload, n):
+    typecode = tag.decode()
+    column = NumericColumn(typecode, int if typecode == "q" else float)
+    nbits = (n + 7) >> 3
+    column.valid = bytearray(payload[:nbits])
+    column.data = array(typecode)
+    column.data.frombytes(payload[nbits:])
+    full, rest = divmod(n, 8)
+    column.nulls = n - sum(bin(b).count("1") for b in column.valid[:full])
+    if rest:
+        column.nulls -= bin(column.valid[full] & ((1 << rest) - 1)).count("1")
+    return column
+
+
+def _decode_strings(payload):
+    column = DictColumn()
+    (count,) = U32.unpack_from(payload, 0)
+    offset = U32.size
+    for _ in range(count):
+        (size,) = U32.unpack_from(payload, offset)
+        offset += U32.size
+        value = payload[offset:offset + size].decode("utf-8")
+        offset += size
+        column.lookup[value] = len(column.dictionary)
+        column.dictionary.append(value)
+    column.codes = array("i")
+    column.codes.frombytes(payload[offset:])
+    return column
+
+
+def decode_table(meta, block):
+    """Reconstrói o dict da tabela (rows em lista de dicts ou ColumnarRows, conforme o storage)"""
+    (n,) = U32.unpack_from(block, 0)
+    offset = U32.size
+    decoded = []
+    for col in meta["columns"]:
+        if offset == len(block):
+            # coluna acrescentada depois de o bloco ser escrito
+            decoded.append([None] * n)
+            continue
+        tag, size = SECTION.unpack_from(block, offset)
+        offset += SECTION.size
+        payload = block[offset:offset + size]
+        offset += size
+        if tag in (b"q", b"d"):
+            decoded.append(_decode_numeric(tag, payload, n))
+        elif tag == b"s":
+            decoded.append(_decode_strings(payload))
+        else:
+            decoded.append(json.loads(payload.decode("utf-8")))
+
+    table = dict(meta)
+    if meta.get("storage") == "columnar":
+        rows = ColumnarRows(meta["columns"], meta["types"])
+        for col, column in zip(meta["columns"], decoded):
+            if isinstance(column, list):
+                for value in column:
+                    rows.columns[col].append(rows.columns[col].check(value))
+            else:
+                rows.columns[col] = column
+        rows.length = n
+        table["rows"] = rows
+    else:
+        values = [c if isinstance(c, list) else c.values() for c in decoded]
+        names = meta["columns"]
+        table["rows"] = [dict(zip(names, row_values)) for row_values in zip(*values)] if names else []
+    return table
+
+
+# ---- Ficheiros ----
+class SnapshotReader:
+    """
+    Lê o diretório de um snapshot e, a pedido, os blocos de tabelas individuais.
+    Os ficheiros de tabela lidos ficam abertos até close(): depois de um checkpoint escrever
+    outro snapshot (e apagar os blocos que já não usa), um reader antigo continua a ler a
+    versão em que foi aberto. Quem substitui o reader fecha o antigo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._files = {}  # ficheiro de tabela → ficheiro aberto
+        self._lock = threading.Lock()
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise SnapshotError(f"Snapshot truncado: {path}")
+            magic, version, lsn, dir_offset, dir_length, dir_crc = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise SnapshotError(f"Não é um snapshot ScarletDB: {path}")
+            if version != VERSION:
+                raise SnapshotError(f"Versão de snapshot não suportada ({version}): {path}")
+            f.seek(dir_offset)
+            raw = f.read(dir_length)
+        if zlib.crc32(raw) != dir_crc:
+            raise SnapshotError(f"Checksum do diretório inválido: {path}")
+        self.lsn = lsn
+        self.tables = json.loads(raw.decode("utf-8"))
+
+    def read_block(self, name):
+        entry = self.tables[name]
+        with self._lock:
+            f = self._files.get(entry["file"])
+            if f is None:
+                f = self._files[entry["file"]] = open(os.path.join(os.path.dirname(self.path), entry["file"]), "rb")
+            f.seek(entry["offset"])
+            block = f.read(entry["length"])
+        if zlib.crc32(block) != entry["crc"]:
+            raise SnapshotError(f"Checksum inválido na tabela '{name}': {self.path}")
+        return block
+
+    def load_table(self, name):
+        return decode_table(self.tables[name]["meta"], self.read_block(name))
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+def write_snapshot(path, tables, lsn):
+    """
+    Escreve um snapshot novo em `path`: os blocos em falta em ficheiros novos, depois o
+    diretório num ficheiro temporário, fsync e os.replace (um crash a meio deixa sempre o
+    snapshot anterior inteiro, e os seus ficheiros de tabela só são apagados no fim).
+    tables: {nome: dict da tabela | (SnapshotReader, nome[, dict da tabela])}; o segundo caso
+    reaproveita o bloco do snapshot anterior (tabela não carregada ou sem rows alteradas),
+    com o esquema atualizado se vier o dict da tabela.
+    """
+    folder = os.path.dirname(path)
+    os.makedirs(os.path.join(folder, TABLES_DIR), exist_ok=True)
+    directory = {}
+    for name, table in tables.items():
+        if isinstance(table, tuple):
+            reader, source = table[:2]
+            entry = dict(reader.tables[source])
+            if len(table) == 3:
+                entry["meta"] = {k: v for k, v in table[2].items() if k != "rows"}
+        else:
+            meta = {k: v for k, v in table.items() if k != "rows"}
+            entry = {"rows": len(table["rows"]), "meta": meta}
+            entry.update(_write_block(folder, encode_table(table)))
+        directory[name] = entry
+    if tables:
+        fsync_dir(os.path.join(folder, TABLES_DIR))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        raw = json.dumps(directory, ensure_ascii=False).encode("utf-8")
+        f.write(HEADER.pack(MAGIC, VERSION, lsn, HEADER.size, len(raw), zlib.crc32(raw)))
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(folder)
+
+    # blocos que o novo diretório já não usa (tabelas reescritas ou apagadas, restos de um crash)
+    live = {entry["file"] for entry in directory.values()}
+    for name in os.listdir(os.path.join(folder, TABLES_DIR)):
+        if f"{TABLES_DIR}/{name}" not in live:
+            os.remove(os.path.join(folder, TABLES_DIR, name))
+
+
+def _write_block(folder, block):
+    """Grava um bloco num ficheiro de tabela novo; devolve a parte da entrada do diretório"""
+    rel = f"{TABLES_DIR}/{uuid.uuid4().hex}.sdt"
+    with open(os.path.join(folder, rel), "wb") as f:
+        f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    return {"file": rel, "offset": 0, "length": len(block), "crc": zlib.crc32(block)}
+
+
+def fsync_dir(path):
+    """Torna durável um rename/criação de ficheiro na pasta (POSIX; noutros sistemas é ignorado)"""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class LazyTables(dict):
+    """
+    Tabelas de uma base de dados. As que ainda só existem no snapshot ficam como
+    marcador e são lidas (e verificadas) no primeiro acesso; podem voltar a ser
+    descarregadas com unload() quando o snapshot está atualizado.
+    """
+
+    def __init__(self, snapshot=None):
+        super().__init__()
+        self.snapshot = snapshot
+        self.last_access = {}
+        self.dirty = set()  # tabelas com rows diferentes das do snapshot
+        self._lock = threading.Lock()
+        if snapshot:
+            for name in snapshot.tables:
+                dict.__setitem__(self, name, _UNLOADED)
+
+    def __getitem__(self, name):
+        table = dict.__getitem__(self, name)
+        if table is _UNLOADED:
+            with self._lock:
+                table = dict.__getitem__(self, name)
+                if table is _UNLOADED:
+                    table = self.snapshot.load_table(name)
+                    dict.__setitem__(self, name, table)
+        self.last_access[name] = time.monotonic()
+        return table
+
+    def loaded(self, name):
+        return dict.__getitem__(self, name) is not _UNLOADED
+
+    def unload(self, name):
+        dict.__setitem__(self, name, _UNLOADED)
+        self.last_access.pop(name, None)
+
+    def replace_snapshot(self, snapshot):
+        """Passa a ler do snapshot novo e fecha o anterior (sem leituras a meio: mesmo lock)"""
+        with self._lock:
+            old, self.snapshot = self.snapshot, snapshot
+        if old is not None:
+            old.close()
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+    def meta(self, name):
+        """Dict da tabela sem a carregar (as rows só existem se já estiver em memória)"""
+        table = dict.__getitem__(self, name)
+        return self.snapshot.tables[name]["meta"] if table is _UNLOADED else table
+
+    def contents(self):
+        """
+        O que escrever no próximo snapshot: as tabelas alteradas (ou novas) inteiras; das
+        restantes, o bloco do snapshot atual (com o esquema em memória, se estiver carregada)
+        """
+        contents = {}
+        for name, table in dict.items(self):
+            if table is _UNLOADED:
+                contents[name] = (self.snapshot, name)
+            elif name in self.dirty or self.snapshot is None or name not in self.snapshot.tables:
+                contents[name] = table
+            else:
+                contents[name] = (self.snapshot, name, table)
+        return contents
+
+
+_UNLOADED = object()
@@ -0,0 +1,134 @@
+import os
+from scarlet_blobs import DIGEST, CHUNK, blob_digest, blob_value, hash_file
+from scarlet_protocol import send_frame, recv_frame, ProtocolError
+
+# Transferência de ficheiros (colunas `file`) pela ligação, fora dos frames JSON:
+#
+# upload->caminho   cliente: {"cmd": "upload", "args": [sha256, tamanho]}
+#                   servidor: {"status": "ok", "offset": n}   (bytes que já tem desse upload)
+#                   cliente: tamanho - n bytes em bruto
+#                   servidor: {"status": "ok", "msg": "files/ab/ab12..."}  (valor a usar no i/e)
+#
+# download          cliente: {"cmd": "download", "args": [valor, offset]}
+#                   servidor: {"status": "ok", "size": tamanho, "offset": offset} + bytes em bruto
+#
+# Os dados passam em blocos de CHUNK bytes dos dois lados: a memória usada não depende do
+# tamanho do ficheiro e o controlo de fluxo do TCP trava quem envia mais depressa do que o outro
+# lado escreve. Uma transferência interrompida recomeça onde ficou (offset).
+
+TRANSFER_COMMANDS = ("upload", "download")
+
+
+def _recv_into_file(sock, f, remaining):
+    buf = bytearray(min(CHUNK, max(remaining, 1)))
+    view = memoryview(buf)
+    while remaining:
+        n = sock.recv_into(view, min(len(buf), remaining))
+        if not n:
+            raise ProtocolError("Ligação fechada a meio de uma transferência.")
+        f.write(view[:n])
+        remaining -= n
+
+
+# ---- Servidor ----
+def receive_upload(sock, store, digest, size):
+    """Recebe (ou retoma) um upload para o blob store; o conteúdo tem de bater com o digest"""
+    size = int(size)
+    if not DIGEST.match(str(digest)) or size < 0:
+        send_frame(sock, {"status": "error", "msg": "Upload inválido (esperado: sha256, tamanho)."})
+        return
+    if store.touch(digest):
+        # já existe um ficheiro igual: nada a enviar
+        send_frame(sock, {"status": "ok", "offset": size})
+        send_frame(sock, {"status": "ok", "msg": blob_value(digest)})
+        return
+
+    part = store.part_path(digest)
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if offset > size:
+        offset = 0
+    with open(part, "r+b" if offset else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        send_frame(sock, {"status": "ok", "offset": offset})
+        _recv_into_file(sock, f, size - offset)
+    try:
+        store.commit_part(digest)
+    except ValueError as e:
+        send_frame(sock, {"status": "error", "msg": str(e)})
+        return
+    send_frame(sock, {"status": "ok", "msg": blob_value(digest)})
+
+
+def send_file(sock, store, value, offset=0):
+    """Envia o ficheiro de um valor `file` a partir de offset (socket.sendfile, sem cópias no Python)"""
+    try:
+        path = store.resolve(value)
+        offset = int(offset)
+        size = os.path.getsize(path)
+    except (ValueError, OSError):
+        send_frame(sock, {"status": "error", "msg": f"Ficheiro '{value}' não existe."})
+        return
+    if not 0 <= offset <= size:
+        send_frame(sock, {"status": "error", "msg": f"Offset inválido ({offset}, tamanho {size})."})
+        return
+    with open(path, "rb") as f:
+        send_frame(sock, {"status": "ok", "size": size, "offset": offset})
+        if size > offset:
+            sock.sendfile(f, offset, size - offset)
+
+
+# ---- Cliente ----
+def upload_file(sock, path):
+    """Envia um ficheiro local; devolve o valor a guardar na coluna `file`"""
+    digest = hash_file(path)
+    size = os.path.getsize(path)
+    send_frame(sock, {"cmd": "upload", "args": [digest, size]})
+    response = recv_frame(sock)
+    if response is None:
+        raise ProtocolError("Servidor fechou a ligação.")
+    if response.get("status") != "ok":
+        raise ProtocolError(response["msg"])
+    offset = response["offset"]
+    if offset < size:
+        with open(path, "rb") as f:
+            sock.sendfile(f, offset, size - offset)
+    response = recv_frame(sock)
+    if response is None:
+        raise ProtocolError("Servidor fechou a ligação.")
+    if response.get("status") != "ok":
+        raise ProtocolError(response["msg"])
+    return response["msg"]
+
+
+def download_file(sock, value, dest, resume=False):
+    """
+    Guarda em dest o ficheiro de um valor `file`. Os bytes vão primeiro para dest.part, que só
+    passa a dest depois de conferido; com resume, um dest.part deixado por um download
+    interrompido é continuado em vez de ser recomeçado (dest nunca é acrescentado).
+    """
+    part = f"{dest}.part"
+    offset = os.path.getsize(part) if resume and os.path.exists(part) else 0
+    response = _request_download(sock, value, offset)
+    if offset and response.get("status") != "ok":
+        offset = 0  # offset inválido: o .part é maior do que o ficheiro, não é dele; recomeça
+        response = _request_download(sock, value, 0)
+    if response.get("status") != "ok":
+        raise ProtocolError(response["msg"])
+    with open(part, "ab" if offset else "wb") as f:
+        _recv_into_file(sock, f, response["size"] - offset)
+    digest = blob_digest(value)
+    if os.path.getsize(part) != response["size"] or (digest is not None and hash_file(part) != digest):
+        os.remove(part)
+        raise ProtocolError(f"Ficheiro descarregado não corresponde a '{value}' (repita o download).")
+    os.replace(part, dest)
+    return response["size"]
+
+
+def _request_download(sock, value, offset):
+    send_frame(sock, {"cmd": "download", "args": [value, offset]})
+    response = recv_frame(sock)
+    if response is None:
+        raise ProtocolError("Servidor fechou a ligação.")
+    return response
+
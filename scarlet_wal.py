@@ -0,0 +1,90 @@
+import os
+import json
+import threading
+
+# Quando o log passa este tamanho fazemos checkpoint (snapshot + log vazio)
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+
+class WriteAheadLog:
+    """Log append-only de mutações de uma base de dados (um registo JSON por linha)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "ab")
+        self.appended = 0  # bytes escritos desde a abertura (não volta atrás com reset)
+        self.synced = 0    # até onde o fsync já garantiu
+        self._sync_lock = threading.Lock()
+
+    def append(self, record):
+        """Escreve o registo; devolve a posição a passar a sync() para o tornar durável"""
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+        self._file.write(line)
+        self._file.flush()
+        self.appended += len(line)
+        return self.appended
+
+    def sync(self, upto):
+        """
+        fsync até à posição `upto` (group commit): enquanto um fsync corre, os outros commits
+        esperam pelo lock e, se esse fsync já incluiu os seus registos, voltam sem fazer outro.
+        """
+        with self._sync_lock:
+            if self.synced >= upto or self._file.closed:
+                return
+            target = self.appended
+            try:
+                os.fsync(self._file.fileno())
+            except ValueError:
+                return  # log fechado entretanto (dd): não há nada a garantir
+            self.synced = max(self.synced, target)
+
+    def size(self):
+        return self._file.tell()
+
+    def reset(self):
+        """Esvazia o log (depois de um checkpoint)"""
+        self._file.truncate(0)
+        self._file.seek(0)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class LogCorruptError(Exception):
+    pass
+
+
+def replay(path):
+    """
+    Lê os registos de um log.
+    Um último registo truncado (crash a meio da escrita) é ignorado e cortado
+    do ficheiro, para que as próximas escritas comecem numa linha limpa.
+    Um registo ilegível com outros depois dele não é um crash a meio de uma escrita:
+    LogCorruptError, e o ficheiro fica como está (os registos seguintes não se perdem).
+    """
+    if not os.path.isfile(path):
+        return []
+
+    records = []
+    good_offset = 0
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    for n, line in enumerate(lines):
+        try:
+            if not line.endswith(b"\n"):
+                raise ValueError("registo sem fim de linha")
+            records.append(json.loads(line.decode("utf-8")))
+        except ValueError as e:
+            if n != len(lines) - 1:
+                raise LogCorruptError(
+                    f"Registo {n + 1} de {path} ilegível ({e}) com {len(lines) - n - 1} registo(s) "
+                    f"depois dele; o log não foi alterado.")
+            break
+        good_offset += len(line)
+
+    if good_offset != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_offset)
+    return records
@@ -1,19 +1,223 @@
 import os
 import json
+import logging
+import itertools
 import shutil
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from scarlet_wal import WriteAheadLog, replay, CHECKPOINT_BYTES
+from scarlet_index import ColumnIndex, normalize
+from scarlet_query import compile_condition
+from scarlet_columnar import ColumnarRows
+from scarlet_snapshot import SnapshotReader, LazyTables, write_snapshot
+from scarlet_blobs import BlobStore, blob_digest, blob_value
+from scarlet_cache import ResultCache
+from scarlet_metrics import Metrics
+import scarlet_parallel
 
 DATA_DIR = "scarlet_data"  # pasta onde guardamos as bases de dados
+STORAGES = ("rows", "columnar")  # rows: lista de dicts; columnar: ver scarlet_columnar
+log = logging.getLogger("scarletdb")
+
+DURABILITY = ("always", "interval", "os")  # fsync: a cada comando, periódico, ou deixar ao SO
+CHECKPOINT_SECONDS = 30   # alterações no log há mais tempo do que isto → checkpoint em segundo plano
+CHECKPOINT_POLL = 1.0
+BLOB_SWEEP_SECONDS = 600   # blobs libertados há mais de BLOB_MIN_AGE e uploads abandonados
+LSN_KEY = "__lsn__"        # chave com o último registo incluído nos snapshots JSON antigos
+
+class RWLock:
+    """Vários leitores em simultâneo ou um único escritor (escritores têm prioridade)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class Session:
+    """Estado de um cliente: base de dados e tabela selecionadas"""
 
-class ScarletDB:
     def __init__(self):
-        self.databases = {}
         self.current_db = None
         self.current_table = None
+        self.tx = None            # transação aberta (begin) ou None
+        self.pending_sync = None  # (wal, posição) à espera de fsync depois do commit
+        self.rows_scanned = 0  # rows analisadas / que satisfazem a condição (métricas)
+        self.rows_matched = 0
+
+
+class Catalog(dict):
+    """
+    Bases de dados conhecidas. Ao arrancar só se registam os nomes; cada base de dados
+    é lida do disco (snapshot + log) no primeiro acesso e pode ser descarregada com unload().
+    """
+
+    def __init__(self, loader):
+        super().__init__()
+        self.last_access = {}
+        self._loader = loader
+        self._lock = threading.RLock()
+
+    def register(self, name):
+        dict.__setitem__(self, name, None)
+
+    def __getitem__(self, name):
+        db = dict.__getitem__(self, name)
+        if db is None:
+            with self._lock:
+                db = dict.__getitem__(self, name)
+                if db is None:
+                    db = self._loader(name)
+                    dict.__setitem__(self, name, db)
+        self.last_access[name] = time.monotonic()
+        return db
+
+    def __delitem__(self, name):
+        dict.__delitem__(self, name)
+        self.last_access.pop(name, None)
+
+    def loaded(self, name):
+        return dict.__getitem__(self, name) is not None
+
+    def peek(self, name):
+        """A base de dados se já estiver em memória (sem a carregar nem contar como acesso)"""
+        return dict.__getitem__(self, name)
+
+    def unload(self, name):
+        dict.__setitem__(self, name, None)
+        self.last_access.pop(name, None)
+
+
+class Transaction:
+    """
+    Alterações de uma sessão entre begin e commit/rollback, guardadas como os comandos de
+    escrita (i, ib, u, d, e) que as pediram. As tabelas partilhadas só as recebem no commit:
+    as outras sessões não veem nada antes disso e continuam a poder escrever nas mesmas tabelas.
+    Cada comando da transação (e cada leitura da própria sessão, com tx_view) repete por cima
+    do estado confirmado os comandos já aceites e no fim desfaz tudo, com o lock de escrita.
+    No commit os comandos são repetidos sobre o estado desse momento e as alterações que
+    geram ficam em memória e vão para o log num único registo.
+    """
+
+    def __init__(self, db_name):
+        self.db = db_name
+        self.ops = []       # (tabela atual, comando, args), pela ordem em que foram aceites
+        self.replaying = False
+        self.reset()
+
+    def reset(self):
+        self.records = []   # registos gerados pela repetição em curso
+        self.undo = []      # (tabela, operação inversa), pela ordem em que foram aplicados
+        self.blobs = {}     # tabela → contagens de blobs antes da repetição
+        self.released = set()
+
+
+TX_OPS = ("insert", "update", "delete")  # alterações de esquema não entram em transações
+
+
+class ScarletDB:
+    def __init__(self, wal=True, durability="os", sync_interval_ms=100):
+        if durability not in DURABILITY:
+            raise ValueError(f"Durabilidade desconhecida: '{durability}' (opções: {', '.join(DURABILITY)}).")
+        self.databases = Catalog(self._load_db)
+        self.lock = RWLock()
+        self._local = threading.local()  # sessão ativa de cada thread
+        self.use_wal = wal   # False → reescreve o snapshot a cada mutação (modo antigo)
+        self._wals = {}
+        self._lsn = {}
+        self._indexes = {}   # (db, tabela) → {coluna: ColumnIndex}, construídos on demand
+        self._versions = {}  # (db, tabela) → versão, muda a cada mutação (invalida a cache)
+        self._clock = itertools.count(1)
+        self.result_cache = ResultCache()
+        self.metrics = Metrics()
+        self._transactions = set()  # transações abertas (de todas as sessões)
+        self.defer_sync = False  # True: quem chama faz wait_durable() depois de largar o lock
+        self.durability = durability
+        self.sync_interval = sync_interval_ms / 1000
+        self._dirty_since = {}   # db → quando o log deixou de estar vazio
+        self._checkpoint_lock = threading.Lock()
+        self._background = None
+        self._stop = threading.Event()
+        self.workers = scarlet_parallel.WORKERS  # processos do scan paralelo (1 → desligado)
+        self.parallel_min_rows = scarlet_parallel.PARALLEL_MIN_ROWS
+        self.replication = None  # ReplicationHub (líder) ou Follower (réplica), ver scarlet_replication
+        self.read_only = False   # réplica: só comandos de leitura
         os.makedirs(DATA_DIR, exist_ok=True)
         self._load_databases()
 
+    # ---- Sessões ----
+    @property
+    def session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = Session()
+        return self._local.session
+
+    def use_session(self, session):
+        """Associa a sessão de um cliente à thread que o está a servir"""
+        self._local.session = session
+
+    @property
+    def current_db(self):
+        s = self.session
+        if s.current_db is not None and s.current_db not in self.databases:
+            # a base de dados foi apagada por outra sessão
+            s.current_db = s.current_table = None
+        return s.current_db
+
+    @current_db.setter
+    def current_db(self, value):
+        self.session.current_db = value
+
+    @property
+    def current_table(self):
+        s = self.session
+        if s.current_table is not None and (
+                self.current_db is None or s.current_table not in self.databases[s.current_db]):
+            # a tabela foi apagada por outra sessão
+            s.current_table = None
+        return s.current_table
+
+    @current_table.setter
+    def current_table(self, value):
+        self.session.current_table = value
+
     # ---- Funcoes de persistencia ----
     def _db_path(self, db_name):
+        return os.path.join(DATA_DIR, db_name, f"{db_name}.sdb")
+
+    def _json_path(self, db_name):
+        """Snapshot no formato antigo (migrado para .sdb quando a base de dados é carregada)"""
         return os.path.join(DATA_DIR, db_name, f"{db_name}.json")
 
     def _files_path(self, db_name):
@@ -21,13 +225,120 @@ class ScarletDB:
         os.makedirs(path, exist_ok=True)
         return path
 
+    def _blobs(self, db_name):
+        return BlobStore(self._files_path(db_name))
+
+    def _log_path(self, db_name):
+        return os.path.join(DATA_DIR, db_name, f"{db_name}.log")
+
     def _save_db(self, db_name):
         path = self._db_path(db_name)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.databases[db_name], f, indent=2, ensure_ascii=False)
+        tables = self.databases[db_name]
+        start = time.perf_counter()
+        # tabelas que nunca foram carregadas são copiadas bloco a bloco do snapshot anterior
+        write_snapshot(path, tables.contents(), self._lsn.get(db_name, 0))
+        tables.replace_snapshot(SnapshotReader(path))
+        tables.dirty.clear()
+        self.metrics.record_save(time.perf_counter() - start, os.path.getsize(path))
+
+    def _wal(self, db_name):
+        if db_name not in self._wals:
+            self._wals[db_name] = WriteAheadLog(self._log_path(db_name))
+        return self._wals[db_name]
+
+    def _checkpoint(self, db_name):
+        """
+        Junta o log ao snapshot e esvazia o log. Basta o lock de leitura (não há escritas
+        a meio); _checkpoint_lock impede dois checkpoints em simultâneo.
+        """
+        with self._checkpoint_lock:
+            self._save_db(db_name)
+            if self.use_wal:
+                self._wal(db_name).reset()
+            self._dirty_since.pop(db_name, None)
+
+    def start_background(self):
+        """Thread de fundo: fsync periódico do log (durability="interval") e checkpoints"""
+        if self._background is None:
+            self._background = threading.Thread(target=self._background_loop, daemon=True)
+            self._background.start()
+
+    def _background_loop(self):
+        poll = CHECKPOINT_POLL
+        if self.durability == "interval":
+            poll = min(poll, self.sync_interval)
+        last_checkpoint = last_sweep = time.monotonic()
+        while not self._stop.wait(poll):
+            if self.durability == "interval":
+                for wal in list(self._wals.values()):
+                    wal.sync(wal.appended)
+            if time.monotonic() - last_checkpoint >= CHECKPOINT_POLL:
+                last_checkpoint = time.monotonic()
+                try:
+                    self.checkpoint_dirty()
+                except Exception:
+                    log.exception("Falha no checkpoint em segundo plano.")
+            if time.monotonic() - last_sweep >= BLOB_SWEEP_SECONDS:
+                last_sweep = time.monotonic()
+                try:
+                    self.sweep_blobs()
+                except Exception:
+                    log.exception("Falha a apagar blobs sem referências.")
+
+    def sweep_blobs(self):
+        """
+        Apaga os blobs sem referências com mais de BLOB_MIN_AGE (os que um d/dt/dd libertou
+        há pouco ficaram no disco) e os uploads abandonados, nas bases de dados em memória.
+        """
+        removed = 0
+        for db_name in list(self.databases):
+            with self.lock.read():
+                tables = self.databases.peek(db_name)
+                if tables is not None:
+                    removed += self._collect_blobs(db_name, tables)
+        return removed
+
+    def checkpoint_dirty(self, force=False):
+        """Checkpoint das bases de dados com o log acima de CHECKPOINT_BYTES ou com alterações antigas"""
+        now = time.monotonic()
+        done = 0
+        for db_name, since in list(self._dirty_since.items()):
+            wal = self._wals.get(db_name)
+            if not (force or now - since >= CHECKPOINT_SECONDS or (wal and wal.size() >= CHECKPOINT_BYTES)):
+                continue
+            with self.lock.read():
+                # pode ter sido apagada/descarregada entretanto
+                if db_name in self._dirty_since and db_name in self._wals:
+                    self._checkpoint(db_name)
+                    done += 1
+        return done
+
+    def close(self):
+        """Checkpoint de todas as bases de dados e fecho dos logs"""
+        self._stop.set()
+        if self._background is not None:
+            self._background.join()
+            self._background = None
+        for db_name in list(self._wals):
+            self._checkpoint(db_name)
+            self._wals.pop(db_name).close()
+        for db_name in list(self.databases):
+            tables = self.databases.peek(db_name)
+            if tables is not None:
+                tables.close()
 
     def _delete_db_file(self, db_name):
         """Apaga toda a pasta da base de dados"""
+        wal = self._wals.pop(db_name, None)
+        if wal:
+            wal.close()
+        self._lsn.pop(db_name, None)
+        self._dirty_since.pop(db_name, None)
+        for key in [k for k in self._indexes if k[0] == db_name]:
+            del self._indexes[key]
+        for key in [k for k in self._versions if k[0] == db_name]:
+            del self._versions[key]
+        self.result_cache.invalidate(db_name)
         path = os.path.join(DATA_DIR, db_name)
         if os.path.exists(path):
             def remover_erro(func, path, exc_info):
@@ -36,35 +347,454 @@ class ScarletDB:
             shutil.rmtree(path, onerror=remover_erro)
 
     def _load_databases(self):
+        """Só regista os nomes: o conteúdo é lido no primeiro acesso (ver _load_db)"""
         for db_folder in os.listdir(DATA_DIR):
-            db_path = os.path.join(DATA_DIR, db_folder)
-            if os.path.isdir(db_path):
-                json_file = os.path.join(db_path, f"{db_folder}.json")
-                if os.path.isfile(json_file):
-                    with open(json_file, "r", encoding="utf-8") as f:
-                        self.databases[db_folder] = json.load(f)
+            if os.path.isfile(self._db_path(db_folder)) or os.path.isfile(self._json_path(db_folder)):
+                self.databases.register(db_folder)
+
+    def _load_db(self, db_name):
+        if not os.path.isfile(self._db_path(db_name)):
+            self._migrate_json(db_name)
+        snapshot = SnapshotReader(self._db_path(db_name))
+        tables = LazyTables(snapshot)
+        lsn = snapshot.lsn
+        # reaplicar o que ficou no log depois do último checkpoint
+        for record in replay(self._log_path(db_name)):
+            if record["lsn"] > lsn:
+                self._apply(db_name, record, tables)
+                lsn = record["lsn"]
+        self._lsn[db_name] = lsn
+        # durante o replay nada é apagado (um blob libertado pode voltar a ser referenciado
+        # mais à frente no log); no fim removem-se os que ficaram sem referências
+        self._collect_blobs(db_name, tables)
+        return tables
+
+    def _migrate_json(self, db_name):
+        """Converte <db>.json (formato antigo) num snapshot binário; o JSON fica como .migrated"""
+        json_file = self._json_path(db_name)
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        lsn = data.pop(LSN_KEY, 0)
+        for table in data.values():
+            if table.get("storage") == "columnar":
+                table["rows"] = ColumnarRows.from_json(table["columns"], table["types"], table["rows"])
+        write_snapshot(self._db_path(db_name), data, lsn)
+        os.replace(json_file, json_file + ".migrated")
+
+    def evict_idle(self, max_idle):
+        """
+        Liberta da memória as tabelas e bases de dados sem acessos há mais de max_idle
+        segundos. Antes disso faz checkpoint, para que o snapshot tenha tudo o que se perde.
+        """
+        now = time.monotonic()
+        evicted = 0
+        for db_name in list(self.databases):
+            tables = self.databases.peek(db_name)
+            if tables is None:
+                continue
+            db_idle = now - self.databases.last_access.get(db_name, 0) > max_idle
+            idle = [name for name in tables if tables.loaded(name)
+                    and (db_idle or now - tables.last_access.get(name, 0) > max_idle)]
+            if not idle and not db_idle:
+                continue
+            log = self._log_path(db_name)
+            if tables.dirty or (os.path.isfile(log) and os.path.getsize(log) > 0):
+                self._checkpoint(db_name)
+            for name in idle:
+                tables.unload(name)
+                self._indexes.pop((db_name, name), None)
+            evicted += len(idle)
+            if db_idle:
+                wal = self._wals.pop(db_name, None)
+                if wal:
+                    wal.close()
+                self._lsn.pop(db_name, None)
+                self._dirty_since.pop(db_name, None)
+                tables.close()
+                self.databases.unload(db_name)
+        return evicted
+
+    # ---- Registos de mutação ----
+    def _commit(self, db_name, record):
+        """Escreve a mutação no log (write-ahead) e aplica-a em memória"""
+        tx = self.session.tx
+        if tx is not None:
+            if not tx.replaying:
+                # os comandos de escrita passam por _tx_call; só o esquema chega aqui diretamente
+                raise ValueError("Alterações de esquema não são permitidas dentro de uma transação.")
+            self._stage(tx, db_name, record)
+            return
+
+        self._lsn[db_name] = self._lsn.get(db_name, 0) + 1
+        record["lsn"] = self._lsn[db_name]
+        if not self.use_wal:
+            # sem log, o lsn fica no snapshot reescrito; as réplicas recebem a mutação na mesma
+            self._publish(db_name, record)
+            released = self._apply(db_name, record)
+            self._save_db(db_name)
+            if released:
+                self._collect_blobs(db_name, self.databases[db_name], released)
+            return
+
+        wal = self._wal(db_name)
+        upto = wal.append(record)
+        self._publish(db_name, record)
+        self._dirty_since.setdefault(db_name, time.monotonic())
+        released = self._apply(db_name, record)
+        self._maybe_checkpoint(db_name)
+        if released:
+            self._collect_blobs(db_name, self.databases[db_name], released)
+        if self.durability == "always":
+            self.session.pending_sync = (wal, upto)
+            if not self.defer_sync:
+                self.wait_durable()
+
+    # ---- Replicação ----
+    def _publish(self, db_name, record):
+        """Líder: a mutação (já no log, se houver) segue para as réplicas"""
+        if self.replication is not None:
+            self.replication.publish(db_name, record)
+
+    def replicate(self, db_name, record):
+        """Réplica: aplica um registo do líder como um commit local, com o lsn do líder"""
+        op = record["op"]
+        if op == "create_database":
+            self.wd(db_name)
+            return
+        if op == "drop_database":
+            if db_name in self.databases:
+                self.dd(db_name)
+            return
+        self.databases[db_name]  # carrega a base de dados (snapshot + log), se preciso
+        self._lsn[db_name] = record["lsn"]
+        self._wal(db_name).append(record)
+        self._dirty_since.setdefault(db_name, time.monotonic())
+        released = self._apply(db_name, record)
+        self._maybe_checkpoint(db_name)
+        if released:
+            self._collect_blobs(db_name, self.databases[db_name], released)
+
+    def load_copy(self, folder):
+        """Réplica: troca todas as bases de dados pelas de `folder` (cópia enviada pelo líder)"""
+        for db_name in list(self.databases):
+            self._delete_db_file(db_name)
+        for name in os.listdir(folder):
+            shutil.move(os.path.join(folder, name), os.path.join(DATA_DIR, name))
+        self.databases = Catalog(self._load_db)
+        self._load_databases()
+
+    def repl(self):
+        if self.replication is None:
+            return "Replicação desligada."
+        return json.dumps(self.replication.status(), indent=2, ensure_ascii=False)
+
+    def _maybe_checkpoint(self, db_name):
+        """
+        Checkpoint no próprio pedido só sem o thread de fundo, ou se o log crescer muito mais
+        depressa do que ele consegue despachar.
+        """
+        limit = CHECKPOINT_BYTES if self._background is None else 4 * CHECKPOINT_BYTES
+        if self._wal(db_name).size() >= limit:
+            self._checkpoint(db_name)
+
+    def _in_transaction(self, db_name):
+        return any(tx.db == db_name for tx in self._transactions)
+
+    # ---- Transações ----
+    def _deferred(self):
+        """Comando de escrita numa transação aberta (fora da repetição dos seus comandos)"""
+        tx = self.session.tx
+        return tx is not None and not tx.replaying
+
+    def _tx_call(self, name, args):
+        """Executa um comando de escrita sobre a vista da transação e guarda-o se não falhar"""
+        tx = self.session.tx
+        with self._tx_applied(tx):
+            result = getattr(self, name)(*args)
+        tx.ops.append((self.session.current_table, name, args))
+        return result
+
+    @contextmanager
+    def _tx_applied(self, tx):
+        """Aplica os comandos já aceites da transação; à saída desfaz tudo o que foi aplicado"""
+        tx.replaying = True
+        tx.reset()
+        try:
+            self._replay(tx)
+            yield
+        finally:
+            self._undo(tx)
+            tx.replaying = False
+
+    def tx_view(self):
+        """Leituras da sessão com as alterações da sua transação (precisa do lock de escrita)"""
+        tx = self.session.tx
+        if tx is None or not tx.ops or tx.replaying:
+            return nullcontext()
+        return self._tx_applied(tx)
+
+    def _replay(self, tx):
+        session = self.session
+        current = session.current_db, session.current_table
+        try:
+            for table_name, name, args in tx.ops:
+                session.current_db, session.current_table = tx.db, table_name
+                getattr(self, name)(*args)
+        finally:
+            session.current_db, session.current_table = current
+
+    def _stage(self, tx, db_name, record):
+        """Aplica uma alteração da transação em memória e guarda como a desfazer"""
+        if db_name != tx.db:
+            raise ValueError(f"A transação em curso é na base de dados '{tx.db}'.")
+        if record["op"] not in TX_OPS:
+            raise ValueError("Alterações de esquema não são permitidas dentro de uma transação.")
+        name = record["table"]
+        table = self.databases[db_name][name]
+        if name not in tx.blobs:
+            tx.blobs[name] = dict(table.get("blobs", {}))
+
+        rows = table["rows"]
+        if record["op"] == "insert":
+            start = len(rows)
+            undo = {"op": "delete", "positions": list(range(start, start + len(record["rows"])))}
+        elif record["op"] == "update":
+            undo = {"op": "update", "changes": [
+                [pos, {col: rows[pos].get(col) for col in changes}] for pos, changes in reversed(record["changes"])]}
+        else:
+            gone = sorted(record["positions"])
+            undo = {"op": "restore", "positions": gone, "rows": [rows[pos] for pos in gone]}
+        tx.released |= self._apply(db_name, record)
+        tx.records.append(record)
+        tx.undo.append((name, undo))
+
+    def _undo(self, tx):
+        db = self.databases[tx.db]
+        for name, undo in reversed(tx.undo):
+            if undo["op"] == "restore":
+                self._restore_rows(tx.db, name, undo["positions"], undo["rows"])
+            else:
+                self._apply(tx.db, dict(undo, table=name))
+        for name, counts in tx.blobs.items():
+            db[name]["blobs"] = counts
+        tx.undo = []
+
+    def _restore_rows(self, db_name, table_name, positions, rows):
+        """Volta a pôr rows apagadas nas posições originais (positions por ordem crescente)"""
+        table = self.databases[db_name][table_name]
+        current = list(table["rows"])
+        for pos, row in zip(positions, rows):
+            current.insert(pos, row)
+        if isinstance(table["rows"], ColumnarRows):
+            table["rows"] = ColumnarRows(table["columns"], table["types"])
+            table["rows"].extend(current)
+        else:
+            table["rows"] = current
+        self._indexes.pop((db_name, table_name), None)  # reconstruídos quando forem precisos
+        self.databases[db_name].dirty.add(table_name)
+        self._touch(db_name, table_name)
+
+    def _end(self, tx):
+        self._transactions.discard(tx)
+        if self.session.tx is tx:
+            self.session.tx = None
+
+    def wait_durable(self):
+        """fsync do último commit desta sessão (chamado sem o lock, para juntar commits)"""
+        pending, self.session.pending_sync = self.session.pending_sync, None
+        if pending:
+            wal, upto = pending
+            wal.sync(upto)
+
+    def _apply(self, db_name, record, db=None):
+        """
+        Aplica um registo de mutação às estruturas em memória.
+        Devolve os blobs que deixaram de ser referenciados por esta tabela.
+        """
+        if db is None:
+            db = self.databases[db_name]
+        op = record["op"]
+        released = set()
+        if op == "batch":
+            # commit de uma transação: vários registos, atómicos no log
+            for sub in record["records"]:
+                released |= self._apply(db_name, sub, db)
+            return released
+        name = record["table"]
+        self._touch(db_name, name)
+
+        if op == "create_table":
+            table = {"columns": list(record["columns"]), "types": list(record["types"]), "rows": []}
+            if record.get("primary_key"):
+                # a chave primária tem sempre um índice: o hash dá a posição da row pela chave
+                table["primary_key"] = record["primary_key"]
+                table["indexes"] = [record["primary_key"]]
+            if record.get("storage") == "columnar":
+                table["storage"] = "columnar"
+                table["rows"] = ColumnarRows(table["columns"], table["types"])
+            db[name] = table
+            db.dirty.add(name)
+            return released
+        if op == "drop_table":
+            released.update(db.meta(name).get("blobs", {}))
+            del db[name]
+            db.dirty.discard(name)
+            self._indexes.pop((db_name, name), None)
+            return released
+
+        table = db[name]
+        columnar = table.get("storage") == "columnar"
+        built = self._indexes.get((db_name, name), {})
+        files = [col for col, typ in zip(table["columns"], table["types"]) if typ == "file"]
+        if op in TX_OPS:
+            db.dirty.add(name)  # create_index/add_column só mudam o esquema: o bloco serve na mesma
+        if columnar and op in ("update", "delete") and table["rows"].readers:
+            # há streams a enviar estas rows: ficam com elas e a tabela passa a uma cópia
+            table["rows"] = table["rows"].copy()
+        if op == "insert":
+            start = len(table["rows"])
+            table["rows"].extend(dict(row) for row in record["rows"])
+            for col, index in built.items():
+                index.add_many(start, [row.get(col) for row in record["rows"]])
+            for col in files:
+                _count_blobs(table, [row.get(col) for row in record["rows"]], 1, released)
+        elif op == "update":
+            for pos, changes in record["changes"]:
+                row = table["rows"][pos]
+                for col, index in built.items():
+                    if col in changes:
+                        index.update(pos, row.get(col), changes[col])
+                for col in files:
+                    if col in changes:
+                        # primeiro a nova referência: o mesmo ficheiro não chega a ficar a zero
+                        _count_blobs(table, [changes[col]], 1, released)
+                        _count_blobs(table, [row.get(col)], -1, released)
+                if columnar:
+                    table["rows"].update_row(pos, changes)
+                else:
+                    # row nova em vez de alterar a antiga: quem já a leu (streams, cache) não a vê mudar
+                    table["rows"][pos] = {**row, **changes}
+        elif op == "delete":
+            gone = sorted(record["positions"])
+            for col in files:
+                if columnar:
+                    old = table["rows"].values(col, gone)
+                else:
+                    old = [table["rows"][pos].get(col) for pos in gone]
+                _count_blobs(table, old, -1, released)
+            if columnar:
+                table["rows"].delete(gone)
+            else:
+                gone_set = set(gone)
+                table["rows"] = [row for pos, row in enumerate(table["rows"]) if pos not in gone_set]
+            for index in built.values():
+                index.compact(gone)
+        elif op == "create_index":
+            table.setdefault("indexes", []).append(record["column"])
+        elif op == "add_column":
+            table["columns"].append(record["column"])
+            table["types"].append(record["type"])
+            if columnar:
+                table["rows"].add_column(record["column"], record["type"])
+            # nas rows em dicts a coluna só aparece quando recebe um valor (ausente = None)
+        return released
+
+    def _collect_blobs(self, db_name, db, released=None):
+        """Apaga os blobs (de `released`, ou todos) que nenhuma tabela da base de dados referencia"""
+        live = set()
+        for name in db:
+            live.update(db.meta(name).get("blobs", {}))
+        store = self._blobs(db_name)
+        if released is None:
+            return store.sweep(live)
+        for digest in released - live:
+            store.remove(digest)
+
+    # ---- Versões das tabelas (cache de resultados) ----
+    def _touch(self, db_name, table_name):
+        """Nova versão da tabela: os resultados em cache deixam de ser válidos"""
+        self._versions[(db_name, table_name)] = next(self._clock)
+        self.result_cache.invalidate(db_name, table_name)
+
+    def _table_version(self, db_name, table_name):
+        return self._versions.get((db_name, table_name), 0)
+
+    # ---- Índices ----
+    def _index(self, db_name, table_name, column):
+        """Índice da coluna (construído na primeira utilização) ou None se não existir"""
+        table = self.databases[db_name][table_name]
+        if column not in table.get("indexes", []):
+            return None
+        built = self._indexes.setdefault((db_name, table_name), {})
+        if column not in built:
+            built[column] = ColumnIndex.build(column, self._column_values(table, column))
+        return built[column]
+
+    def _candidates(self, db_name, table_name, conjuncts):
+        """
+        Posições candidatas (ordenadas) para uma conjunção [(coluna, op, valor), ...].
+        Usa o índice mais seletivo; devolve None quando nenhum índice ajuda (scan completo).
+        Os candidatos têm de ser reverificados com o predicado.
+        """
+        table = self.databases[db_name][table_name]
+        best = None
+        for col, op, val in conjuncts:
+            if col not in table["columns"]:
+                continue
+            # intervalos só em colunas numéricas (o índice ordenado só guarda números)
+            if op not in ("=", "==", "===") and table["types"][table["columns"].index(col)] not in ("int", "float"):
+                continue
+            index = self._index(db_name, table_name, col)
+            if index is None:
+                continue
+            found = index.lookup(op, val)
+            if found is not None and (best is None or len(found) < len(best)):
+                best = found
+        return sorted(best) if best is not None else None
+
+    def _match(self, table_name, predicate):
+        """Posições (ordenadas) das rows da tabela atual que satisfazem o predicado compilado"""
+        rows = self.databases[self.current_db][table_name]["rows"]
+        found = self._candidates(self.current_db, table_name, predicate.conjuncts)
+        self.session.rows_scanned += len(rows) if found is None else len(found)
+        if isinstance(rows, ColumnarRows):
+            positions = rows.filter(predicate, found)
+        elif found is None and self._parallel(rows):
+            positions = scarlet_parallel.parallel_filter(rows, predicate, self.workers)
+        else:
+            positions = [pos for pos in (range(len(rows)) if found is None else found) if predicate(rows[pos])]
+        self.session.rows_matched += len(positions)
+        return positions
+
+    def _parallel(self, rows):
+        """Scan completo de uma tabela por rows grande o suficiente para compensar os processos"""
+        return (self.workers > 1 and len(rows) >= self.parallel_min_rows
+                and not isinstance(rows, ColumnarRows) and scarlet_parallel.available())
+
+    def _column_values(self, table, column):
+        rows = table["rows"]
+        if isinstance(rows, ColumnarRows):
+            return rows.values(column)
+        return [row.get(column) for row in rows]
 
     # ---- Helpers ----
     def _handle_file_value(self, val):
+        digest = blob_digest(val)
+        if digest is not None and self._blobs(self.current_db).touch(digest):
+            return blob_value(digest)  # ficheiro já enviado com upload (ou já guardado)
         if isinstance(val, str):
             try:
                 val_path = os.path.abspath(val)
                 if os.path.isfile(val_path):
-                    # Criar pasta files dentro da pasta da base de dados
-                    files_dir = os.path.join(DATA_DIR, self.current_db, "files")
-                    os.makedirs(files_dir, exist_ok=True)
-
-                    # Determinar destino e copiar ficheiro
-                    filename = os.path.basename(val_path)
-                    dest_path = os.path.join(files_dir, filename)
-                    shutil.copy(val_path, dest_path)
+                    # Guardar no blob store da base de dados (uma cópia por conteúdo distinto)
+                    digest = self._blobs(self.current_db).put_file(val_path)
 
                     # Devolver caminho relativo dentro da pasta da base de dados
-                    return os.path.join("files", filename)
+                    return blob_value(digest)
                 else:
-                    print(f"Atenção: ficheiro '{val}' não existe.")
+                    log.warning("Atenção: ficheiro '%s' não existe.", val)
             except PermissionError:
-                print(f"Atenção: não foi possível copiar '{val}' por falta de permissões.")
+                log.warning("Atenção: não foi possível copiar '%s' por falta de permissões.", val)
                 return val
         return val
 
@@ -81,123 +811,208 @@ class ScarletDB:
         os.makedirs(os.path.join(db_dir, "files"), exist_ok=True)
     
     	# Inicializar base de dados vazia
-        self.databases[db_name] = {}
+        self.databases[db_name] = LazyTables()
+        self._lsn[db_name] = 0
     
-        # Guardar ficheiro JSON dentro da pasta da base de dados
-        path = os.path.join(db_dir, f"{db_name}.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.databases[db_name], f, indent=2, ensure_ascii=False)
+        # Guardar snapshot (vazio) dentro da pasta da base de dados
+        self._save_db(db_name)
+        self._publish(db_name, {"op": "create_database"})
     
-        return f"Base de dados '{db_name}' criada com pasta e ficheiro JSON."
+        return f"Base de dados '{db_name}' criada com pasta e snapshot."
 
-    def wt(self, table_name, columns, types):
+    def wt(self, table_name, columns, types, storage="rows"):
         if self.current_db is None:
             return "Nenhuma base de dados selecionada."
+        if storage not in STORAGES:
+            return f"Armazenamento desconhecido: '{storage}' (opções: {', '.join(STORAGES)})."
         if table_name in self.databases[self.current_db]:
             return f"Tabela '{table_name}' já existe em '{self.current_db}'."
-        self.databases[self.current_db][table_name] = {
-            "columns": columns,
-            "types": types,
-            "rows": []
-        }
-        self._save_db(self.current_db)
+        # chave primária: id:int:pk
+        primary_key = None
+        plain = []
+        for col, typ in zip(columns, types):
+            typ, _, flag = typ.partition(":")
+            if flag:
+                if flag.strip().lower() != "pk":
+                    return f"Opção de coluna desconhecida: '{flag}' (só pk)."
+                if primary_key is not None:
+                    return "Só pode haver uma chave primária."
+                primary_key = col
+            plain.append(typ.strip())
+        record = {"op": "create_table", "table": table_name, "columns": columns, "types": plain}
+        if storage != "rows":
+            record["storage"] = storage
+        if primary_key is not None:
+            record["primary_key"] = primary_key
+        self._commit(self.current_db, record)
+        if primary_key is not None:
+            return f"Tabela '{table_name}' criada em '{self.current_db}' com chave primária '{primary_key}'."
         return f"Tabela '{table_name}' criada em '{self.current_db}' com tipos de coluna."
 
+    def _primary_key(self, table_name):
+        """(coluna, índice) da chave primária da tabela, ou (None, None)"""
+        col = self.databases[self.current_db][table_name].get("primary_key")
+        if col is None:
+            return None, None
+        return col, self._index(self.current_db, table_name, col)
+
+    def _check_key(self, col, index, value, seen=None, pos=None):
+        """
+        ValueError se a chave já pertence a outra row (ou a uma row anterior do mesmo lote, em seen).
+        pos: a row que vai receber a chave (pode manter a sua).
+        A chave é o valor exato, já convertido para o tipo da coluna: numa coluna string
+        "007" e "7" são chaves diferentes, embora o índice (e o "=") os juntem.
+        """
+        key = normalize(value)
+        if key is None:
+            raise ValueError(f"A chave primária '{col}' não pode ficar vazia.")
+        rows = self.databases[self.current_db][self.current_table]["rows"]
+        owners = [other for other in index.hash.get(key, ()) if other != pos and rows[other].get(col) == value]
+        if (seen is not None and value in seen) or owners:
+            raise ValueError(f"Chave primária duplicada: {col}={value}.")
+        if seen is not None:
+            seen.add(value)
+
+    def _coerce_row(self, table, values):
+        """Converte uma lista de valores numa row segundo table["types"] (ValueError se falhar)"""
+        if len(values) != len(table["columns"]):
+            raise ValueError("Número incorreto de valores.")
+
+        return {col: self._coerce_value(typ, val)
+                for col, typ, val in zip(table["columns"], table["types"], values)}
+
+    def _coerce_value(self, typ, val):
+        if val is None:
+            return None  # sem valor (como nas colunas acrescentadas com e->ac)
+        if typ == "file":
+            return val  # o ficheiro só é guardado (_store_files) depois de a row ser validada
+        if typ == "int":
+            return int(val)
+        if typ == "float":
+            # permite vírgula ou ponto
+            return float(str(val).replace(",", "."))
+        return str(val)
+
+    def _store_files(self, table, values):
+        """Guarda no blob store os ficheiros das colunas `file` de {coluna: valor} (já validado)"""
+        for col, val in values.items():
+            if val is not None and table["types"][table["columns"].index(col)] == "file":
+                values[col] = self._handle_file_value(val)
+
     def i(self, *values):
+        if self._deferred():
+            return self._tx_call("i", values)
         if self.current_table is None:
             return "Nenhuma tabela selecionada."
         table = self.databases[self.current_db][self.current_table]
         if len(values) != len(table["columns"]):
             return "Número incorreto de valores."
-    
-        row = {}
-        for col, typ, val in zip(table["columns"], table["types"], values):
-            if typ == "file":
-                row[col] = self._handle_file_value(val)
-            elif typ == "int":
-                row[col] = int(val)
-            elif typ == "float":
-                # permite vírgula ou ponto
-                row[col] = float(str(val).replace(",", "."))
-            else:
-                row[col] = str(val)
-    
-        table["rows"].append(row)
-        self._save_db(self.current_db)
+
+        row = self._coerce_row(table, values)
+        col, index = self._primary_key(self.current_table)
+        if col is not None:
+            self._check_key(col, index, row[col])
+        self._store_files(table, row)
+        self._commit(self.current_db, {"op": "insert", "table": self.current_table, "rows": [row]})
         return f"Valores inseridos em '{self.current_table}'."
 
+    def insert_many(self, rows):
+        """
+        Insere várias rows na tabela atual com uma única escrita.
+        Rows inválidas não abortam o lote: devolve (inseridas, [(índice, erro), ...]).
+        """
+        table = self.databases[self.current_db][self.current_table]
+        col, index = self._primary_key(self.current_table)
+        seen = set()  # chaves das rows anteriores do lote
+        good = []
+        errors = []
+        for n, values in enumerate(rows):
+            try:
+                row = self._coerce_row(table, values)
+                if col is not None:
+                    self._check_key(col, index, row[col], seen)
+                good.append(row)
+            except (ValueError, TypeError) as e:
+                errors.append((n, str(e)))
+
+        for row in good:
+            self._store_files(table, row)
+        if good:
+            self._commit(self.current_db, {"op": "insert", "table": self.current_table, "rows": good})
+        return len(good), errors
+
+    def ib(self, *rows):
+        if self._deferred():
+            return self._tx_call("ib", rows)
+        if self.current_table is None:
+            return "Nenhuma tabela selecionada."
+        inserted, errors = self.insert_many(rows)
+        msg = f"{inserted} linha(s) inserida(s) em '{self.current_table}'."
+        if errors:
+            detalhes = "; ".join(f"#{n}: {err}" for n, err in errors)
+            msg += f" {len(errors)} erro(s): {detalhes}"
+        return msg
+
     def u(self, condition, updates):
+        if self._deferred():
+            return self._tx_call("u", (condition, updates))
         if self.current_table is None:
             return "Nenhuma tabela selecionada."
         table = self.databases[self.current_db][self.current_table]
-        count = 0
-        for row in table["rows"]:
-            if all(row.get(k) == v for k, v in condition.items()):
-                row.update(updates)
-                count += 1
-        if count > 0:
-            self._save_db(self.current_db)
-        return f"{count} linha(s) atualizada(s)."
+        predicate = compile_condition(condition)
+        if not predicate.valid:
+            return "Condição inválida."
+        # o parser entrega as atribuições como {"op": "=", "val": ...}
+        updates = {
+            col: self._coerce_value(table["types"][table["columns"].index(col)],
+                                    val["val"] if isinstance(val, dict) else val)
+            for col, val in updates.items() if col in table["columns"]
+        }
+        changes = [[pos, updates] for pos in self._match(self.current_table, predicate)]
+        col, index = self._primary_key(self.current_table)
+        if col in updates and changes:
+            if len(changes) > 1:
+                return f"A chave primária '{col}' não pode ter o mesmo valor em {len(changes)} linhas."
+            self._check_key(col, index, updates[col], pos=changes[0][0])
+        if changes:
+            self._store_files(table, updates)
+            self._commit(self.current_db, {"op": "update", "table": self.current_table, "changes": changes})
+        return f"{len(changes)} linha(s) atualizada(s)."
 
     def d(self, condition):
-
+        if self._deferred():
+            return self._tx_call("d", (condition,))
         if self.current_table is None:
             return "Nenhuma tabela selecionada."
         table = self.databases[self.current_db][self.current_table]
 
-        # se vier como string tipo "id=2"
-        if isinstance(condition, str):
-            import re
-            m = re.match(r"(\w+)\s*(=|!=|<|>|<=|>=)\s*(.+)", condition)
-            if not m:
-                return "Condição inválida."
-            k, op, val = m.groups()
-            # tenta converter o valor para int se for número
-            try:
-                val = int(val)
-            except ValueError:
-                val = val.strip("'\"")
-            condition = {k: {"op": op, "val": val}}
-
-        def match(row, condition):
-            for k, cond in condition.items():
-                v = row.get(k)
-                op = cond["op"]
-                val = cond["val"]
-
-                # tenta uniformizar: converte para string se um deles for string
-                if isinstance(v, str) or isinstance(val, str):
-                    v = str(v)
-                    val = str(val)
-
-                if op == "=" and v != val:
-                    return False
-                elif op == "!=" and v == val:
-                    return False
-                elif op == ">" and not (v > val):
-                    return False
-                elif op == "<" and not (v < val):
-                    return False
-                elif op == ">=" and not (v >= val):
-                    return False
-                elif op == "<=" and not (v <= val):
-                    return False
-            return True
-
-        before = len(table["rows"])
-        table["rows"] = [row for row in table["rows"] if not match(row, condition)]
-        deleted = before - len(table["rows"])
-        if deleted > 0:
-            self._save_db(self.current_db)
-        return f"{deleted} linha(s) apagada(s)."
+        # condição em dict do parser ({"id": {"op": "=", "val": 2}}) ou string ("id=2&idade>18")
+        predicate = compile_condition(condition)
+        if predicate.tree is None or not predicate.valid:  # sem condição não se apaga a tabela toda
+            return "Condição inválida."
+        positions = self._match(self.current_table, predicate)
+        if positions:
+            self._commit(self.current_db, {"op": "delete", "table": self.current_table, "positions": positions})
+        return f"{len(positions)} linha(s) apagada(s)."
+
+    def ci(self, column):
+        if self.current_table is None:
+            return "Nenhuma tabela selecionada."
+        table = self.databases[self.current_db][self.current_table]
+        if column not in table["columns"]:
+            return f"Coluna '{column}' não existe em '{self.current_table}'."
+        if column in table.get("indexes", []):
+            return f"Índice em '{column}' já existe."
+        self._commit(self.current_db, {"op": "create_index", "table": self.current_table, "column": column})
+        self._index(self.current_db, self.current_table, column)
+        return f"Índice criado em '{self.current_table}.{column}'."
 
     def dt(self, table_name):
         if self.current_db is None:
             return "Nenhuma base de dados selecionada."
         if table_name not in self.databases[self.current_db]:
             return f"Tabela '{table_name}' não existe em '{self.current_db}'."
-        del self.databases[self.current_db][table_name]
-        self._save_db(self.current_db)
+        self._commit(self.current_db, {"op": "drop_table", "table": table_name})
         if self.current_table == table_name:
             self.current_table = None
         return f"Tabela '{table_name}' eliminada de '{self.current_db}'."
@@ -205,8 +1020,14 @@ class ScarletDB:
     def dd(self, db_name):
         if db_name not in self.databases:
             return f"Base de dados '{db_name}' não existe."
+        if self._in_transaction(db_name):
+            return f"Base de dados '{db_name}' tem transações em curso."
+        tables = self.databases.peek(db_name)
+        if tables is not None:
+            tables.close()
         del self.databases[db_name]
         self._delete_db_file(db_name)
+        self._publish(db_name, {"op": "drop_database"})
         if self.current_db == db_name:
             self.current_db = None
             self.current_table = None
@@ -215,6 +1036,7 @@ class ScarletDB:
     def sd(self, db_name):
         if db_name not in self.databases:
             return f"Base de dados '{db_name}' não existe."
+        self.databases[db_name]  # carrega snapshot + log, se ainda não estiver em memória
         self.current_db = db_name
         return f"Base de dados atual: '{db_name}'."
 
@@ -223,6 +1045,7 @@ class ScarletDB:
             return "Nenhuma base de dados selecionada."
         if table_name not in self.databases[self.current_db]:
             return f"Tabela '{table_name}' não existe em '{self.current_db}'."
+        self.databases[self.current_db][table_name]  # lê a tabela do snapshot, se preciso
         self.current_table = table_name
         return f"Tabela atual: '{table_name}'."
 
@@ -230,10 +1053,76 @@ class ScarletDB:
         if self.current_table is None:
             return "Nenhuma tabela selecionada."
         table = self.databases[self.current_db][self.current_table]
-        output = {"columns": table["columns"], "rows": table["rows"]}
+        columns = table["columns"]
+        rows = [row if len(row) == len(columns) else {col: row.get(col) for col in columns}
+                for row in table["rows"]]
+        output = {"columns": columns, "rows": rows}
         return json.dumps(output, indent=2, ensure_ascii=False)
 
+    def begin(self):
+        if self.current_db is None:
+            return "Nenhuma base de dados selecionada."
+        if self.session.tx is not None:
+            return "Já existe uma transação em curso."
+        if not self.use_wal:
+            return "Transações precisam do log (WAL) ativo."
+        self.session.tx = Transaction(self.current_db)
+        self._transactions.add(self.session.tx)
+        return f"Transação iniciada em '{self.current_db}'."
+
+    def commit(self):
+        tx = self.session.tx
+        if tx is None:
+            return "Nenhuma transação em curso."
+        # os comandos são repetidos sobre o estado confirmado agora; uma falha anula tudo
+        tx.replaying = True
+        tx.reset()
+        try:
+            self._replay(tx)
+        except Exception as e:
+            self._undo(tx)
+            self._end(tx)
+            raise ValueError(f"Transação anulada no commit: {e}")
+        finally:
+            tx.replaying = False
+        self._end(tx)
+        count = len(tx.records)
+        if tx.records:
+            db_name = tx.db
+            self._lsn[db_name] = self._lsn.get(db_name, 0) + 1
+            wal = self._wal(db_name)
+            record = {"op": "batch", "records": tx.records, "lsn": self._lsn[db_name]}
+            upto = wal.append(record)
+            self._publish(db_name, record)
+            self._dirty_since.setdefault(db_name, time.monotonic())
+            if tx.released:
+                self._collect_blobs(db_name, self.databases[db_name], tx.released)
+            self._maybe_checkpoint(db_name)
+            self.session.pending_sync = (wal, upto)
+            if not self.defer_sync:
+                self.wait_durable()
+        return f"Transação confirmada ({count} alteração(ões))."
+
+    def rollback(self):
+        tx = self.session.tx
+        if tx is None:
+            return "Nenhuma transação em curso."
+        self._end(tx)
+        return f"Transação anulada ({len(tx.ops)} alteração(ões) desfeita(s))."
+
+    def cache(self):
+        stats = self.result_cache.stats()
+        return (f"Cache de resultados: {stats['hits']} hit(s), {stats['misses']} miss(es) "
+                f"({stats['hit_rate']:.0%}), {stats['entries']} entrada(s), {stats['rows']} row(s).")
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats["cache"] = self.result_cache.stats()
+        return json.dumps(stats, indent=2, ensure_ascii=False)
+
     def e(self, *args):
+        if self._deferred():
+            return self._tx_call("e", args)
         if not self.current_db or not self.current_table:
             return "Nenhuma base de dados/tabela selecionada."
 
@@ -250,38 +1139,57 @@ class ScarletDB:
             if col_name in table["columns"]:
                 return f"Coluna '{col_name}' já existe."
 
-            table["columns"].append(col_name)
-            table["types"].append(col_type)
-            for row in table["rows"]:
-                row[col_name] = None
-            self._save_db(self.current_db)
+            self._commit(self.current_db, {
+                "op": "add_column", "table": self.current_table,
+                "column": col_name, "type": col_type
+            })
             return f"Coluna '{col_name}' ({col_type}) adicionada com sucesso."
 
-        # Editar valor → e->id:2->set:age=25
+        # Editar valor → e->id:2->set:age=25 (id é a chave primária, se a tabela tiver uma)
         if args[0] == "row_edit":
             row_id = args[1]
             assignments = args[2]  # agora é dict {col: val, ...}
 
-            for row in table["rows"]:
-                if str(row.get("id")) == str(row_id):
-                    for col, val in assignments.items():
-                        if col not in table["columns"]:
-                            continue  # ignora colunas inexistentes
-
-                        col_type = table["types"][table["columns"].index(col)]
-                        if col_type == "file":
-                            row[col] = self._handle_file_value(val)
-                        elif col_type == "int":
-                            row[col] = int(val)
-                        elif col_type == "float":
-                            row[col] = float(val)
-                        else:
-                            row[col] = str(val)
-
-                    self._save_db(self.current_db)
-                    updated_cols = ", ".join(f"{c}={v}" for c, v in assignments.items())
-                    return f"Linha com id={row_id} atualizada ({updated_cols})."
+            key_col, index = self._primary_key(self.current_table)
+            if key_col is not None:
+                # a row da chave exata ("7" não edita a row "007")
+                key_type = table["types"][table["columns"].index(key_col)]
+                predicate = compile_condition({key_col: {"op": "===", "val": self._coerce_value(key_type, row_id)}})
+            else:
+                predicate = compile_condition({"id": {"op": "=", "val": row_id}})
+            for pos in self._match(self.current_table, predicate)[:1]:
+                changes = {}
+                for col, val in assignments.items():
+                    if col not in table["columns"]:
+                        continue  # ignora colunas inexistentes
+                    col_type = table["types"][table["columns"].index(col)]
+                    changes[col] = self._coerce_value(col_type, val)
+                if key_col in changes:
+                    self._check_key(key_col, index, changes[key_col], pos=pos)
+                self._store_files(table, changes)
+
+                self._commit(self.current_db, {
+                    "op": "update", "table": self.current_table, "changes": [[pos, changes]]
+                })
+                updated_cols = ", ".join(f"{c}={v}" for c, v in assignments.items())
+                return f"Linha com id={row_id} atualizada ({updated_cols})."
 
             return f"Nenhuma linha encontrada com id={row_id}."
 
         return "Comando inválido para 'e'."
+
+
+def _count_blobs(table, values, delta, released):
+    """Atualiza table["blobs"] (digest → nº de referências); os que chegam a 0 vão para released"""
+    counts = table.setdefault("blobs", {})
+    for value in values:
+        digest = blob_digest(value)
+        if digest is None:
+            continue
+        n = counts.get(digest, 0) + delta
+        if n > 0:
+            counts[digest] = n
+            released.discard(digest)
+        else:
+            counts.pop(digest, None)
+            released.add(digest)
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import subprocess
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scarletdb
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Pasta de dados temporária para cada teste"""
+    path = tmp_path / "scarlet_data"
+    monkeypatch.setattr(scarletdb, "DATA_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def open_db(data_dir):
+    """Abre (e no fim fecha) instâncias da base de dados sobre a pasta do teste"""
+    opened = []
+
+    def open_db(**kwargs):
+        db = scarletdb.ScarletDB(**kwargs)
+        opened.append(db)
+        return db
+
+    yield open_db
+    for db in opened:
+        try:
+            db.close()
+        except Exception:
+            pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, proc=None):
+    for _ in range(200):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if proc is not None and proc.poll() is not None:
+                break
+            time.sleep(0.05)
+    raise RuntimeError(f"nada a escutar na porta {port}")
+
+
+@pytest.fixture
+def servers(tmp_path):
+    """Inicia servidores (scarlet_server.py) em portas livres, cada um com a sua pasta de dados"""
+    procs = []
+
+    def start(data=None, **env):
+        """data: pasta de dados a copiar para o servidor antes de arrancar"""
+        port = free_port()
+        folder = tmp_path / f"server{port}"
+        if data is None:
+            (folder / "scarlet_data").mkdir(parents=True)
+        else:
+            shutil.copytree(data, folder / "scarlet_data")
+        env = dict(os.environ, SCARLET_PORT=str(port), SCARLET_LOG_LEVEL="WARNING", **env)
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "scarlet_server.py")], cwd=folder, env=env)
+        procs.append(proc)
+        wait_port(port, proc)
+        return port
+
+    yield start
+    for proc in procs:
+        proc.terminate()
+        proc.wait()
@@ -0,0 +1,55 @@
+import pytest
+from scarlet_aggregate import parse_functions, aggregate_rows, aggregate_columns
+
+ROWS = [
+    {"cat": "a", "preco": 10, "qtd": None},
+    {"cat": "a", "preco": None, "qtd": 2},
+    {"cat": None, "preco": 4.5, "qtd": None},
+    {"cat": "b", "preco": None},  # row anterior a um e->ac: sem qtd
+    {"cat": "a", "preco": 1, "qtd": 5},
+]
+FUNCTIONS = ["count", "count:preco", "sum:preco", "min:preco", "max:qtd", "avg:preco"]
+
+
+def _columnar(rows, functions, group_by):
+    values = lambda col: [row.get(col) for row in rows]
+    return aggregate_columns(values, len(rows), parse_functions(functions), group_by)
+
+
+@pytest.mark.parametrize("aggregate", [
+    lambda rows, functions, group_by: aggregate_rows(rows, parse_functions(functions), group_by),
+    _columnar,
+])
+def test_none_values_are_ignored_except_by_count(aggregate):
+    [total] = aggregate(ROWS, FUNCTIONS, [])
+    assert total == {"count": 5, "count(preco)": 3, "sum(preco)": 15.5, "min(preco)": 1,
+                     "max(qtd)": 5, "avg(preco)": 15.5 / 3}
+
+    groups = {row["cat"]: row for row in aggregate(ROWS, FUNCTIONS, ["cat"])}
+    assert set(groups) == {"a", "b", None}  # None é um grupo, como em GROUP BY
+    assert groups["a"]["count"] == 3 and groups["a"]["sum(preco)"] == 11
+    assert groups["b"]["count"] == 1 and groups["b"]["count(preco)"] == 0
+    assert groups["b"]["min(preco)"] is groups["b"]["max(qtd)"] is groups["b"]["avg(preco)"] is None
+
+
+@pytest.mark.parametrize("aggregate", [
+    lambda rows, functions, group_by: aggregate_rows(rows, parse_functions(functions), group_by),
+    _columnar,
+])
+def test_sum_without_values_is_none(aggregate):
+    groups = {row["cat"]: row for row in aggregate(ROWS, ["sum:preco", "sum:qtd"], ["cat"])}
+    assert groups["b"] == {"cat": "b", "sum(preco)": None, "sum(qtd)": None}
+    assert groups[None]["sum(qtd)"] is None
+    assert aggregate([], ["sum:preco"], []) == [{"sum(preco)": None}]
+
+
+def test_no_rows_gives_one_line_with_count_zero():
+    assert aggregate_rows([], parse_functions(["count", "avg:preco"]), []) == [{"count": 0, "avg(preco)": None}]
+    assert aggregate_rows([], parse_functions(["count"]), ["cat"]) == []
+
+
+def test_unknown_function_or_missing_column_is_an_error():
+    with pytest.raises(ValueError, match="desconhecida"):
+        parse_functions(["median:preco"])
+    with pytest.raises(ValueError, match="precisa de uma coluna"):
+        parse_functions(["sum"])
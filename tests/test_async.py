@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from scarlet_async import AsyncScarletClient, _read_frame
+from scarlet_protocol import encode_frame
+
+
+async def _fake_server(handle):
+    """
+    Servidor de teste: responde ao hello e passa cada pedido a handle(frame, reply), que
+    decide quando (e se) responde. Devolve (servidor, porta, ligações aceites).
+    """
+    accepted = []
+
+    async def client(reader, writer):
+        accepted.append(writer)
+        await _read_frame(reader)
+        writer.write(encode_frame({"status": "ok", "version": 1}))
+        while True:
+            frame = await _read_frame(reader)
+            if frame is None:
+                break
+
+            def reply(body, request_id=frame["id"]):
+                writer.write(encode_frame(dict(body, id=request_id)))
+
+            await handle(frame, reply)
+
+    server = await asyncio.start_server(client, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], accepted
+
+
+def test_requests_share_a_connection_and_get_their_own_answers():
+    async def main():
+        waiting = []
+
+        async def handle(frame, reply):
+            if frame["cmd"] != "select":
+                reply({"status": "ok", "msg": "ok"})
+                return
+            waiting.append((frame, reply))
+            if len(waiting) == 3:
+                # respostas pela ordem inversa: só o id as liga aos pedidos
+                for request, answer in reversed(waiting):
+                    answer({"status": "ok", "stream": True})
+                    answer({"rows": [{"n": request["args"][0]}] * request["args"][0]})
+                    answer({"end": True, "count": request["args"][0]})
+
+        server, port, accepted = await _fake_server(handle)
+        async with server, AsyncScarletClient(port=port, connections=1) as client:
+            results = await asyncio.gather(*(client.execute("select", [n]) for n in (1, 2, 3)))
+        assert [len(result["msg"]) for result in results] == [1, 2, 3]
+        assert [result["msg"][0]["n"] for result in results] == [1, 2, 3]
+        assert len(accepted) == 1
+
+    asyncio.run(main())
+
+
+def test_timeout_abandons_only_the_slow_request():
+    async def main():
+        late = []
+
+        async def handle(frame, reply):
+            if frame["args"] == ["lento"]:
+                late.append(reply)
+                return
+            for answer in late:  # a resposta atrasada chega antes desta e é descartada
+                answer({"status": "ok", "msg": "tarde demais"})
+            reply({"status": "ok", "msg": frame["args"][0]})
+
+        server, port, _ = await _fake_server(handle)
+        async with server, AsyncScarletClient(port=port, connections=1) as client:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.execute("show", ["lento"], timeout=0.2)
+            assert (await client.execute("show", ["rápido"]))["msg"] == "rápido"
+
+    asyncio.run(main())
+
+
+def test_exception_in_a_transaction_rolls_it_back(servers):
+    port = servers()
+
+    async def main():
+        async with AsyncScarletClient(port=port) as client:
+            await client.execute("wd", ["loja"])
+            await client.execute("sd", ["loja"])
+            await client.execute("wt", ["T", ["id"], ["int"]])
+            await client.execute("st", ["T"])
+            with pytest.raises(RuntimeError):
+                async with client.transaction() as run:
+                    await run("sd", ["loja"])
+                    await run("st", ["T"])
+                    await run("i", [1])
+                    raise RuntimeError("falhou a meio")
+            async with client.transaction() as run:
+                await run("sd", ["loja"])
+                await run("st", ["T"])
+                await run("i", [2])
+                # as outras ligações só veem a row depois do commit
+                assert (await client.execute("select", [["id"], {}]))["msg"] == []
+            return (await client.execute("select", [["id"], {}]))["msg"]
+
+    assert asyncio.run(main()) == [{"id": 2}]
+
+
+def test_selection_follows_the_responses(servers):
+    port = servers()
+
+    async def main():
+        async with AsyncScarletClient(port=port) as client:
+            await client.execute("wd", ["loja"])
+            await client.execute("sd", ["loja"])
+            await client.execute("wt", ["T", ["id"], ["int"]])
+            await client.execute("st", ["T"])
+            await client.execute("i", [1])
+            assert "não existe" in (await client.execute("sd", ["nada"]))["msg"]
+            assert (client.db, client.table) == ("loja", "T")
+            # uma segunda ligação recebe sd/st do cliente
+            first, second = await asyncio.gather(client.execute("select", [["id"], {}]),
+                                                 client.execute("select", [["id"], {}]))
+            assert len(client._conns) == 2
+            assert first["msg"] == second["msg"] == [{"id": 1}]
+            await client.execute("dd", ["loja"])
+            assert (client.db, client.table) == (None, None)
+            return (await client.execute("show"))["msg"]
+
+    assert asyncio.run(main()) == "Nenhuma tabela selecionada."
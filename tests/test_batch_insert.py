@@ -0,0 +1,46 @@
+from scarlet_wal import replay
+
+
+def _open(open_db):
+    db = open_db()
+    db.sd("loja")
+    db.st("T")
+    return db
+
+
+def _create(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "preco", "nome"], ["int", "float", "string"])
+    db.st("T")
+    return db
+
+
+def test_batch_coerces_types_and_reports_each_bad_row(open_db):
+    db = _create(open_db)
+    msg = db.ib(["1", "2.5", "a"], [2, "caro", "b"], [3, 1], ["x", 1, "c"], [4, 7, "d"])
+    assert msg.startswith("2 linha(s) inserida(s) em 'T'. 3 erro(s):")
+    assert "#1:" in msg and "#2:" in msg and "#3:" in msg
+    assert db.databases["loja"]["T"]["rows"] == [
+        {"id": 1, "preco": 2.5, "nome": "a"}, {"id": 4, "preco": 7.0, "nome": "d"}]
+
+
+def test_batch_is_one_log_record_and_survives_restart(open_db):
+    db = _create(open_db)
+    wal = db._wal("loja")
+    before = len(replay(wal.path))
+    db.ib(*[[i, i / 2, f"n{i}"] for i in range(100)])
+    assert len(replay(wal.path)) == before + 1
+    db.close()
+    db = _open(open_db)
+    assert [row["id"] for row in db.databases["loja"]["T"]["rows"]] == list(range(100))
+
+
+def test_batch_where_every_row_fails_writes_nothing(open_db):
+    db = _create(open_db)
+    wal = db._wal("loja")
+    before = len(replay(wal.path))
+    assert db.ib(["a", 1, "x"], [1]).startswith("0 linha(s) inserida(s)")
+    assert len(replay(wal.path)) == before
+    assert db.databases["loja"]["T"]["rows"] == []
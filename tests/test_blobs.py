@@ -0,0 +1,76 @@
+import os
+import time
+import pytest
+from scarlet_blobs import BLOB_MIN_AGE, UPLOAD_MAX_AGE
+
+
+def _files(db):
+    root = db._blobs("loja").root
+    return sorted(name for _, _, names in os.walk(root) for name in names)
+
+
+@pytest.fixture
+def db(open_db, tmp_path):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("Docs", ["id", "cv", "n"], ["int:pk", "file", "int"])
+    db.st("Docs")
+    return db
+
+
+def test_rejected_insert_stores_no_blob(db, tmp_path):
+    src = tmp_path / "cv.txt"
+    src.write_text("conteúdo")
+    db.i(1, str(src), 0)
+    stored = _files(db)
+    other = tmp_path / "outro.txt"
+    other.write_text("outro conteúdo")
+    with pytest.raises(ValueError):
+        db.i(1, str(other), 0)  # chave repetida
+    with pytest.raises(ValueError):
+        db.i(2, str(other), "x")  # tipo errado noutra coluna
+    inserted, errors = db.insert_many([[3, str(other), 0], [3, str(other), 0]])
+    assert (inserted, len(errors)) == (1, 1)
+    assert len(_files(db)) == len(stored) + 1
+
+
+def test_sweep_keeps_recent_unreferenced_blobs(db, tmp_path):
+    store = db._blobs("loja")
+    src = tmp_path / "enviado.txt"
+    src.write_text("ainda sem row")
+    recent = store.put_file(str(src))
+    src.write_text("antigo")
+    old = store.put_file(str(src))
+    past = time.time() - BLOB_MIN_AGE - 1
+    os.utime(store.path(old), (past, past))
+    assert store.sweep(set()) == 1
+    assert os.path.exists(store.path(recent))
+    assert not os.path.exists(store.path(old))
+
+
+def _age(path, seconds):
+    past = time.time() - seconds - 1
+    os.utime(path, (past, past))
+
+
+def test_periodic_sweep_removes_released_blobs_and_abandoned_uploads(db, tmp_path):
+    store = db._blobs("loja")
+    src = tmp_path / "cv.txt"
+    src.write_text("apagado daqui a pouco")
+    db.i(1, str(src), 0)
+    digest = next(iter(db.databases["loja"]["Docs"]["blobs"]))
+    db.d({"id": {"op": "=", "val": 1}})
+    assert os.path.exists(store.path(digest))  # libertado há pouco: fica até ao próximo sweep
+
+    stale, fresh = store.part_path("a" * 64), store.part_path("b" * 64)
+    for part in (stale, fresh):
+        with open(part, "wb") as f:
+            f.write(b"metade")
+    _age(stale, UPLOAD_MAX_AGE)
+    _age(store.path(digest), BLOB_MIN_AGE)
+
+    assert db.sweep_blobs() == 2
+    assert not os.path.exists(store.path(digest))
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
@@ -0,0 +1,70 @@
+import pytest
+from scarlet_cache import ResultCache
+from scarlet_server import _select
+
+
+@pytest.fixture
+def db(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    for name in ("T", "U"):
+        db.wt(name, ["id", "nome"], ["int", "string"])
+        db.st(name)
+        db.ib(*[[i, f"n{i}"] for i in range(10)])
+    db.st("T")
+    return db
+
+
+def _ids(db, conds="id<5", options=None):
+    rows, _ = _select(db, ["id"], conds, options)
+    return [row["id"] for row in rows]
+
+
+def _counts(db):
+    stats = db.result_cache.stats()
+    return stats["hits"], stats["misses"]
+
+
+def test_repeated_select_is_served_from_the_cache(db):
+    assert _ids(db) == [0, 1, 2, 3, 4]
+    assert _counts(db) == (0, 1)
+    assert _ids(db) == [0, 1, 2, 3, 4]
+    assert _ids(db, {"id": {"op": "<", "val": 5}}) == [0, 1, 2, 3, 4]  # a mesma condição, noutra forma
+    assert _counts(db) == (2, 1)
+    assert _ids(db, "id<5", {"order": [["id", "desc"]], "limit": 2}) == [4, 3]
+    assert _counts(db) == (2, 2)
+
+
+def test_a_write_invalidates_only_its_table(db):
+    _ids(db)
+    db.st("U")
+    _ids(db)
+    db.d({"id": {"op": "=", "val": 0}})  # em U
+    assert _ids(db) == [1, 2, 3, 4]
+    db.st("T")
+    assert _ids(db) == [0, 1, 2, 3, 4]
+    assert _counts(db) == (1, 3)
+    db.u({"id": {"op": "=", "val": 1}}, {"id": 11})
+    assert _ids(db) == [0, 2, 3, 4]
+    assert _counts(db) == (1, 4)
+
+
+def test_a_stream_that_saw_a_write_is_not_served_later(db):
+    rows, _ = _select(db, ["id"], "id<5")
+    next(rows)
+    db.i(-1, "novo")  # a meio do resultado: a versão muda
+    list(rows)
+    assert _ids(db) == [0, 1, 2, 3, 4, -1]
+
+
+def test_large_results_and_lru_limits():
+    cache = ResultCache(max_rows=10, max_entries=2, max_result_rows=5)
+    cache.put(("db", "T", 1, "a"), list(range(6)))
+    assert cache.get(("db", "T", 1, "a")) is None
+    for n in range(3):
+        cache.put(("db", "T", 1, n), [n])
+    assert cache.get(("db", "T", 1, 0)) is None
+    assert cache.get(("db", "T", 1, 2)) == ([2], {})
+    cache.invalidate("db")
+    assert cache.stats()["entries"] == 0 and cache.rows == 0
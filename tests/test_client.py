@@ -0,0 +1,37 @@
+from scarlet_client import ScarletClient, next_selection
+
+
+def test_selection_changes_only_when_the_server_accepts_it():
+    ok = lambda msg: {"status": "ok", "msg": msg}
+    assert next_selection("a", "T", "sd", ["b"], ok("Base de dados 'b' não existe.")) == ("a", "T")
+    assert next_selection("a", "T", "sd", ["b"], {"status": "error", "msg": "x"}) == ("a", "T")
+    assert next_selection("a", "T", "sd", ["b"], ok("Base de dados atual: 'b'.")) == ("b", None)
+    assert next_selection("a", None, "st", ["U"], ok("Tabela atual: 'U'.")) == ("a", "U")
+    assert next_selection("a", "T", "dt", ["U"], ok("Tabela 'U' eliminada de 'a'.")) == ("a", "T")
+    assert next_selection("a", "T", "dt", ["T"], ok("Tabela 'T' eliminada de 'a'.")) == ("a", None)
+    assert next_selection("a", "T", "dd", ["a"], ok("Base de dados 'a' eliminada.")) == (None, None)
+
+
+def test_failed_select_and_drop_keep_the_pool_consistent(servers):
+    client = ScarletClient(port=servers(), pool_size=2)
+    try:
+        client.execute("wd", ["loja"])
+        client.execute("sd", ["loja"])
+        client.execute("wt", ["T", ["id"], ["int"]])
+        client.execute("st", ["T"])
+        client.execute("i", [1])
+        assert "não existe" in client.execute("sd", ["nada"])["msg"]
+        assert "não existe" in client.execute("st", ["Nada"])["msg"]
+        assert (client.db, client.table) == ("loja", "T")
+        client._drain()  # uma ligação nova repete sd/st a partir do cliente
+        assert client.execute("select", [["id"], {}])["msg"] == [{"id": 1}]
+
+        client.execute("dt", ["T"])
+        assert (client.db, client.table) == ("loja", None)
+        client.execute("dd", ["loja"])
+        assert (client.db, client.table) == (None, None)
+        client._drain()
+        assert client.execute("wd", ["outra"])["status"] == "ok"
+        assert client.execute("show")["msg"] == "Nenhuma tabela selecionada."
+    finally:
+        client.close()
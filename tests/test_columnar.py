@@ -0,0 +1,68 @@
+import pytest
+from scarlet_server import _select, _aggregate
+
+CONDITIONS = [{}, "preco>2", "nome=Ana", "preco<=2.5||nome=rui", "qtd!=3&preco>=0", "nome>b", "qtd<0"]
+
+
+def _fill(db):
+    for name, storage in (("R", "rows"), ("C", "columnar")):
+        db.wt(name, ["id", "preco", "nome", "qtd"], ["int", "float", "string", "int"], storage)
+        db.st(name)
+        db.ib(*[[i, i * 1.25 if i % 5 else None, ["Ana", "rui", None, "Eva"][i % 4], i % 7] for i in range(40)])
+        db.u({"nome": {"op": "=", "val": "Eva"}}, {"preco": 9.5, "qtd": None})
+        db.d({"qtd": {"op": "=", "val": 6}})
+        db.e("ac", "extra:int")
+        db.e("row_edit", 3, {"extra": 42, "nome": "rui"})
+        db.i(100, 1, "novo", 2, 7)
+
+
+def _both(db, fn):
+    results = []
+    for name in ("R", "C"):
+        db.st(name)
+        results.append(fn())
+    return results
+
+
+@pytest.fixture
+def db(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    _fill(db)
+    return db
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_select_gives_the_same_rows(db, condition):
+    rows, columnar = _both(db, lambda: list(_select(db, ["*"], condition)[0]))
+    assert rows == columnar
+    rows, columnar = _both(db, lambda: list(_select(db, ["nome", "extra"], condition,
+                                                   {"order": [["preco", "desc"]], "limit": 7})[0]))
+    assert rows == columnar
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_aggregates_give_the_same_result(db, condition):
+    functions = ["count", "sum:preco", "min:nome", "max:qtd", "avg:preco"]
+    rows, columnar = _both(db, lambda: _aggregate(db, functions, ["nome"], condition))
+    assert rows == columnar
+
+
+def test_columnar_table_survives_restart(db, open_db):
+    db.st("C")
+    before = list(_select(db, ["*"], {})[0])
+    db.close()
+    db = open_db()
+    db.sd("loja")
+    db.st("C")
+    assert db.databases["loja"]["C"]["storage"] == "columnar"
+    assert list(_select(db, ["*"], {})[0]) == before
+
+
+def test_columnar_rejects_a_bad_value_without_changes(db):
+    db.st("C")
+    before = list(_select(db, ["*"], {})[0])
+    with pytest.raises(ValueError):
+        db.u({"id": {"op": "=", "val": 1}}, {"qtd": "muitos"})
+    assert list(_select(db, ["*"], {})[0]) == before
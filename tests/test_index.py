@@ -0,0 +1,56 @@
+import pytest
+from scarlet_index import ColumnIndex
+from scarlet_query import compile_condition
+
+
+@pytest.fixture
+def db(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "grupo", "nome"], ["int", "int", "string"])
+    db.st("T")
+    db.ci("grupo")
+    db.ci("nome")
+    db.ib(*[[i, i % 4, f"n{i % 3}"] for i in range(20)])
+    return db
+
+
+def _check(db):
+    """O índice mantido a cada escrita é igual a um construído de novo a partir das rows"""
+    rows = db.databases["loja"]["T"]["rows"]
+    for col in ("grupo", "nome"):
+        index = db._index("loja", "T", col)
+        fresh = ColumnIndex.build(col, [row.get(col) for row in rows])
+        assert {k: sorted(v) for k, v in index.hash.items()} == fresh.hash
+        assert (index.keys, index.positions) == (fresh.keys, fresh.positions)
+
+
+def _ids(db, condition):
+    rows = db.databases["loja"]["T"]["rows"]
+    return sorted(rows[pos]["id"] for pos in db._match("T", compile_condition(condition)))
+
+
+def test_index_follows_insert_update_and_delete(db):
+    _check(db)
+    db.i(20, 1, "novo")
+    db.u({"grupo": {"op": "=", "val": 2}}, {"grupo": 9})
+    db.e("row_edit", 3, {"nome": "editado"})
+    db.d({"grupo": {"op": "<", "val": 1}})
+    _check(db)
+    assert _ids(db, {"grupo": {"op": "=", "val": 9}}) == [2, 6, 10, 14, 18]
+    assert _ids(db, {"grupo": {"op": ">=", "val": 3}}) == [2, 3, 6, 7, 10, 11, 14, 15, 18, 19]
+    assert _ids(db, {"nome": {"op": "=", "val": "editado"}}) == [3]
+
+
+def test_index_is_restored_after_rollback(db):
+    db.begin()
+    db.i(30, 2, "tx")
+    db.u({"id": {"op": "<", "val": 5}}, {"grupo": 7})
+    db.d({"grupo": {"op": "=", "val": 3}})
+    with db.tx_view():
+        _check(db)
+    db.rollback()
+    _check(db)
+    db.d({"id": {"op": "=", "val": 0}})
+    _check(db)
@@ -0,0 +1,77 @@
+import pytest
+from scarlet_server import _join
+
+
+@pytest.fixture
+def db(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("Users", ["id", "name", "age"], ["int", "string", "int"])
+    db.st("Users")
+    db.ib([1, "Ana", 30], [2, "Rui", 17], [3, "Eva", 45], [4, "Gil", None])
+    db.wt("Products", ["id", "owner_id", "name", "price"], ["int", "int", "string", "float"])
+    db.st("Products")
+    db.ib([10, 1, "caneta", 1.5], [11, 3, "livro", 12.0], [12, 1, "mesa", 80.0],
+          [13, None, "órfão", 5.0], [14, "2", "lápis", 0.5])
+    return db
+
+
+def _join_rows(db, kind, cols, conds=None):
+    rows, _ = _join(db, kind, "Users.id=Products.owner_id", cols, conds)
+    return [tuple(row.values()) for row in rows]
+
+
+def test_inner_join_pairs_in_left_order(db):
+    assert _join_rows(db, "inner", ["Users.name", "Products.name"]) == [
+        ("Ana", "caneta"), ("Ana", "mesa"), ("Rui", "lápis"), ("Eva", "livro")]
+
+
+def test_left_join_keeps_rows_without_a_match(db):
+    assert _join_rows(db, "left", ["Users.name", "Products.name"]) == [
+        ("Ana", "caneta"), ("Ana", "mesa"), ("Rui", "lápis"), ("Eva", "livro"), ("Gil", None)]
+    # condição da direita: avaliada depois do join (como um WHERE), sobre as rows com None
+    assert _join_rows(db, "left", ["Users.name", "Products.name"], "price>10") == [
+        ("Ana", "mesa"), ("Eva", "livro")]
+    assert _join_rows(db, "left", ["Users.name"], "Products.id=99") == []
+    # condição só da esquerda: filtra antes do join
+    assert _join_rows(db, "left", ["Users.name", "Products.name"], "age>=30") == [
+        ("Ana", "caneta"), ("Ana", "mesa"), ("Eva", "livro")]
+
+
+def test_star_projects_every_qualified_column(db):
+    rows, _ = _join(db, "inner", "Users.id=Products.owner_id", ["*"], "Products.id=11")
+    assert list(rows) == [{"Users.id": 3, "Users.name": "Eva", "Users.age": 45, "Products.id": 11,
+                           "Products.owner_id": 3, "Products.name": "livro", "Products.price": 12.0}]
+
+
+def test_unqualified_columns_must_be_unambiguous(db):
+    assert _join_rows(db, "inner", ["age", "price"], "price<2") == [(30, 1.5), (17, 0.5)]
+    with pytest.raises(ValueError, match="ambígua"):
+        _join(db, "inner", "Users.id=Products.owner_id", ["name"])
+    with pytest.raises(ValueError, match="ambígua"):
+        _join(db, "inner", "Users.id=Products.owner_id", ["*"], "id=1")
+    with pytest.raises(ValueError, match="não faz parte"):
+        _join(db, "inner", "Users.id=Products.owner_id", ["Orders.id"])
+    with pytest.raises(ValueError, match="Tipo de join"):
+        _join(db, "outer", "Users.id=Products.owner_id", ["*"])
+
+
+def test_index_and_hash_join_agree(db):
+    plain = {kind: _join_rows(db, kind, ["*"]) for kind in ("inner", "left")}
+    db.st("Products")
+    db.ci("owner_id")
+    for kind in ("inner", "left"):
+        assert _join_rows(db, kind, ["*"]) == plain[kind]
+
+
+def test_inner_join_uses_the_left_index(db):
+    db.st("Users")
+    db.ib(*[[i, f"u{i}", 20] for i in range(5, 20)])
+    plain = _join_rows(db, "inner", ["*"], "Products.price<50")
+    db.ci("id")
+    db.session.rows_scanned = 0
+    assert _join_rows(db, "inner", ["*"], "Products.price<50") == plain
+    # Products percorrida (5) + as rows de Users encontradas no índice (3), sem percorrer as 19
+    assert db.session.rows_scanned == 5 + 3
+    assert ("Gil", None) in _join_rows(db, "left", ["Users.name", "Products.name"])  # left: sem troca
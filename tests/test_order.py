@@ -0,0 +1,71 @@
+import pytest
+from scarlet_order import order_positions
+from scarlet_server import _select
+
+
+@pytest.fixture(params=["heap", "index"])
+def db(request, open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "p"], ["int", "int"])
+    db.st("T")
+    # muitos empates em p: 1..10 com p = 3, 1, 2, 3, 1, 2, ...
+    db.ib(*[[i, i % 3] for i in range(1, 11)])
+    if request.param == "index":
+        db.ci("p")  # com limit e uma só coluna de ordenação, o select percorre o índice
+    return db
+
+
+def _page(db, options, cols=("id",)):
+    rows, meta = _select(db, list(cols), {}, options)
+    return [row["id"] for row in rows], meta.get("cursor")
+
+
+def test_order_and_limit_keep_storage_order_on_ties(db):
+    assert _page(db, {"order": [["p", "desc"]], "limit": 4})[0] == [2, 5, 8, 1]
+    assert _page(db, {"order": [["p", "asc"]], "limit": 4, "offset": 2})[0] == [9, 1, 4, 7]
+    assert _page(db, {"order": [["p", "asc"], ["id", "desc"]]})[0] == [9, 6, 3, 10, 7, 4, 1, 8, 5, 2]
+
+
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_cursor_pages_cover_every_row_once(db, direction):
+    expected, _ = _page(db, {"order": [["p", direction]]})
+    seen = []
+    options = {"order": [["p", direction]], "limit": 3}
+    while True:
+        ids, cursor = _page(db, options)
+        if not ids:
+            break
+        seen += ids
+        # cursor: o valor de p e a posição da última row
+        assert len(cursor) == 2
+        options = dict(options, after=cursor)
+    assert seen == expected
+    assert sorted(seen) == list(range(1, 11))
+
+
+def test_cursor_with_values_only_skips_ties(db):
+    ids, _ = _page(db, {"order": [["p", "desc"]], "limit": 10, "after": [2]})
+    assert ids == [1, 4, 7, 10, 3, 6, 9]
+
+
+def test_order_positions_reads_entries_from_a_generator():
+    consumed = []
+
+    def entries():
+        for pos in range(1000):
+            consumed.append(pos)
+            yield pos, [pos % 7]
+
+    order = [("v", "asc")]
+    assert order_positions(entries(), order, 3, 1, None) == [7, 14, 21]
+    assert len(consumed) == 1000
+
+
+def test_ties_stay_in_storage_order_after_an_update(db):
+    db.u({"id": {"op": "=", "val": 10}}, {"p": 2})
+    db.u({"id": {"op": "=", "val": 1}}, {"p": 2})
+    assert _page(db, {"order": [["p", "desc"]], "limit": 5})[0] == [1, 2, 5, 8, 10]
+    ids, cursor = _page(db, {"order": [["p", "desc"]], "limit": 2})
+    assert _page(db, {"order": [["p", "desc"]], "limit": 2, "after": cursor})[0] == [5, 8]
@@ -0,0 +1,28 @@
+import pytest
+import scarlet_parallel
+from scarlet_query import compile_condition
+from scarlet_aggregate import parse_functions, aggregate_rows
+
+
+@pytest.fixture
+def pool():
+    assert scarlet_parallel.start(2)
+    yield
+    scarlet_parallel.stop()
+
+
+def test_no_pool_until_started():
+    assert not scarlet_parallel.start(1)
+    assert not scarlet_parallel.available()
+
+
+def test_parallel_scan_matches_sequential(pool):
+    rows = [{"id": i, "grupo": i % 3} for i in range(1000)]
+    predicate = compile_condition("id>=10&grupo=1")
+    expected = [pos for pos, row in enumerate(rows) if predicate(row)]
+    assert scarlet_parallel.parallel_filter(rows, predicate, 2) == expected
+
+    functions = parse_functions(["count", "sum:id"])
+    result, matched = scarlet_parallel.parallel_aggregate(rows, predicate, functions, [], 2)
+    assert matched == len(expected)
+    assert result == aggregate_rows((rows[pos] for pos in expected), functions, [])
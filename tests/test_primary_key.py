@@ -0,0 +1,76 @@
+import pytest
+
+
+@pytest.fixture
+def db(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    assert "chave primária 'id'" in db.wt("T", ["id", "nome"], ["int:pk", "string"])
+    db.st("T")
+    db.i(1, "Ana")
+    db.i(2, "Rui")
+    return db
+
+
+def _rows(db):
+    return sorted((row["id"], row["nome"]) for row in db.databases["loja"]["T"]["rows"])
+
+
+def test_insert_rejects_duplicate_and_empty_keys(db):
+    with pytest.raises(ValueError, match="duplicada"):
+        db.i(1, "Outra")
+    with pytest.raises(ValueError, match="duplicada"):
+        db.i("2", "Texto")  # convertido para int antes da verificação
+    with pytest.raises(ValueError, match="vazia"):
+        db.i(None, "Sem chave")
+    assert _rows(db) == [(1, "Ana"), (2, "Rui")]
+
+
+def test_batch_keeps_valid_rows_and_reports_duplicates(db):
+    msg = db.ib([3, "Eva"], [1, "Dup"], [3, "Dup no lote"], [4, "Gil"])
+    assert msg.startswith("2 linha(s) inserida(s)")
+    assert "#1:" in msg and "#2:" in msg
+    assert [key for key, _ in _rows(db)] == [1, 2, 3, 4]
+
+
+def test_update_and_edit_cannot_reuse_a_key(db):
+    with pytest.raises(ValueError, match="duplicada"):
+        db.u({"id": {"op": "=", "val": 2}}, {"id": 1})
+    assert db.u({"id": {"op": "=", "val": 2}}, {"id": 2, "nome": "Rui S."}) == "1 linha(s) atualizada(s)."
+    assert db.u({"id": {"op": ">", "val": 0}}, {"id": 5}).startswith("A chave primária")
+    with pytest.raises(ValueError, match="duplicada"):
+        db.e("row_edit", 1, {"id": 2})
+    db.e("row_edit", 1, {"id": 7})
+    assert _rows(db) == [(2, "Rui S."), (7, "Ana")]
+
+
+def test_key_freed_by_delete_can_be_reused_and_survives_restart(db, open_db):
+    db.d({"id": {"op": "=", "val": 1}})
+    db.i(1, "Nova Ana")
+    db.close()
+    db = open_db()
+    db.sd("loja")
+    db.st("T")
+    with pytest.raises(ValueError, match="duplicada"):
+        db.i(2, "Outra vez")
+    assert _rows(db) == [(1, "Nova Ana"), (2, "Rui")]
+
+
+def test_string_keys_are_compared_exactly(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("S", ["codigo", "nome"], ["string:pk", "string"])
+    db.st("S")
+    db.i("7", "sete")
+    db.i("007", "agente")  # igual a "7" para o "=" das condições, mas outra chave
+    db.i("1.0", "um")
+    assert db.ib(["1", "um sem casas"], ["1", "repetida"]).startswith("1 linha(s)")
+    with pytest.raises(ValueError, match="duplicada"):
+        db.i("007", "outro")
+    with pytest.raises(ValueError, match="duplicada"):
+        db.u({"codigo": {"op": "===", "val": "1"}}, {"codigo": "7"})
+    db.e("row_edit", "7", {"nome": "sete!"})
+    rows = {row["codigo"]: row["nome"] for row in db.databases["loja"]["S"]["rows"]}
+    assert rows == {"7": "sete!", "007": "agente", "1.0": "um", "1": "um sem casas"}
@@ -0,0 +1,105 @@
+import re
+import itertools
+import pytest
+from scarlet_query import compile_condition, _compile_text
+
+
+# avaliador de strings anterior às condições compiladas (reavaliava o texto em cada row)
+def _to_number_if_possible(s):
+    txt = str(s).strip()
+    if len(txt) >= 2 and ((txt[0] == txt[-1] == "'") or (txt[0] == txt[-1] == '"')):
+        txt = txt[1:-1]
+    try:
+        return int(txt)
+    except ValueError:
+        try:
+            return float(txt)
+        except ValueError:
+            return txt
+
+
+def _eval_simple_condition(row, cond):
+    m = re.match(r'\s*([A-Za-z_]\w*)\s*(==|=|!=|<=|>=|<|>)\s*(.+)\s*$', cond)
+    if not m:
+        return False
+    col, op, raw = m.groups()
+    if col not in row:
+        return False
+    val = row.get(col)
+    target = _to_number_if_possible(raw)
+    if val is None:
+        return False
+    if op == '==':
+        op = '='
+    try:
+        if op == '=':  return val == target
+        if op == '!=': return val != target
+        if op == '<':  return val < target
+        if op == '>':  return val > target
+        if op == '<=': return val <= target
+        if op == '>=': return val >= target
+    except Exception:
+        return False
+    return False
+
+
+def _eval_condition(row, cond_str):
+    if '||' in cond_str:
+        return any(_eval_condition(row, part) for part in cond_str.split('||'))
+    if '&' in cond_str:
+        return all(_eval_condition(row, part) for part in cond_str.split('&'))
+    return _eval_simple_condition(row, cond_str)
+
+
+ROWS = [{"id": i, "preco": p, "nome": n}
+        for i, (p, n) in enumerate(itertools.product([None, 0, 2.5, 10], [None, "Ana", "rui", "10"]))]
+ROWS.append({"id": 99})  # row anterior a um e->ac: sem as colunas novas
+
+CONDITIONS = [
+    "id=3", "id==3", "id!=3", "preco>2", "preco<=2.5", "preco>=10", "preco<0",
+    "nome='Ana'", 'nome="rui"', "nome!=Ana", "nome<b", "nome>=Ana",
+    "preco>1&nome=Ana", "id<4||nome=rui", "preco=10&id>3||nome!=Ana&preco<1",
+    "preco>'x'", "nome<3", "id=", "id~3",
+]
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_compiled_predicate_matches_the_old_evaluator(condition):
+    predicate = compile_condition(condition)
+    for row in ROWS:
+        assert predicate(row) == _eval_condition(row, condition), (condition, row)
+
+
+def test_numeric_strings_compare_as_numbers():
+    # diferença documentada em scarlet_query: o avaliador antigo comparava "10" com 10 como texto
+    predicate = compile_condition("nome=10")
+    assert predicate({"nome": "10"}) and predicate({"nome": "10.0"})
+    assert compile_condition("nome>9")({"nome": "10"})
+    assert not compile_condition({"nome": {"op": "===", "val": 10}})({"nome": "10"})  # igualdade exata
+
+
+def test_invalid_parts_are_flagged():
+    assert compile_condition("id=3&preco>1").valid
+    assert not compile_condition("id~3").valid
+    assert not compile_condition({"id": {"op": "<>", "val": 3}}).valid
+
+
+def test_dict_and_string_conditions_agree():
+    pairs = [("id=3", {"id": {"op": "=", "val": 3}}),
+             ("preco>=2.5&nome=Ana", {"preco": {"op": ">=", "val": "2.5"}, "nome": "Ana"})]
+    for text, items in pairs:
+        text_pred, items_pred = compile_condition(text), compile_condition(items)
+        assert text_pred.tree == items_pred.tree
+        assert [text_pred(row) for row in ROWS] == [items_pred(row) for row in ROWS]
+
+
+def test_repeated_conditions_come_from_the_cache():
+    _compile_text.cache_clear()
+    first = compile_condition("id>=7&nome=Ana")
+    assert compile_condition("  id>=7&nome=Ana ") is first
+    assert compile_condition({"id": {"op": ">", "val": 1}}) is compile_condition({"id": {"op": ">", "val": 1}})
+    info = _compile_text.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    # literal não hashable: compilado sem cache, mas com o mesmo resultado
+    predicate = compile_condition({"id": {"op": "=", "val": [1]}})
+    assert not predicate({"id": 1})
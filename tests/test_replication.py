@@ -0,0 +1,73 @@
+import time
+from conftest import free_port, wait_port
+from scarlet_client import ScarletClient
+from scarlet_replication import ReplicationHub
+
+
+def _table(db):
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "nome"], ["int", "string"])
+    db.st("T")
+
+
+def test_mutations_without_wal_are_published(open_db):
+    leader = open_db(wal=False)
+    leader.replication = ReplicationHub(leader)
+    _table(leader)
+    leader.i(1, "Ana")
+    leader.i(2, "Rui")
+    records = [record for _, _, record in leader.replication._entries if "lsn" in record]
+    assert [record["lsn"] for record in records][-2:] == [2, 3]
+    assert [record["op"] for record in records][-2:] == ["insert", "insert"]
+
+
+
+def _rows(port, table):
+    client = ScarletClient(port=port, pool_size=1)
+    try:
+        client.execute("sd", ["loja"])
+        client.execute("st", [table])
+        return client.execute("select", [["*"], {}])["msg"]
+    finally:
+        client.close()
+
+
+def _wait_for(check, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "a réplica não chegou ao estado do líder"
+        time.sleep(0.05)
+
+
+def test_follower_catches_up_from_a_copy_and_the_record_stream(open_db, data_dir, servers):
+    db = open_db()
+    _table(db)
+    db.ib(*[[i, f"n{i}"] for i in range(100)])
+    db.close()  # checkpoint: a cópia leva o snapshot (diretório e blocos)
+
+    repl_port = free_port()
+    leader_port = servers(data=data_dir, SCARLET_REPL_PORT=str(repl_port))
+    leader = ScarletClient(port=leader_port)
+    try:
+        leader.execute("sd", ["loja"])
+        leader.execute("st", ["T"])
+        leader.execute("u", [{"id": {"op": "<", "val": 10}}, {"nome": "no log"}])  # vai no log da cópia
+        wait_port(repl_port)
+        follower_port = servers(SCARLET_FOLLOW=f"127.0.0.1:{repl_port}")
+        _wait_for(lambda: _rows(follower_port, "T") == _rows(leader_port, "T"))
+
+        with leader.transaction() as run:
+            run("ib", [[i, "lote"] for i in range(100, 150)])
+            run("d", [{"id": {"op": ">=", "val": 90}, "nome": {"op": "!=", "val": "lote"}}])
+        leader.execute("e", ["ac", "preco:float"])
+        leader.execute("u", [{"id": {"op": "=", "val": 1}}, {"preco": 2.5}])
+        leader.execute("wt", ["U", ["id"], ["int"]])
+        leader.execute("st", ["U"])
+        leader.execute("i", [7])
+        expected = _rows(leader_port, "T")
+        assert len(expected) == 140 and {"id": 1, "nome": "no log", "preco": 2.5} in expected
+        _wait_for(lambda: _rows(follower_port, "T") == expected)
+        assert _rows(follower_port, "U") == [{"id": 7}]
+    finally:
+        leader.close()
@@ -0,0 +1,62 @@
+import pytest
+from scarlet_client import ScarletClient
+from scarlet_router import HashRing, Router, RouterSession, routing_key
+
+
+@pytest.fixture
+def shards(servers):
+    """Cada shard é um servidor com a sua pasta de dados"""
+    return lambda: f"127.0.0.1:{servers()}"
+
+
+def _keys(shard):
+    host, _, port = shard.rpartition(":")
+    client = ScarletClient(host, int(port), pool_size=1)
+    try:
+        client.execute("sd", ["loja"])
+        client.execute("st", ["T"])
+        return [row["k"] for row in client.stream("select", [["k"], {}])]
+    finally:
+        client.close()
+
+
+def test_ring_moves_only_keys_owned_by_the_new_shard():
+    before = HashRing(["a:1", "b:2"])
+    after = HashRing(["a:1", "b:2", "c:3"])
+    keys = range(2000)
+    moved = [k for k in keys if before.owner(k) != after.owner(k)]
+    assert moved
+    assert all(after.owner(k) == "c:3" for k in moved)
+
+
+def test_routing_key_follows_the_column_type():
+    assert routing_key("5", "int") == routing_key(5, "int") == 5
+    assert routing_key(7, "string") == "7"
+    assert routing_key(None, "int") is None
+
+
+def test_add_shard_moves_rows_without_losing_or_repeating(shards, tmp_path):
+    first = [shards(), shards()]
+    router = Router(first, config=str(tmp_path / "router.json"))
+    session = RouterSession(router)
+    try:
+        assert session.execute("wd", ["loja"])["status"] == "ok"
+        session.execute("sd", ["loja"])
+        assert session.execute("wt", ["T", ["k", "n"], ["string", "int"]])["status"] == "ok"
+        session.execute("st", ["T"])
+        # "7" e "007" são iguais para o "=" das condições, mas são chaves diferentes
+        keys = [key for n in range(300) for key in (str(n), f"00{n}")]
+        response = session.execute("ib", [[key, n] for n, key in enumerate(keys)])
+        assert response["msg"].startswith(f"{len(keys)} linha")
+
+        new = shards()
+        assert "adicionada" in router.add_shard(new)
+
+        placed = {shard: _keys(shard) for shard in router.ring.shards}
+        found = [key for rows in placed.values() for key in rows]
+        assert sorted(found) == sorted(keys)
+        assert placed[new]
+        for shard, rows in placed.items():
+            assert all(router.ring.owner(key) == shard for key in rows)
+    finally:
+        session.close()
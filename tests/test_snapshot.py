@@ -0,0 +1,170 @@
+import os
+import pytest
+from scarlet_columnar import ColumnarRows
+from scarlet_snapshot import SnapshotReader, LazyTables, SnapshotError, write_snapshot
+
+
+def _tables():
+    rows = [{"id": i, "preco": i / 4 if i % 3 else None, "nome": ["Ana", None, "Rui ✓"][i % 3],
+             "extra": [i, {"a": 1}, None][i % 3]} for i in range(50)]
+    rows.append({"id": 2 ** 70, "preco": 1.0, "nome": "fora de int64", "extra": None})
+    columnar = ColumnarRows(["id", "nome"], ["int", "string"])
+    columnar.extend({"id": i, "nome": None if i % 4 == 0 else f"n{i % 5}"} for i in range(30))
+    return {
+        "R": {"columns": ["id", "preco", "nome", "extra"], "types": ["int", "float", "string", "json"],
+              "rows": rows, "indexes": ["id"], "primary_key": "id"},
+        "C": {"columns": ["id", "nome"], "types": ["int", "string"], "rows": columnar, "storage": "columnar"},
+        "Vazia": {"columns": ["a"], "types": ["int"], "rows": []},
+    }
+
+
+def test_round_trip_keeps_values_types_and_schema(tmp_path):
+    path = str(tmp_path / "db.sdb")
+    tables = _tables()
+    write_snapshot(path, tables, 17)
+    reader = SnapshotReader(path)
+    assert reader.lsn == 17
+    for name, table in tables.items():
+        loaded = reader.load_table(name)
+        assert {k: v for k, v in loaded.items() if k != "rows"} == {k: v for k, v in table.items() if k != "rows"}
+        assert list(loaded["rows"]) == list(table["rows"])
+    assert isinstance(reader.load_table("C")["rows"], ColumnarRows)
+
+
+def test_tables_are_loaded_only_when_used(tmp_path):
+    path = str(tmp_path / "db.sdb")
+    write_snapshot(path, _tables(), 0)
+    tables = LazyTables(SnapshotReader(path))
+    assert sorted(tables) == ["C", "R", "Vazia"]
+    assert not any(tables.loaded(name) for name in tables)
+    assert tables.meta("R")["primary_key"] == "id"
+    assert len(tables["C"]["rows"]) == 30
+    assert tables.loaded("C") and not tables.loaded("R")
+
+
+def _flip(path, offset):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+
+def test_corrupted_block_fails_only_its_table(tmp_path):
+    path = str(tmp_path / "db.sdb")
+    write_snapshot(path, _tables(), 0)
+    reader = SnapshotReader(path)
+    _flip(os.path.join(str(tmp_path), reader.tables["R"]["file"]), 10)
+    with pytest.raises(SnapshotError, match="Checksum inválido na tabela 'R'"):
+        reader.load_table("R")
+    assert len(reader.load_table("C")["rows"]) == 30
+
+
+def test_corrupted_directory_is_refused(tmp_path):
+    path = str(tmp_path / "db.sdb")
+    write_snapshot(path, _tables(), 0)
+    _flip(path, os.path.getsize(path) - 3)
+    with pytest.raises(SnapshotError, match="diretório"):
+        SnapshotReader(path)
+
+
+def test_crash_while_writing_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "db.sdb")
+    tables = _tables()
+    write_snapshot(path, tables, 1)
+    changed = dict(tables, R=dict(tables["R"], rows=[]))
+
+    def crash(src, dst):
+        raise OSError("sem espaço")
+
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        write_snapshot(path, changed, 2)
+    monkeypatch.undo()
+    reader = SnapshotReader(path)
+    assert reader.lsn == 1
+    assert list(reader.load_table("R")["rows"]) == tables["R"]["rows"]
+    # o próximo snapshot apaga os blocos que o crash deixou
+    write_snapshot(path, changed, 2)
+    files = os.listdir(str(tmp_path / "tables"))
+    assert sorted(files) == sorted(os.path.basename(e["file"]) for e in SnapshotReader(path).tables.values())
+
+
+def test_checkpoint_moves_the_log_into_the_snapshot(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id"], ["int"])
+    db.st("T")
+    db.ib(*[[i] for i in range(10)])
+    assert db._wal("loja").size() > 0
+    assert db.checkpoint_dirty(force=True) == 1
+    assert db._wal("loja").size() == 0
+    db.close()
+    db = open_db()
+    db.sd("loja")
+    assert len(db.databases["loja"]["T"]["rows"]) == 10
+
+
+def _files(db):
+    return {name: entry["file"] for name, entry in db.databases["loja"].snapshot.tables.items()}
+
+
+def test_checkpoint_rewrites_only_tables_whose_rows_changed(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    for name in ("A", "B", "C"):
+        db.wt(name, ["id", "nome"], ["int", "string"])
+        db.st(name)
+        db.ib([1, "um"], [2, "dois"])
+    db.checkpoint_dirty(force=True)
+    before = _files(db)
+
+    db.st("A")
+    db.i(3, "três")
+    db.st("B")
+    db.e("ac", "preco:float")  # só esquema: o bloco serve na mesma
+    db.ci("id")
+    db.checkpoint_dirty(force=True)
+    after = _files(db)
+    assert after["A"] != before["A"]
+    assert after["B"] == before["B"] and after["C"] == before["C"]
+    db.close()
+
+    db = open_db()
+    db.sd("loja")
+    tables = db.databases["loja"]
+    assert tables.meta("B")["columns"] == ["id", "nome", "preco"]
+    assert tables["B"]["rows"] == [{"id": 1, "nome": "um", "preco": None}, {"id": 2, "nome": "dois", "preco": None}]
+    assert tables.meta("B")["indexes"] == ["id"]
+    assert len(tables["A"]["rows"]) == 3
+
+
+def test_replaced_and_evicted_readers_are_closed(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    for name in ("A", "B"):
+        db.wt(name, ["id"], ["int"])
+        db.st(name)
+        db.i(1)
+    db.checkpoint_dirty(force=True)
+    db.close()
+
+    db = open_db()
+    db.sd("loja")
+    db.st("A")
+    db.i(2)  # carrega A: o ficheiro do bloco fica aberto no reader
+    first = db.databases["loja"].snapshot
+    assert first._files
+    db.checkpoint_dirty(force=True)
+    assert not first._files
+    second = db.databases["loja"].snapshot
+    assert second is not first
+    assert db.databases["loja"]["B"]["rows"] == [{"id": 1}]  # bloco reaproveitado, lido do novo
+    assert second._files
+    assert db.evict_idle(-1) > 0
+    assert not second._files
+    db.sd("loja")
+    assert len(db.databases["loja"]["A"]["rows"]) == 2
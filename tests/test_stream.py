@@ -0,0 +1,55 @@
+import pytest
+import scarlet_server
+from scarlet_server import stream_command
+
+
+def _open(open_db, storage):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "n"], ["int", "int"], storage)
+    db.st("T")
+    db.ib(*[[i, 0] for i in range(35)])
+    return db
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(scarlet_server, "CHUNK_ROWS", 10)
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def db(request, open_db):
+    return _open(open_db, request.param)
+
+
+def test_stream_reads_one_chunk_at_a_time_from_the_first_version(db):
+    frames = stream_command(db, {"cmd": "select", "args": [["*"], {}]})
+    assert next(frames) == {"status": "ok", "stream": True}
+    first = next(frames)["rows"]
+    assert len(first) == 10
+    # escritas entre blocos: o lock não fica preso e o stream não as vê
+    db.u({"id": {"op": ">=", "val": 20}}, {"n": 1})
+    db.d({"id": {"op": "<", "val": 15}})
+    db.i(99, 1)
+    rest = [frame for frame in frames]
+    rows = first + [row for frame in rest[:-1] for row in frame["rows"]]
+    assert [len(frame["rows"]) for frame in rest[:-1]] == [10, 10, 5]
+    assert rest[-1] == {"end": True, "count": 35}
+    assert rows == [{"id": i, "n": 0} for i in range(35)]
+    # a tabela tem as escritas
+    table_rows = db.databases["loja"]["T"]["rows"]
+    assert [row["id"] for row in table_rows] == list(range(15, 35)) + [99]
+    assert all(row["n"] == 1 for row in table_rows if row["id"] >= 20)
+
+
+def test_abandoned_stream_releases_columnar_rows(open_db):
+    db = _open(open_db, "columnar")
+    frames = stream_command(db, {"cmd": "select", "args": [["id"], {}]})
+    next(frames)
+    next(frames)
+    frames.close()
+    rows = db.databases["loja"]["T"]["rows"]
+    assert not getattr(rows, "readers", ())
+    db.d({"id": {"op": "<", "val": 5}})
+    assert db.databases["loja"]["T"]["rows"] is rows  # sem streams a ler, não há cópia
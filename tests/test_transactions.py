@@ -0,0 +1,121 @@
+import threading
+import pytest
+from scarletdb import Session
+
+
+def _ids(db):
+    # dentro de uma transação a sessão vê as suas alterações
+    with db.tx_view():
+        return sorted(row["id"] for row in db.databases["loja"]["T"]["rows"])
+
+
+def _reopen(db, open_db):
+    for wal in db._wals.values():
+        wal.close()
+    db._wals.clear()
+    db = open_db()
+    db.sd("loja")
+    db.st("T")
+    return db
+
+
+@pytest.fixture
+def db(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "nome"], ["int", "string"])
+    db.st("T")
+    for i in range(3):
+        db.i(i, f"n{i}")
+    return db
+
+
+def test_rollback_restores_every_change(db, open_db):
+    before = list(db.databases["loja"]["T"]["rows"])
+    assert db.begin().startswith("Transação iniciada")
+    db.i(10, "novo")
+    db.u({"id": {"op": "=", "val": 1}}, {"nome": "mudou"})
+    db.d({"id": {"op": "=", "val": 0}})
+    assert _ids(db) == [1, 2, 10]
+    assert db.rollback().startswith("Transação anulada (3")
+    assert db.databases["loja"]["T"]["rows"] == before
+    assert _ids(_reopen(db, open_db)) == [0, 1, 2]
+
+
+def test_commit_is_durable(db, open_db):
+    db.begin()
+    db.i(10, "novo")
+    db.d({"id": {"op": "=", "val": 0}})
+    assert db.commit() == "Transação confirmada (2 alteração(ões))."
+    assert _ids(_reopen(db, open_db)) == [1, 2, 10]
+
+
+def test_other_sessions_keep_writing_and_do_not_see_uncommitted_rows(db):
+    db.begin()
+    db.i(10, "novo")
+    mine = db.session
+    other = Session()
+    db.use_session(other)
+    db.sd("loja")
+    db.st("T")
+    assert _ids(db) == [0, 1, 2]
+    db.i(11, "outro")
+    db.d({"id": {"op": "=", "val": 0}})
+    db.use_session(mine)
+    assert _ids(db) == [1, 2, 10, 11]
+    db.commit()
+    db.use_session(other)
+    assert _ids(db) == [1, 2, 10, 11]
+
+
+def test_commit_fails_whole_when_a_change_no_longer_applies(open_db):
+    db = open_db()
+    db.wd("loja")
+    db.sd("loja")
+    db.wt("T", ["id", "nome"], ["int:pk", "string"])
+    db.st("T")
+    db.begin()
+    db.i(1, "meu")
+    db.i(2, "meu")
+    mine = db.session
+    db.use_session(Session())
+    db.sd("loja")
+    db.st("T")
+    db.i(2, "dele")
+    db.use_session(mine)
+    with pytest.raises(ValueError, match="Transação anulada"):
+        db.commit()
+    assert db.session.tx is None
+    assert _ids(db) == [2]
+
+
+def test_two_sessions_commit_concurrently_to_the_same_table(db, open_db):
+    errors = []
+    ready = threading.Barrier(2)
+
+    def worker(first):
+        try:
+            db.use_session(Session())
+            with db.lock.write():
+                db.sd("loja")
+                db.st("T")
+                db.begin()
+            for key in range(first, first + 50):
+                with db.lock.write():
+                    db.i(key, "tx")
+            ready.wait()
+            with db.lock.write():
+                db.commit()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(first,)) for first in (100, 200)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    expected = [0, 1, 2] + list(range(100, 150)) + list(range(200, 250))
+    assert _ids(db) == expected
+    assert _ids(_reopen(db, open_db)) == expected